@@ -1,15 +1,40 @@
-from flask import Flask, render_template, request, jsonify, session, redirect
-import sqlite3
+from flask import Flask, render_template, request, jsonify, session, redirect, Response
 from datetime import datetime
+import hashlib
+import json
 import os
 import secrets
+from urllib.parse import urlencode
+
+import app_logging
+import assets
+import compression
+import jobs
+import metrics
+import query_profiler
+import rate_limit
+import retention
+import search
+import sessions
+import webhook_inbox
+from conversation_cache import create_cache
+from db import get_db, get_queue_db, get_session_db, init_shards
+from page_cache import PageCache, catalog_version
+from reply_codec import harvest_templates
+from storage import create_storage
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(16)
+
+app_logging.init_app(app)
+session_interface = sessions.init_app(app)
+metrics.init_app(app)
+assets.init_app(app)
+compression.init_app(app)
+logger = app_logging.get_logger('healing_guru')
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect('healing_guru_chat.db')
+    conn = get_db()
     c = conn.cursor()
     
     # Chat messages table
@@ -37,6 +62,33 @@ def init_db():
                   content TEXT,
                   timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
     
+    # Archived messages/insights: zlib-compressed JSON rows per user, written by retention.py
+    c.execute('''CREATE TABLE IF NOT EXISTS message_archive
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id TEXT,
+                  kind TEXT,
+                  first_at DATETIME,
+                  last_at DATETIME,
+                  row_count INTEGER,
+                  summary TEXT,
+                  payload BLOB,
+                  archived_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_message_archive_user ON message_archive (user_id, kind, first_at)')
+    
+    # Insight counts per user and pattern, kept current by MessageRepository.add_reply()
+    c.execute('''CREATE TABLE IF NOT EXISTS insight_counts
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id TEXT,
+                  pattern_type TEXT,
+                  count INTEGER,
+                  last_seen DATETIME,
+                  UNIQUE (user_id, pattern_type))''')
+    
+    # Canned reply text referenced by id from stored assistant messages (see reply_codec.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS response_templates
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  text TEXT UNIQUE NOT NULL)''')
+    
     # Healing paths table
     c.execute('''CREATE TABLE IF NOT EXISTS paths
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -77,6 +129,17 @@ def init_db():
                   FOREIGN KEY (path_id) REFERENCES paths(id),
                   FOREIGN KEY (module_id) REFERENCES modules(id))''')
     
+    # One row per user and module, so progress writes are upserts. Duplicates from before
+    # the index existed are folded into the most complete row first.
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_progress_user_module'")
+    if c.fetchone() is None:
+        c.execute('''DELETE FROM user_progress WHERE id NOT IN
+                     (SELECT (SELECT keep.id FROM user_progress keep
+                              WHERE keep.user_id IS p.user_id AND keep.module_id IS p.module_id
+                              ORDER BY keep.completed_at IS NULL, keep.completed_at DESC, keep.id LIMIT 1)
+                      FROM user_progress p GROUP BY p.user_id, p.module_id)''')
+        c.execute('CREATE UNIQUE INDEX idx_progress_user_module ON user_progress (user_id, module_id)')
+    
     # User subscriptions table (Gumroad integration)
     c.execute('''CREATE TABLE IF NOT EXISTS subscriptions
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -85,6 +148,7 @@ def init_db():
                   subscription_status TEXT,
                   started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                   expires_at DATETIME)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_license ON subscriptions (gumroad_license_key)')
     
     # Community posts table
     c.execute('''CREATE TABLE IF NOT EXISTS community_posts
@@ -95,7 +159,18 @@ def init_db():
                   category TEXT,
                   title TEXT NOT NULL,
                   content TEXT NOT NULL,
-                  created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+                  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                  excerpt TEXT,
+                  word_count INTEGER,
+                  reading_minutes INTEGER)''')
+    
+    # Card fields precomputed when a post is written (storage.post_summary); older databases get
+    # the columns here and the values from CommunityRepository.backfill_summaries()
+    c.execute('PRAGMA table_info(community_posts)')
+    post_columns = {row[1] for row in c.fetchall()}
+    for column, column_type in (('excerpt', 'TEXT'), ('word_count', 'INTEGER'), ('reading_minutes', 'INTEGER')):
+        if column not in post_columns:
+            c.execute(f'ALTER TABLE community_posts ADD COLUMN {column} {column_type}')
     
     # Community comments table
     c.execute('''CREATE TABLE IF NOT EXISTS community_comments
@@ -107,6 +182,10 @@ def init_db():
                   created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                   FOREIGN KEY (post_id) REFERENCES community_posts(id))''')
     
+    # Full-text index over posts and their comments, kept in sync by triggers (see search.py)
+    if not search.create_community_index(conn):
+        logger.warning("SQLite has no FTS5; community search falls back to a LIKE scan")
+    
     # User consent table (GDPR compliance)
     c.execute('''CREATE TABLE IF NOT EXISTS user_consent
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -117,12 +196,74 @@ def init_db():
                   ip_address TEXT,
                   last_updated DATETIME DEFAULT CURRENT_TIMESTAMP)''')
     
+    # Gumroad purchases waiting to be linked to a session by /verify-license
+    c.execute('''CREATE TABLE IF NOT EXISTS pending_subscriptions
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  license_key TEXT UNIQUE,
+                  email TEXT,
+                  subscription_status TEXT,
+                  expires_at DATETIME,
+                  created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    
     conn.commit()
     conn.close()
+    
+    # Queue tables live in their own database file (db.QUEUE_DATABASE)
+    conn = get_queue_db()
+    c = conn.cursor()
+    
+    # Background job queue (see jobs.py); run_at/locked_until are Unix timestamps
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  kind TEXT NOT NULL,
+                  payload TEXT,
+                  idempotency_key TEXT UNIQUE,
+                  status TEXT DEFAULT 'queued',
+                  attempts INTEGER DEFAULT 0,
+                  max_attempts INTEGER DEFAULT 5,
+                  run_at REAL,
+                  locked_until REAL,
+                  worker TEXT,
+                  result TEXT,
+                  last_error TEXT,
+                  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                  finished_at DATETIME)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, run_at)')
+    
+    # Raw Gumroad deliveries waiting to be applied (see webhook_inbox.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS gumroad_inbox
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  sale_id TEXT,
+                  license_key TEXT,
+                  dedupe_key TEXT UNIQUE,
+                  payload TEXT,
+                  status TEXT DEFAULT 'pending',
+                  attempts INTEGER DEFAULT 0,
+                  claimed_until REAL,
+                  last_error TEXT,
+                  received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                  processed_at DATETIME)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_gumroad_inbox_pending ON gumroad_inbox (status, license_key, id)')
+    
+    conn.commit()
+    conn.close()
+    
+    # Server-side sessions (see sessions.py); expires_at is a Unix timestamp
+    conn = get_session_db()
+    conn.execute('''CREATE TABLE IF NOT EXISTS sessions
+                    (id TEXT PRIMARY KEY,
+                     data TEXT NOT NULL,
+                     expires_at REAL NOT NULL) WITHOUT ROWID''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+    conn.commit()
+    conn.close()
+    
+    # Per-user tables in their shard files (no-op unless HEALING_GURU_SHARDS is set)
+    init_shards()
 
 def seed_freeze_path():
     """Seed the 'From Freeze to Gentle Action' healing path using the 4 R Framework"""
-    conn = sqlite3.connect('healing_guru_chat.db')
+    conn = get_db()
     c = conn.cursor()
     
     # Check if path already exists
@@ -1323,7 +1464,7 @@ Write your integration insights and your note to your future self.""",
 
 def seed_inner_bully_path():
     """Seed the 'Healing The Inner Bully' path using the 4 R Framework"""
-    conn = sqlite3.connect('healing_guru_chat.db')
+    conn = get_db()
     c = conn.cursor()
     
     # Check if path already exists
@@ -2147,8 +2288,41 @@ init_db()
 seed_freeze_path()
 seed_inner_bully_path()
 
+# Shared pages are rendered once per catalog version (see page_cache.py)
+page_cache = PageCache()
+_catalog_conn = get_db()
+page_cache.set_catalog(*catalog_version(_catalog_conn))
+
+# (path slug, step) -> (path_id, module_id), for routes that only need the ids
+_catalog_cursor = _catalog_conn.cursor()
+_catalog_cursor.execute("SELECT p.slug, m.step_number, p.id, m.id FROM modules m JOIN paths p ON p.id = m.path_id")
+module_ids = {(slug, step): (path_id, module_id) for slug, step, path_id, module_id in _catalog_cursor.fetchall()}
+_catalog_conn.close()
+
 # AI Conversation Engine
 class HealingGuruAI:
+    # From this intensity on, a turn gets crisis support (and is never rate limited)
+    CRISIS_INTENSITY = 7
+    
+    # Critical indicators (intensity 10)
+    CRISIS_PHRASES = [
+        'want to die', 'kill myself', 'end it all', 'cant do this anymore', 
+        "can't do this anymore", 'dont want to exist', "don't want to exist",
+        'want everything to stop', 'hurt myself', 'no point in living',
+        'better off dead', 'nothing matters', 'give up completely'
+    ]
+    
+    # Severe distress (intensity 8)
+    SEVERE_PHRASES = [
+        'cant cope', "can't cope", 'falling apart', 'unraveling', 
+        'cant go on', "can't go on", 'no way out', 'dont see the point',
+        "don't see the point", 'completely hopeless', 'breaking down',
+        'cant take it', "can't take it", 'too much pain', 'hate myself',
+        'im worthless', "i'm worthless", 'im stupid', "i'm stupid",
+        'everything is my fault', 'no one cares about me', 'im the problem',
+        "i'm the problem", 'im a bad person', "i'm a bad person"
+    ]
+    
     def __init__(self):
         # Emotional states with detection patterns and responses
         self.emotional_states = {
@@ -2652,7 +2826,31 @@ class HealingGuruAI:
                 'states': ['being_bullied', 'overwhelmed_anxious', 'self_blame_shame']
             }
         ]
-    
+
+        # Stable tool ids so API responses can reference tools instead of shipping descriptions
+        import re
+        for tool in self.coping_tools:
+            tool['id'] = re.sub(r'[^a-z0-9]+', '-', tool['name'].lower()).strip('-')
+        self.tools_by_id = {tool['id']: tool for tool in self.coping_tools}
+
+        # Pre-rendered tool offer fragments - built once instead of on every message
+        self.tool_fragments = {
+            tool['id']: f"{tool['name']}**\n{tool['description']}\n\n" for tool in self.coping_tools
+        }
+        self.tool_offer_bands = {
+            # High distress: gentle, directive
+            'high': ("Let me offer something that might help ground you right now:\n\n",
+                     "Would you like me to guide you through one of these?"),
+            # Moderate: balanced offering
+            'moderate': ("Here are some tools that might help:\n\n",
+                         "Let me know if you'd like to try one, or if you want to talk more first."),
+            # Low: exploratory
+            'low': ("You might find one of these helpful:\n\n",
+                    "Let me know if you'd like to try one, or if you want to talk more first.")
+        }
+        # Rendered offers keyed by (band, tool ids) - bounded by the number of tool pairs
+        self.tool_offer_cache = {}
+
     def analyze_message(self, message, conversation_history):
         """Analyze user message and generate compassionate response"""
         import random
@@ -2674,7 +2872,7 @@ class HealingGuruAI:
             recent_ai_messages = []
         
         # CRITICAL: If intensity is 7+, prioritize crisis support
-        if intensity_score >= 7:
+        if intensity_score >= self.CRISIS_INTENSITY:
             crisis_response = self.get_crisis_response(intensity_score)
             if crisis_response:
                 # Also offer intelligent tools alongside crisis response
@@ -3063,35 +3261,20 @@ class HealingGuruAI:
         
         return any(dysregulation_signs.values())
     
-    def assess_emotional_intensity(self, message, conversation_history):
+    def message_intensity(self, message):
         """
-        Internal emotional intensity scale (0-10) - NEVER shown to user
-        Guides support level and intervention type
+        The part of the intensity scale read from the message alone (phrases, tone);
+        assess_emotional_intensity adds what the conversation history shows
         """
         message_lower = message.lower()
         score = 0
         
         # Critical indicators (9-10)
-        critical_phrases = [
-            'want to die', 'kill myself', 'end it all', 'cant do this anymore', 
-            "can't do this anymore", 'dont want to exist', "don't want to exist",
-            'want everything to stop', 'hurt myself', 'no point in living',
-            'better off dead', 'nothing matters', 'give up completely'
-        ]
-        if any(phrase in message_lower for phrase in critical_phrases):
+        if any(phrase in message_lower for phrase in self.CRISIS_PHRASES):
             return 10
         
         # Severe distress (7-8)
-        severe_phrases = [
-            'cant cope', "can't cope", 'falling apart', 'unraveling', 
-            'cant go on', "can't go on", 'no way out', 'dont see the point',
-            "don't see the point", 'completely hopeless', 'breaking down',
-            'cant take it', "can't take it", 'too much pain', 'hate myself',
-            'im worthless', "i'm worthless", 'im stupid', "i'm stupid",
-            'everything is my fault', 'no one cares about me', 'im the problem',
-            "i'm the problem", 'im a bad person', "i'm a bad person"
-        ]
-        if any(phrase in message_lower for phrase in severe_phrases):
+        if any(phrase in message_lower for phrase in self.SEVERE_PHRASES):
             score = max(score, 8)
         
         # High distress (7-8)
@@ -3127,6 +3310,17 @@ class HealingGuruAI:
         if len(message.split()) < 10 and any(char in message for char in ['...', '??', '!!']):
             score += 1
         
+        return score
+    
+    def assess_emotional_intensity(self, message, conversation_history):
+        """
+        Internal emotional intensity scale (0-10) - NEVER shown to user
+        Guides support level and intervention type
+        """
+        score = self.message_intensity(message)
+        if score >= 10:
+            return 10
+        
         # Repetitive hopeless phrases in history
         if conversation_history:
             try:
@@ -3231,28 +3425,27 @@ class HealingGuruAI:
         # Absolute fallback
         return [self.coping_tools[7]]  # Box Breathing (index adjusted for new list)
     
-    def format_tool_offer(self, tools, intensity_score):
-        """Format tool offerings based on intensity level"""
+    def get_intensity_band(self, intensity_score):
+        """Map an intensity score (0-10) to the tool offer band"""
         if intensity_score >= 7:
-            # High distress: gentle, directive
-            intro = "Let me offer something that might help ground you right now:\n\n"
+            return 'high'
         elif intensity_score >= 4:
-            # Moderate: balanced offering
-            intro = "Here are some tools that might help:\n\n"
-        else:
-            # Low: exploratory
-            intro = "You might find one of these helpful:\n\n"
-        
-        tool_text = ""
-        for i, tool in enumerate(tools, 1):
-            tool_text += f"**{i}. {tool['name']}**\n{tool['description']}\n\n"
-        
-        if intensity_score >= 7:
-            closing = "Would you like me to guide you through one of these?"
-        else:
-            closing = "Let me know if you'd like to try one, or if you want to talk more first."
-        
-        return intro + tool_text + closing
+            return 'moderate'
+        return 'low'
+
+    def format_tool_offer(self, tools, intensity_score):
+        """Format tool offerings based on intensity level (cached per band and tool selection)"""
+        band = self.get_intensity_band(intensity_score)
+        tool_ids = tuple(tool['id'] for tool in tools)
+
+        offer = self.tool_offer_cache.get((band, tool_ids))
+        if offer is None:
+            intro, closing = self.tool_offer_bands[band]
+            tool_text = ''.join(f"**{i}. {self.tool_fragments[tool_id]}" for i, tool_id in enumerate(tool_ids, 1))
+            offer = intro + tool_text + closing
+            self.tool_offer_cache[(band, tool_ids)] = offer
+
+        return offer
     
     def generate_empathetic_response(self, message, history):
         """Generate context-aware empathetic response"""
@@ -4118,21 +4311,69 @@ class HealingGuruAI:
 
 # Initialize AI
 ai = HealingGuruAI()
+metrics.instrument_detectors(ai, [
+    'detect_positive_state', 'assess_emotional_intensity', 'detect_emotion',
+    'extract_time_period', 'select_intelligent_tool', 'format_tool_offer',
+    'generate_empathetic_response'
+])
+
+# Tool catalog never changes while the process runs, so serialize it (and its ETag) once
+TOOL_CATALOG_JSON = json.dumps({'tools': [
+    {'id': tool['id'], 'name': tool['name'], 'description': tool['description'], 'when': tool['when']}
+    for tool in ai.coping_tools
+]})
+TOOL_CATALOG_ETAG = hashlib.sha1(TOOL_CATALOG_JSON.encode('utf-8')).hexdigest()[:16]
+
+# Repositories for user data (STORAGE_BACKEND picks SQLite, PostgreSQL or the in-memory stand-in)
+store = create_storage()
+
+# Canned reply text is stored by template id (reply_codec.py)
+store.replies.register(harvest_templates(ai))
+
+# Posts written before excerpts were stored get theirs once (the feed never reads post bodies)
+store.community.backfill_summaries()
+
+# Archive old messages and insights as a recurring background job (RETENTION_ENABLED)
+@jobs.handler('retention', timeout=3600)
+def run_retention(payload):
+    users, rows = retention.run_once(store)
+    return {'users': users, 'rows': rows}
+
+if retention.ENABLED:
+    jobs.every('retention', retention.INTERVAL_SECONDS)
+
+@jobs.handler('purge_sessions')
+def purge_sessions(payload):
+    return {'deleted': session_interface.store.purge()}
+
+jobs.every('purge_sessions', 3600)
+
+# Rebuilds one user's insight counts (add_reply keeps them current; this is for repairs and
+# jobs queued before that)
+@jobs.handler('aggregate_insights')
+def aggregate_insights(payload):
+    return {'patterns': store.messages.aggregate_insights(payload['user_id'])}
+
+# Private full-text search (search.py); a store that just got the index is filled in the background
+@jobs.handler('search_reindex', timeout=3600)
+def search_reindex(payload):
+    return {'indexed': store.messages.reindex_search() + store.progress.reindex_search()}
+
+if store.messages.create_search_index():
+    jobs.enqueue('search_reindex')
+
+# Recent turns per active user, kept write-through by chat() (replies in stored form)
+conversation_cache = create_cache(render=store.replies.render)
 
 # Helper function to check subscription status
 def has_premium_access(user_id):
     """Check if user has active premium subscription that hasn't expired"""
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    c.execute("""SELECT subscription_status, expires_at FROM subscriptions 
-                 WHERE user_id = ?""", (user_id,))
-    result = c.fetchone()
-    conn.close()
+    result = store.subscriptions.get(user_id)
     
     if not result:
         return False
     
-    status, expires_at = result
+    status, expires_at = result[0], result[1]
     
     # Check if status is active or cancelled (but not expired yet)
     if status not in ['active', 'cancelled']:
@@ -4145,12 +4386,7 @@ def has_premium_access(user_id):
             expiry_date = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
             if datetime.now() > expiry_date:
                 # Subscription expired - update status
-                conn = sqlite3.connect('healing_guru_chat.db')
-                c = conn.cursor()
-                c.execute("""UPDATE subscriptions SET subscription_status = 'expired' 
-                           WHERE user_id = ?""", (user_id,))
-                conn.commit()
-                conn.close()
+                store.subscriptions.set_status(user_id, 'expired')
                 return False
         except:
             pass  # If date parsing fails, allow access (benefit of doubt)
@@ -4163,14 +4399,16 @@ def index():
     if 'user_id' not in session:
         session['user_id'] = secrets.token_hex(8)
     
-    # Get all active paths
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    c.execute("SELECT id, title, slug, summary, icon, duration FROM paths WHERE is_active = 1")
-    paths = c.fetchall()
-    conn.close()
+    def render():
+        # Get all active paths
+        conn = get_db()
+        c = conn.cursor()
+        c.execute("SELECT id, title, slug, summary, icon, duration FROM paths WHERE is_active = 1")
+        paths = c.fetchall()
+        conn.close()
+        return render_template('home.html', paths=paths)
     
-    return render_template('home.html', paths=paths)
+    return page_cache.response('home', render, request, private=True)
 
 @app.route('/health')
 def health_check():
@@ -4186,49 +4424,64 @@ def chat_page():
 
 @app.route('/path/<slug>')
 def path_detail(slug):
-    """Show path overview and modules"""
-    print(f"DEBUG: Accessing path with slug: {slug}")  # Debug line
-    user_id = session.get('user_id')
-    if not user_id:
+    """Show path overview and modules (the same page for everyone; see path_state for the user's part)"""
+    logger.debug("path viewed", extra={'slug': slug})
+    if not session.get('user_id'):
         session['user_id'] = secrets.token_hex(8)
-        user_id = session['user_id']
-    
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
-    # Get path info
-    c.execute("SELECT id, title, description, icon, duration FROM paths WHERE slug = ?", (slug,))
-    path = c.fetchone()
-    
-    print(f"DEBUG: Path found: {path}")  # Debug line
     
-    if not path:
+    def render():
+        conn = get_db()
+        c = conn.cursor()
+        
+        # Get path info
+        c.execute("SELECT id, title, description, icon, duration FROM paths WHERE slug = ?", (slug,))
+        path = c.fetchone()
+        
+        if not path:
+            conn.close()
+            return None
+        
+        # Get modules
+        c.execute("""SELECT id, step_number, title, purpose, is_free, estimated_minutes 
+                     FROM modules WHERE path_id = ? ORDER BY step_number""", (path[0],))
+        modules = c.fetchall()
+        
         conn.close()
-        print(f"DEBUG: No path found for slug: {slug}")  # Debug line
+        
+        # Rendered as a visitor without progress or premium; path_detail.js applies the user's state
+        return render_template('path_detail.html', 
+                              slug=slug,
+                              path=path, 
+                              modules=modules, 
+                              progress={},
+                              has_premium=False)
+    
+    response = page_cache.response(('path', slug), render, request, private=True)
+    if response is None:
+        logger.debug("path not found", extra={'slug': slug})
         return "Path not found", 404
+    return response
+
+@app.route('/api/path/<slug>/state')
+def path_state(slug):
+    """The user's completed modules and premium access for a path page"""
+    user_id = session.get('user_id')
     
-    path_id = path[0]
-    
-    # Get modules
-    c.execute("""SELECT id, step_number, title, purpose, is_free, estimated_minutes 
-                 FROM modules WHERE path_id = ? ORDER BY step_number""", (path_id,))
-    modules = c.fetchall()
-    
-    # Get user progress
-    c.execute("""SELECT module_id, completed_at FROM user_progress 
-                 WHERE user_id = ? AND path_id = ?""", (user_id, path_id))
-    progress = {row[0]: row[1] for row in c.fetchall()}
-    
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("SELECT id FROM paths WHERE slug = ?", (slug,))
+    path = c.fetchone()
     conn.close()
     
-    has_premium = has_premium_access(user_id)
+    if not path:
+        return jsonify({'error': 'Path not found'}), 404
     
-    return render_template('path_detail.html', 
-                          slug=slug,
-                          path=path, 
-                          modules=modules, 
-                          progress=progress,
-                          has_premium=has_premium)
+    progress = store.progress.for_path(user_id, path[0]) if user_id else {}
+    
+    return jsonify({
+        'completed': [module_id for module_id, completed_at in progress.items() if completed_at],
+        'has_premium': bool(user_id) and has_premium_access(user_id)
+    })
 
 @app.route('/path/<slug>/module/<int:step>')
 def module_view(slug, step):
@@ -4238,7 +4491,7 @@ def module_view(slug, step):
         session['user_id'] = secrets.token_hex(8)
         user_id = session['user_id']
     
-    conn = sqlite3.connect('healing_guru_chat.db')
+    conn = get_db()
     c = conn.cursor()
     
     # Get path and module
@@ -4263,24 +4516,19 @@ def module_view(slug, step):
     module_id = module[0]
     is_free = module[8]
     
+    conn.close()
+    
     # Check access
     has_premium = has_premium_access(user_id)
     if not is_free and not has_premium:
-        conn.close()
         return render_template('paywall.html', slug=slug, step=step)
     
     # Check if already completed
-    c.execute("""SELECT reflection_response, completed_at FROM user_progress 
-                 WHERE user_id = ? AND module_id = ?""", (user_id, module_id))
-    progress = c.fetchone()
+    progress = store.progress.get(user_id, module_id)
     
-    # Mark as started if not already
+    # Mark as started on the first visit only; later views are read-only
     if not progress:
-        c.execute("""INSERT INTO user_progress (user_id, path_id, module_id)
-                     VALUES (?, ?, ?)""", (user_id, path_id, module_id))
-        conn.commit()
-    
-    conn.close()
+        store.progress.start(user_id, path_id, module_id)
     
     return render_template('module.html', 
                           slug=slug, 
@@ -4295,24 +4543,10 @@ def complete_module(slug, step):
     data = request.json
     reflection = data.get('reflection', '')
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
-    # Get module
-    c.execute("""SELECT m.id FROM modules m
-                 JOIN paths p ON m.path_id = p.id
-                 WHERE p.slug = ? AND m.step_number = ?""", (slug, step))
-    module = c.fetchone()
-    
-    if module:
-        module_id = module[0]
-        c.execute("""UPDATE user_progress 
-                     SET completed_at = CURRENT_TIMESTAMP, reflection_response = ?
-                     WHERE user_id = ? AND module_id = ?""",
-                  (reflection, user_id, module_id))
-        conn.commit()
-    
-    conn.close()
+    ids = module_ids.get((slug, step))
+    if ids:
+        path_id, module_id = ids
+        store.progress.complete(user_id, path_id, module_id, reflection)
     
     return jsonify({'success': True, 'next_step': step + 1})
 
@@ -4324,16 +4558,8 @@ def activate_premium_test():
         session['user_id'] = secrets.token_hex(8)
         user_id = session['user_id']
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    # Delete existing subscription if any
-    c.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
-    # Insert new subscription
-    c.execute("""INSERT INTO subscriptions 
-                 (user_id, gumroad_license_key, subscription_status, started_at)
-                 VALUES (?, 'TEST_KEY', 'active', CURRENT_TIMESTAMP)""", (user_id,))
-    conn.commit()
-    conn.close()
+    # Replace any existing subscription
+    store.subscriptions.activate(user_id, 'TEST_KEY')
     
     return redirect('/')
 
@@ -4345,82 +4571,59 @@ def view_progress():
         session['user_id'] = secrets.token_hex(8)
         user_id = session['user_id']
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
+    rows = store.progress.for_user(user_id)
     
     # Get overall stats
-    c.execute("""SELECT COUNT(*) FROM user_progress 
-                 WHERE user_id = ? AND completed_at IS NOT NULL""", (user_id,))
-    total_completed = c.fetchone()[0]
-    
-    c.execute("""SELECT COUNT(DISTINCT path_id) FROM user_progress 
-                 WHERE user_id = ?""", (user_id,))
-    paths_started = c.fetchone()[0]
-    
-    c.execute("""SELECT COUNT(*) FROM user_progress 
-                 WHERE user_id = ? AND reflection_response IS NOT NULL""", (user_id,))
-    total_reflections = c.fetchone()[0]
-    
     stats = {
-        'total_completed': total_completed,
-        'paths_started': paths_started,
-        'total_reflections': total_reflections
+        'total_completed': sum(1 for row in rows if row[3] is not None),
+        'paths_started': len({row[0] for row in rows}),
+        'total_reflections': sum(1 for row in rows if row[4] is not None)
     }
     
-    # Get journey details
-    c.execute("""SELECT DISTINCT p.id, p.title, p.icon FROM paths p
-                 JOIN user_progress up ON p.id = up.path_id
-                 WHERE up.user_id = ?""", (user_id,))
-    paths = c.fetchall()
-    
+    # Get journey details (titles and module counts come from the catalog)
+    path_ids = list(dict.fromkeys(row[0] for row in rows))
     journeys = []
-    for path in paths:
-        path_id, path_title, path_icon = path
-        
-        # Get total modules
-        c.execute("SELECT COUNT(*) FROM modules WHERE path_id = ?", (path_id,))
-        total_modules = c.fetchone()[0]
-        
-        # Get completed modules
-        c.execute("""SELECT COUNT(*) FROM user_progress 
-                     WHERE user_id = ? AND path_id = ? AND completed_at IS NOT NULL""",
-                  (user_id, path_id))
-        completed = c.fetchone()[0]
+    if path_ids:
+        conn = get_db()
+        c = conn.cursor()
+        placeholders = ', '.join('?' for _ in path_ids)
+        c.execute(f"SELECT id, title, icon FROM paths WHERE id IN ({placeholders})", path_ids)
+        paths = c.fetchall()
+        c.execute(f"""SELECT id, path_id, step_number, title FROM modules
+                      WHERE path_id IN ({placeholders})""", path_ids)
+        modules = {row[0]: row for row in c.fetchall()}
+        conn.close()
         
-        # Get recent reflections
-        c.execute("""SELECT m.step_number, m.title, up.reflection_response, 
-                            DATE(up.completed_at) as date
-                     FROM user_progress up
-                     JOIN modules m ON up.module_id = m.id
-                     WHERE up.user_id = ? AND up.path_id = ? 
-                     AND up.reflection_response IS NOT NULL
-                     ORDER BY up.completed_at DESC LIMIT 3""",
-                  (user_id, path_id))
-        reflections = []
-        for row in c.fetchall():
-            reflections.append({
-                'step': row[0],
-                'title': row[1],
-                'text': row[2],
-                'date': row[3]
+        for path_id, path_title, path_icon in paths:
+            path_rows = [row for row in rows if row[0] == path_id]
+            
+            # Get recent reflections
+            reflected = sorted((row for row in path_rows if row[4] is not None and row[1] in modules),
+                               key=lambda row: row[3] or '', reverse=True)[:3]
+            reflections = []
+            for row in reflected:
+                module = modules[row[1]]
+                reflections.append({
+                    'step': module[2],
+                    'title': module[3],
+                    'text': row[4],
+                    'date': row[3][:10] if row[3] else None
+                })
+            
+            journeys.append({
+                'title': path_title,
+                'icon': path_icon,
+                'total': sum(1 for module in modules.values() if module[1] == path_id),
+                'completed': sum(1 for row in path_rows if row[3] is not None),
+                'reflections': reflections
             })
-        
-        journeys.append({
-            'title': path_title,
-            'icon': path_icon,
-            'total': total_modules,
-            'completed': completed,
-            'reflections': reflections
-        })
-    
-    conn.close()
     
     return render_template('progress.html', stats=stats, journeys=journeys)
 
 @app.route('/debug-db')
 def debug_db():
     """Debug route to check database contents"""
-    conn = sqlite3.connect('healing_guru_chat.db')
+    conn = get_db()
     c = conn.cursor()
     
     c.execute("SELECT * FROM paths")
@@ -4437,12 +4640,44 @@ def debug_db():
         'message': f'Found {len(paths)} paths and {module_count} modules'
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus-style metrics (404 unless METRICS_ENABLED is set)"""
+    if not metrics.ENABLED:
+        return "Not found", 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/queries')
+def debug_queries():
+    """Query profiler stats for query_profiler.py (404 unless QUERY_PROFILER is set)"""
+    if not query_profiler.ENABLED:
+        return "Not found", 404
+    if query_profiler.PROFILER_TOKEN and request.headers.get('X-Profiler-Token') != query_profiler.PROFILER_TOKEN:
+        return jsonify({'error': 'Invalid profiler token'}), 403
+    
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'mean_ms', 'calls', 'rows'):
+        sort = 'total_ms'
+    queries = query_profiler.top(request.args.get('limit', 20, type=int), sort)
+    if request.args.get('reset'):
+        query_profiler.reset()
+    return jsonify({'queries': queries, 'slow_query_ms': query_profiler.SLOW_QUERY_MS})
+
 @app.route('/googleccc479b763b17be8.html')
 def google_verification():
     """Serve Google site verification file"""
     from flask import Response
     return Response('google-site-verification: googleccc479b763b17be8.html', mimetype='text/plain')
 
+def path_badges():
+    """{slug: (title, icon)} for every path, to label community posts"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("SELECT slug, title, icon FROM paths")
+    badges = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+    conn.close()
+    return badges
+
 @app.route('/community')
 def community():
     """Community discussion board"""
@@ -4455,43 +4690,67 @@ def community():
     path_filter = request.args.get('path', 'all')
     category_filter = request.args.get('category', 'all')
     
-    conn = sqlite3.connect('healing_guru_chat.db')
+    conn = get_db()
     c = conn.cursor()
     
     # Get all paths for filter dropdown
     c.execute("SELECT slug, title, icon FROM paths WHERE is_active = 1")
     paths = c.fetchall()
+    conn.close()
     
-    # Build query based on filters
-    query = """SELECT cp.id, cp.display_name, cp.path_slug, cp.category, cp.title, 
-                      cp.content, cp.created_at,
-                      (SELECT COUNT(*) FROM community_comments WHERE post_id = cp.id) as comment_count,
-                      p.title as path_title, p.icon as path_icon
-               FROM community_posts cp
-               LEFT JOIN paths p ON cp.path_slug = p.slug
-               WHERE 1=1"""
-    params = []
+    # Get posts matching the filters, with path title and icon from the catalog
+    posts = store.community.feed(path_slug=None if path_filter == 'all' else path_filter,
+                                 category=None if category_filter == 'all' else category_filter)
+    badges = path_badges()
+    posts = [post + badges.get(post[2], (None, None)) for post in posts]
     
-    if path_filter != 'all':
-        query += " AND cp.path_slug = ?"
-        params.append(path_filter)
+    return render_template('community.html', 
+                          posts=posts, 
+                          paths=paths,
+                          current_path=path_filter,
+                          current_category=category_filter)
+
+@app.route('/community/search')
+def community_search():
+    """Full-text search over community posts and comments, best match first"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return redirect('/community')
+    path_filter = request.args.get('path', 'all')
+    category_filter = request.args.get('category', 'all')
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
     
-    if category_filter != 'all':
-        query += " AND cp.category = ?"
-        params.append(category_filter)
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("SELECT slug, title, icon FROM paths WHERE is_active = 1")
+    paths = c.fetchall()
+    conn.close()
     
-    query += " ORDER BY cp.created_at DESC LIMIT 50"
+    posts, has_more = store.community.search(query,
+                                             path_slug=None if path_filter == 'all' else path_filter,
+                                             category=None if category_filter == 'all' else category_filter,
+                                             page=page)
+    badges = path_badges()
+    posts = [post[:5] + (search.highlight(post[5]),) + post[6:] + badges.get(post[2], (None, None))
+             for post in posts]
     
-    c.execute(query, params)
-    posts = c.fetchall()
+    args = {key: value for key, value in request.args.items() if key != 'page'}
     
-    conn.close()
+    def page_url(number):
+        return '/community/search?' + urlencode({**args, 'page': number})
     
-    return render_template('community.html', 
-                          posts=posts, 
+    return render_template('community.html',
+                          posts=posts,
                           paths=paths,
                           current_path=path_filter,
-                          current_category=category_filter)
+                          current_category=category_filter,
+                          query=query,
+                          page=page,
+                          prev_url=page_url(page - 1) if page > 1 else None,
+                          next_url=page_url(page + 1) if has_more else None)
 
 @app.route('/community/post/<int:post_id>')
 def view_post(post_id):
@@ -4501,30 +4760,15 @@ def view_post(post_id):
         session['user_id'] = secrets.token_hex(8)
         user_id = session['user_id']
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
     # Get post
-    c.execute("""SELECT cp.id, cp.display_name, cp.path_slug, cp.category, cp.title, 
-                        cp.content, cp.created_at,
-                        p.title as path_title, p.icon as path_icon
-                 FROM community_posts cp
-                 LEFT JOIN paths p ON cp.path_slug = p.slug
-                 WHERE cp.id = ?""", (post_id,))
-    post = c.fetchone()
+    post = store.community.get_post(post_id)
     
     if not post:
-        conn.close()
         return "Post not found", 404
+    post = post + path_badges().get(post[2], (None, None))
     
     # Get comments
-    c.execute("""SELECT id, display_name, content, created_at
-                 FROM community_comments 
-                 WHERE post_id = ? 
-                 ORDER BY created_at ASC""", (post_id,))
-    comments = c.fetchall()
-    
-    conn.close()
+    comments = store.community.comments(post_id)
     
     return render_template('community_post.html', post=post, comments=comments)
 
@@ -4546,22 +4790,12 @@ def new_post():
         if not all([category, title, content]):
             return "Missing required fields", 400
         
-        conn = sqlite3.connect('healing_guru_chat.db')
-        c = conn.cursor()
-        
-        c.execute("""INSERT INTO community_posts 
-                     (user_id, display_name, path_slug, category, title, content)
-                     VALUES (?, ?, ?, ?, ?, ?)""",
-                  (user_id, display_name, path_slug, category, title, content))
-        
-        post_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        post_id = store.community.create_post(user_id, display_name, path_slug, category, title, content)
         
         return redirect(f'/community/post/{post_id}')
     
     # GET: Show form
-    conn = sqlite3.connect('healing_guru_chat.db')
+    conn = get_db()
     c = conn.cursor()
     c.execute("SELECT slug, title, icon FROM paths WHERE is_active = 1")
     paths = c.fetchall()
@@ -4583,20 +4817,21 @@ def add_comment(post_id):
     if not content:
         return "Comment content required", 400
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
-    c.execute("""INSERT INTO community_comments 
-                 (post_id, user_id, display_name, content)
-                 VALUES (?, ?, ?, ?)""",
-              (post_id, user_id, display_name, content))
-    
-    conn.commit()
-    conn.close()
+    store.community.add_comment(post_id, user_id, display_name, content)
     
     return redirect(f'/community/post/{post_id}')
 
+# Token buckets per user and IP plus admission control for chat turns (rate_limit.py)
+chat_limiter = rate_limit.ChatLimiter()
+
+def is_crisis_request(req):
+    """Crisis messages are never rate limited: the message alone scores in the crisis range"""
+    data = req.get_json(silent=True) or {}
+    message = data.get('message')
+    return isinstance(message, str) and ai.message_intensity(message) >= ai.CRISIS_INTENSITY
+
 @app.route('/api/chat', methods=['POST'])
+@rate_limit.limited(chat_limiter, exempt=is_crisis_request)
 def chat():
     try:
         data = request.json
@@ -4606,25 +4841,23 @@ def chat():
         if not user_id:
             return jsonify({'error': 'No session found'}), 400
         
-        # Connect to database with timeout
-        conn = sqlite3.connect('healing_guru_chat.db', timeout=5)
-        c = conn.cursor()
-        
-        # Get conversation history
-        c.execute('SELECT role, content FROM messages WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10',
-                  (user_id,))
-        history = c.fetchall()
+        # Get conversation history (from the cache; the database only on a user's first turn)
+        history = conversation_cache.get(user_id)
+        if history is None:
+            stored = store.messages.recent(user_id, 10, rendered=False)
+            conversation_cache.load(user_id, stored)
+            history = [(role, store.messages.render(role, content)) for role, content in stored]
         
         # Save user message
-        c.execute('INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)',
-                  (user_id, 'user', user_message))
-        conn.commit()
+        store.messages.add(user_id, 'user', user_message)
+        conversation_cache.append(user_id, 'user', user_message)
         
         # Generate AI response with history
         try:
             ai_analysis = ai.analyze_message(user_message, history)
-        except Exception as ai_error:
-            print(f"AI Error: {str(ai_error)}")
+            metrics.record_chat_outcome(ai_analysis)
+        except Exception:
+            logger.exception("AI analysis failed", extra={'user_id': user_id})
             # Fallback response if AI fails
             ai_analysis = {
                 'response': "I'm here with you. Tell me more about what you're experiencing.",
@@ -4632,18 +4865,12 @@ def chat():
                 'emotion': None,
                 'needs_tool': False
             }
+            metrics.record_chat_outcome(ai_analysis, ai_error=True)
         
-        # Save AI response
-        c.execute('INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)',
-                  (user_id, 'assistant', ai_analysis['response']))
-        
-        # Save detected pattern if exists
-        if ai_analysis.get('pattern'):
-            c.execute('INSERT INTO insights (user_id, pattern_type, description) VALUES (?, ?, ?)',
-                      (user_id, ai_analysis['pattern'], user_message[:200]))
-        
-        conn.commit()
-        conn.close()
+        # Save AI response (and the detected pattern, if any)
+        stored_reply = store.messages.add_reply(user_id, ai_analysis['response'],
+                                                ai_analysis.get('pattern'), user_message[:200])
+        conversation_cache.append(user_id, 'assistant', stored_reply)
         
         # Build response
         response_data = {
@@ -4652,18 +4879,24 @@ def chat():
             'emotion': ai_analysis.get('emotion')
         }
         
-        # Include tools if recommended
+        # Insight count change from this turn, merged into the insights panel client-side
+        if ai_analysis.get('pattern'):
+            response_data['insight_delta'] = {
+                'pattern': ai_analysis['pattern'],
+                'count': 1,
+                'last_seen': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        
+        # Include tools if recommended (by id - client resolves them from /api/tools)
         if ai_analysis.get('needs_tool') and ai_analysis.get('recommended_tools'):
-            response_data['urgent_tools'] = ai_analysis['recommended_tools']
+            response_data['tool_ids'] = [tool['id'] for tool in ai_analysis['recommended_tools']]
         elif ai_analysis.get('needs_tool'):
-            response_data['urgent_tools'] = ai.coping_tools[:3]
+            response_data['tool_ids'] = [tool['id'] for tool in ai.coping_tools[:3]]
         
         return jsonify(response_data)
     
-    except Exception as e:
-        print(f"CHAT ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("chat request failed")
         return jsonify({
             'message': "I'm having trouble connecting right now. Please try again.",
             'pattern': None,
@@ -4684,6 +4917,15 @@ def get_tool():
     
     return jsonify({'tools': relevant_tools})
 
+@app.route('/api/tools', methods=['GET'])
+def get_tool_catalog():
+    """Cacheable catalog of coping tools, referenced by id from chat replies"""
+    response = Response(TOOL_CATALOG_JSON, mimetype='application/json')
+    response.set_etag(TOOL_CATALOG_ETAG)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
+
 @app.route('/api/affirmation', methods=['POST'])
 def get_affirmation():
     """Get a random affirmation"""
@@ -4699,46 +4941,86 @@ def get_affirmation():
 
 @app.route('/api/insights', methods=['GET'])
 def get_insights():
-    """Get user's pattern insights"""
+    """Get user's pattern insights (revalidated with ETag / If-None-Match)"""
     user_id = session.get('user_id')
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    c.execute('''SELECT pattern_type, COUNT(*) as count, MAX(detected_at) as last_seen
-                 FROM insights WHERE user_id = ?
-                 GROUP BY pattern_type ORDER BY count DESC''',
-              (user_id,))
-    
     insights = []
-    for row in c.fetchall():
+    for row in store.messages.insight_summary(user_id):
         insights.append({
             'pattern': row[0],
             'count': row[1],
             'last_seen': row[2]
         })
     
-    conn.close()
-    return jsonify({'insights': insights})
+    body = json.dumps({'insights': insights})
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode('utf-8')).hexdigest()[:16])
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+@app.route('/api/search', methods=['GET'])
+def search_history():
+    """Search the user's own conversations, journal and module reflections.
+    Message hits come with the turns around them (?context=N, up to 5)."""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'results': [], 'page': 1, 'has_more': False})
+    
+    query = request.args.get('q', '')
+    kinds = [kind for kind in request.args.get('kinds', '').split(',') if kind in search.USER_KINDS]
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        context_size = min(5, max(0, int(request.args.get('context', 2))))
+    except ValueError:
+        return jsonify({'error': 'page and context must be numbers'}), 400
+    
+    rows, has_more = store.messages.search(user_id, query, kinds=kinds or None, page=page)
+    
+    # Reflections are labelled with their module from the catalog
+    module_ids = [row[1] for row in rows if row[0] == 'reflection']
+    modules = {}
+    if module_ids:
+        conn = get_db()
+        c = conn.cursor()
+        c.execute(f"""SELECT m.id, m.title, m.step_number, p.slug FROM modules m
+                      JOIN paths p ON p.id = m.path_id
+                      WHERE m.id IN ({', '.join('?' for _ in module_ids)})""", module_ids)
+        modules = {row[0]: row for row in c.fetchall()}
+        conn.close()
+    
+    results = []
+    for kind, ref_id, created_at, snippet in rows:
+        result = {'kind': kind, 'id': ref_id, 'timestamp': created_at, 'snippet': str(search.highlight(snippet))}
+        if kind == 'message' and context_size:
+            result['context'] = [
+                {'id': row[0], 'role': row[1], 'content': row[2], 'timestamp': row[3], 'match': row[0] == ref_id}
+                for row in store.messages.context(user_id, ref_id, context_size)
+            ]
+        elif kind == 'reflection' and ref_id in modules:
+            _, title, step, slug = modules[ref_id]
+            result['module'] = {'title': title, 'url': f'/path/{slug}/module/{step}'}
+        results.append(result)
+    
+    response = jsonify({'results': results, 'page': page, 'has_more': has_more})
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
     """Get conversation history"""
     user_id = session.get('user_id')
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    c.execute('SELECT role, content, timestamp FROM messages WHERE user_id = ? ORDER BY timestamp',
-              (user_id,))
-    
     messages = []
-    for row in c.fetchall():
+    for row in store.messages.history(user_id):
         messages.append({
             'role': row[0],
             'content': row[1],
             'timestamp': row[2]
         })
     
-    conn.close()
     return jsonify({'messages': messages})
 
 # ===== GDPR COMPLIANCE ROUTES =====
@@ -4746,12 +5028,12 @@ def get_history():
 @app.route('/privacy')
 def privacy_policy():
     """Privacy Policy page (GDPR Article 13 compliance)"""
-    return render_template('privacy.html')
+    return page_cache.response('privacy', lambda: render_template('privacy.html'), request, max_age=3600)
 
 @app.route('/terms')
 def terms_of_service():
     """Terms of Service page"""
-    return render_template('terms.html')
+    return page_cache.response('terms', lambda: render_template('terms.html'), request, max_age=3600)
 
 @app.route('/account')
 def account_dashboard():
@@ -4760,35 +5042,20 @@ def account_dashboard():
     if not user_id:
         return redirect('/')
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
     # Get user data statistics
-    c.execute('SELECT COUNT(*) FROM messages WHERE user_id = ?', (user_id,))
-    message_count = c.fetchone()[0]
-    
-    c.execute('SELECT COUNT(*) FROM journal WHERE user_id = ?', (user_id,))
-    journal_count = c.fetchone()[0]
-    
-    c.execute('SELECT COUNT(*) FROM community_posts WHERE user_id = ?', (user_id,))
-    post_count = c.fetchone()[0]
-    
-    c.execute('SELECT COUNT(*) FROM user_progress WHERE user_id = ? AND completed_at IS NOT NULL', (user_id,))
-    completed_modules = c.fetchone()[0]
+    message_count, journal_count, first_activity = store.messages.stats(user_id)
+    post_count = store.community.count_posts(user_id)
+    completed_modules = sum(1 for row in store.progress.for_user(user_id) if row[3] is not None)
     
     # Get account info
-    c.execute('SELECT MIN(timestamp) FROM messages WHERE user_id = ?', (user_id,))
-    first_activity = c.fetchone()[0]
     member_since = first_activity[:10] if first_activity else 'Recent'
     
     # Get subscription status
-    c.execute('SELECT subscription_status FROM subscriptions WHERE user_id = ?', (user_id,))
-    sub_result = c.fetchone()
+    sub_result = store.subscriptions.get(user_id)
     subscription_status = sub_result[0] if sub_result else 'Free Tier'
     
     # Get consent info
-    c.execute('SELECT cookies_accepted, data_processing_accepted, consent_date FROM user_consent WHERE user_id = ?', (user_id,))
-    consent_result = c.fetchone()
+    consent_result = store.consent.get(user_id)
     
     if consent_result:
         consent = {
@@ -4803,8 +5070,6 @@ def account_dashboard():
         }
         consent_date = 'Not given'
     
-    conn.close()
-    
     stats = {
         'messages': message_count,
         'journal_entries': journal_count,
@@ -4832,23 +5097,11 @@ def record_consent():
     analytics = data.get('analytics', False)
     processing = data.get('processing', False)
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
     # Get IP address (for consent verification)
     ip_address = request.headers.get('X-Forwarded-For', request.remote_addr)
     
     # Insert or update consent
-    c.execute('''INSERT INTO user_consent (user_id, cookies_accepted, data_processing_accepted, ip_address, last_updated)
-                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-                 ON CONFLICT(user_id) DO UPDATE SET
-                 cookies_accepted = ?,
-                 data_processing_accepted = ?,
-                 last_updated = CURRENT_TIMESTAMP''',
-              (user_id, analytics, processing, ip_address, analytics, processing))
-    
-    conn.commit()
-    conn.close()
+    store.consent.record(user_id, analytics, processing, ip_address)
     
     return jsonify({'success': True})
 
@@ -4863,91 +5116,96 @@ def update_consent():
     consent_type = data.get('type')  # 'cookies' or 'processing'
     value = data.get('value', False)
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
-    if consent_type == 'cookies':
-        c.execute('''UPDATE user_consent SET cookies_accepted = ?, last_updated = CURRENT_TIMESTAMP WHERE user_id = ?''',
-                  (value, user_id))
-    elif consent_type == 'processing':
-        c.execute('''UPDATE user_consent SET data_processing_accepted = ?, last_updated = CURRENT_TIMESTAMP WHERE user_id = ?''',
-                  (value, user_id))
-    
-    conn.commit()
-    conn.close()
+    store.consent.update(user_id, consent_type, value)
     
     return jsonify({'success': True})
 
-@app.route('/account/export')
-def export_data():
-    """Export all user data as JSON (GDPR Article 20 - Right to Data Portability)"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return redirect('/')
-    
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
-    # Collect all user data
+def build_export(user_id):
+    """Everything stored about a user, as the account export document"""
     export_data = {
         'export_date': datetime.now().isoformat(),
         'user_id': user_id,
         'data': {}
     }
     
-    # Messages
-    c.execute('SELECT role, content, timestamp FROM messages WHERE user_id = ? ORDER BY timestamp', (user_id,))
-    export_data['data']['messages'] = [{'role': r[0], 'content': r[1], 'timestamp': r[2]} for r in c.fetchall()]
+    # Messages, journal entries and insights
+    export_data['data'].update(store.messages.export(user_id))
     
-    # Journal entries
-    c.execute('SELECT emotion, intensity, content, timestamp FROM journal WHERE user_id = ? ORDER BY timestamp', (user_id,))
-    export_data['data']['journal'] = [{'emotion': r[0], 'intensity': r[1], 'content': r[2], 'timestamp': r[3]} for r in c.fetchall()]
-    
-    # Insights
-    c.execute('SELECT pattern_type, description, detected_at FROM insights WHERE user_id = ? ORDER BY detected_at', (user_id,))
-    export_data['data']['insights'] = [{'pattern': r[0], 'description': r[1], 'detected_at': r[2]} for r in c.fetchall()]
-    
-    # Module progress
-    c.execute('''SELECT p.title, m.title, up.started_at, up.completed_at, up.reflection_response 
-                 FROM user_progress up 
-                 JOIN modules m ON up.module_id = m.id 
-                 JOIN paths p ON up.path_id = p.id 
-                 WHERE up.user_id = ? 
-                 ORDER BY up.started_at''', (user_id,))
-    export_data['data']['progress'] = [{'path': r[0], 'module': r[1], 'started': r[2], 'completed': r[3], 'reflection': r[4]} for r in c.fetchall()]
-    
-    # Community posts
-    c.execute('SELECT title, content, category, path_slug, created_at FROM community_posts WHERE user_id = ? ORDER BY created_at', (user_id,))
-    export_data['data']['community_posts'] = [{'title': r[0], 'content': r[1], 'category': r[2], 'path': r[3], 'created_at': r[4]} for r in c.fetchall()]
+    # Module progress (path and module titles from the catalog)
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('SELECT m.id, m.title, p.title FROM modules m JOIN paths p ON m.path_id = p.id')
+    module_titles = {r[0]: (r[2], r[1]) for r in c.fetchall()}
+    conn.close()
+    export_data['data']['progress'] = [
+        {'path': module_titles[r[1]][0], 'module': module_titles[r[1]][1], 'started': r[2], 'completed': r[3], 'reflection': r[4]}
+        for r in store.progress.for_user(user_id) if r[1] in module_titles
+    ]
     
-    # Community comments
-    c.execute('SELECT content, post_id, created_at FROM community_comments WHERE user_id = ? ORDER BY created_at', (user_id,))
-    export_data['data']['community_comments'] = [{'content': r[0], 'post_id': r[1], 'created_at': r[2]} for r in c.fetchall()]
+    # Community posts and comments
+    export_data['data'].update(store.community.export(user_id))
     
     # Subscription info (excluding sensitive payment details)
-    c.execute('SELECT subscription_status, started_at FROM subscriptions WHERE user_id = ?', (user_id,))
-    sub = c.fetchone()
+    sub = store.subscriptions.get(user_id)
     if sub:
-        export_data['data']['subscription'] = {'status': sub[0], 'started': sub[1]}
+        export_data['data']['subscription'] = {'status': sub[0], 'started': sub[2]}
     
     # Consent records
-    c.execute('SELECT cookies_accepted, data_processing_accepted, consent_date FROM user_consent WHERE user_id = ?', (user_id,))
-    consent = c.fetchone()
+    consent = store.consent.get(user_id)
     if consent:
         export_data['data']['consent'] = {'cookies': consent[0], 'processing': consent[1], 'date': consent[2]}
     
-    conn.close()
+    return export_data
+
+@jobs.handler('account_export')
+def run_account_export(payload):
+    return build_export(payload['user_id'])
+
+# Export requests this close together (a double-click, a resubmitted form) share one export;
+# any later request builds a fresh one, so it includes everything up to that moment
+EXPORT_DEDUPE_SECONDS = 10
+
+@app.route('/account/export')
+def export_data():
+    """Export all user data as JSON (GDPR Article 20 - Right to Data Portability)"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return redirect('/')
     
-    # Return as downloadable JSON file
-    from flask import Response
-    import json
+    # Built by a background job
+    window = int(datetime.now().timestamp()) // EXPORT_DEDUPE_SECONDS
+    job_id = jobs.enqueue('account_export', {'user_id': user_id},
+                          idempotency_key=f"account_export:{user_id}:{window}")
+    return redirect(f'/account/export/{job_id}')
+
+@app.route('/account/export/<int:job_id>')
+def export_download(job_id):
+    """Download a finished export, or a page that refreshes until it is ready"""
+    user_id = session.get('user_id')
+    job = jobs.get(job_id)
+    if not user_id or not job or job['kind'] != 'account_export' or job['payload'].get('user_id') != user_id:
+        return redirect('/account')
     
-    response = Response(
-        json.dumps(export_data, indent=2),
-        mimetype='application/json',
-        headers={'Content-Disposition': f'attachment;filename=valiant_growth_data_{user_id[:8]}.json'}
-    )
-    return response
+    if job['status'] == 'done':
+        return Response(
+            json.dumps(job['result'], indent=2),
+            mimetype='application/json',
+            headers={'Content-Disposition': f'attachment;filename=valiant_growth_data_{user_id[:8]}.json'}
+        )
+    if job['status'] == 'failed':
+        return Response('Your export could not be prepared. Please try again later.', status=500, mimetype='text/plain')
+    return Response('Preparing your data export...', status=202, mimetype='text/plain', headers={'Refresh': '2'})
+
+@jobs.handler('account_delete')
+def run_account_delete(payload):
+    user_id = payload['user_id']
+    store.messages.delete_user(user_id)
+    store.progress.delete_user(user_id)
+    store.community.delete_user(user_id)
+    store.subscriptions.delete_user(user_id)
+    store.consent.delete_user(user_id)
+    conversation_cache.invalidate(user_id)
+    jobs.discard('account_export', f'account_export:{user_id}:')
 
 @app.route('/account/delete', methods=['POST'])
 def delete_account():
@@ -4961,21 +5219,9 @@ def delete_account():
     if confirm != 'DELETE':
         return redirect('/account')
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
-    # Delete all user data (CASCADE or manual deletion)
-    c.execute('DELETE FROM messages WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM journal WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM insights WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM user_progress WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM community_posts WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM community_comments WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM subscriptions WHERE user_id = ?', (user_id,))
-    c.execute('DELETE FROM user_consent WHERE user_id = ?', (user_id,))
-    
-    conn.commit()
-    conn.close()
+    # Data is deleted by a background job; the session ends now
+    jobs.enqueue('account_delete', {'user_id': user_id}, idempotency_key=f'account_delete:{user_id}')
+    conversation_cache.invalidate(user_id)
     
     # Clear session
     session.clear()
@@ -4985,6 +5231,66 @@ def delete_account():
 
 # ===== GUMROAD WEBHOOK FOR SUBSCRIPTION MANAGEMENT =====
 
+def gumroad_subscription_status(data):
+    """Subscription status a Gumroad delivery results in (Gumroad doesn't send an explicit event type)"""
+    recurrence = data.get('recurrence')  # 'monthly', 'cancelled', etc.
+    refunded = data.get('refunded') == 'true'
+    
+    if refunded:
+        return 'refunded'
+    elif recurrence == 'cancelled':
+        return 'cancelled'
+    elif recurrence == 'monthly':
+        return 'active'
+    else:
+        return 'active'  # Default for new sales
+
+def process_gumroad_webhook(data):
+    """Apply one Gumroad webhook delivery from the inbox (see webhook_inbox.py)"""
+    # Extract relevant fields
+    email = data.get('email')
+    license_key = data.get('license_key')
+    subscription_status = gumroad_subscription_status(data)
+    
+    # Calculate expiration date (30 days from now for active subscriptions)
+    from datetime import datetime, timedelta
+    if subscription_status == 'active':
+        expires_at = (datetime.now() + timedelta(days=30)).isoformat()
+    elif subscription_status == 'cancelled':
+        # If cancelled, set expiration to end of current billing period (30 days from start)
+        # Allow continued access until period ends
+        expires_at = (datetime.now() + timedelta(days=30)).isoformat()
+    else:
+        expires_at = datetime.now().isoformat()  # Expired immediately for refunds
+    
+    # Try to find existing subscription by license key or email
+    existing = store.subscriptions.user_for_license(license_key)
+    
+    if existing:
+        # Update existing subscription
+        user_id = existing[0]
+        store.subscriptions.set_status(user_id, subscription_status, expires_at)
+        
+        # Log the update
+        logger.info("webhook updated subscription",
+                    extra={'user_id': user_id, 'status': subscription_status, 'expires_at': expires_at})
+    else:
+        # New subscription - create placeholder
+        # Note: User will need to verify license key on first login to link to their session
+        # We can't create a user_id here because we don't have their session
+        logger.info("webhook received new subscription",
+                    extra={'license_key': license_key, 'status': subscription_status})
+        # Store in a separate table for pending verification
+        store.subscriptions.add_pending(license_key, email, subscription_status, expires_at)
+
+@jobs.handler('gumroad_inbox')
+def process_gumroad_inbox(payload):
+    applied, failed = webhook_inbox.drain(process_gumroad_webhook)
+    return {'applied': applied, 'failed': failed}
+
+# Picks up deliveries left waiting by a failure backoff or a lost lease
+jobs.every('gumroad_inbox', 60)
+
 @app.route('/webhook/gumroad', methods=['POST'])
 def gumroad_webhook():
     """
@@ -4998,83 +5304,24 @@ def gumroad_webhook():
     
     Configure in Gumroad: Settings → Advanced → Webhooks
     Webhook URL: https://your-domain.up.railway.app/webhook/gumroad
+    
+    The raw delivery is stored in the inbox and acknowledged at once; a background
+    job applies it (process_gumroad_webhook). Resent deliveries are dropped there.
     """
     try:
         # Get webhook data from Gumroad
         data = request.form.to_dict()
         
-        # Extract relevant fields
-        event_type = data.get('sale_id') and 'sale'  # Gumroad doesn't send explicit event type
-        email = data.get('email')
-        license_key = data.get('license_key')
-        recurrence = data.get('recurrence')  # 'monthly', 'cancelled', etc.
-        refunded = data.get('refunded') == 'true'
+        dedupe_key = None
+        if data.get('sale_id'):
+            dedupe_key = f"{data['sale_id']}:{gumroad_subscription_status(data)}"
+        if webhook_inbox.record(data, dedupe_key):
+            jobs.enqueue('gumroad_inbox')
         
-        # Determine subscription status
-        if refunded:
-            subscription_status = 'refunded'
-        elif recurrence == 'cancelled':
-            subscription_status = 'cancelled'
-        elif recurrence == 'monthly':
-            subscription_status = 'active'
-        else:
-            subscription_status = 'active'  # Default for new sales
-        
-        # Calculate expiration date (30 days from now for active subscriptions)
-        from datetime import datetime, timedelta
-        if subscription_status == 'active':
-            expires_at = (datetime.now() + timedelta(days=30)).isoformat()
-        elif subscription_status == 'cancelled':
-            # If cancelled, set expiration to end of current billing period (30 days from start)
-            # Allow continued access until period ends
-            expires_at = (datetime.now() + timedelta(days=30)).isoformat()
-        else:
-            expires_at = datetime.now().isoformat()  # Expired immediately for refunds
-        
-        conn = sqlite3.connect('healing_guru_chat.db')
-        c = conn.cursor()
-        
-        # Try to find existing subscription by license key or email
-        c.execute("""SELECT user_id FROM subscriptions WHERE gumroad_license_key = ?""", (license_key,))
-        existing = c.fetchone()
-        
-        if existing:
-            # Update existing subscription
-            user_id = existing[0]
-            c.execute("""UPDATE subscriptions 
-                       SET subscription_status = ?,
-                           expires_at = ?
-                       WHERE user_id = ?""",
-                     (subscription_status, expires_at, user_id))
-            
-            # Log the update
-            print(f"[WEBHOOK] Updated subscription for user {user_id}: {subscription_status}, expires: {expires_at}")
-        else:
-            # New subscription - create placeholder
-            # Note: User will need to verify license key on first login to link to their session
-            # We can't create a user_id here because we don't have their session
-            print(f"[WEBHOOK] New subscription received: {license_key}, status: {subscription_status}")
-            # Store in a separate table for pending verification
-            c.execute("""CREATE TABLE IF NOT EXISTS pending_subscriptions
-                       (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        license_key TEXT UNIQUE,
-                        email TEXT,
-                        subscription_status TEXT,
-                        expires_at DATETIME,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
-            
-            c.execute("""INSERT OR REPLACE INTO pending_subscriptions 
-                       (license_key, email, subscription_status, expires_at)
-                       VALUES (?, ?, ?, ?)""",
-                     (license_key, email, subscription_status, expires_at))
-        
-        conn.commit()
-        conn.close()
-        
-        return jsonify({'success': True, 'message': 'Webhook processed'}), 200
+        return jsonify({'success': True, 'message': 'Webhook received'}), 200
         
     except Exception as e:
-        print(f"[WEBHOOK ERROR] {str(e)}")
+        logger.exception("webhook recording failed")
         return jsonify({'error': str(e)}), 400
 
 @app.route('/verify-license', methods=['POST'])
@@ -5093,29 +5340,11 @@ def verify_license():
     if not license_key:
         return jsonify({'error': 'License key required'}), 400
     
-    conn = sqlite3.connect('healing_guru_chat.db')
-    c = conn.cursor()
-    
-    # Check if license key exists in pending subscriptions
-    c.execute("""SELECT email, subscription_status, expires_at 
-                 FROM pending_subscriptions 
-                 WHERE license_key = ?""", (license_key,))
-    pending = c.fetchone()
+    # Move a pending purchase with this key (if any) to active subscriptions
+    pending = store.subscriptions.claim_pending(user_id, license_key)
     
     if pending:
-        email, status, expires_at = pending
-        
-        # Move to active subscriptions table
-        c.execute("""INSERT OR REPLACE INTO subscriptions 
-                   (user_id, gumroad_license_key, subscription_status, expires_at, started_at)
-                   VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)""",
-                 (user_id, license_key, status, expires_at))
-        
-        # Remove from pending
-        c.execute("""DELETE FROM pending_subscriptions WHERE license_key = ?""", (license_key,))
-        
-        conn.commit()
-        conn.close()
+        status, expires_at = pending
         
         return jsonify({
             'success': True,
@@ -5125,27 +5354,26 @@ def verify_license():
         })
     else:
         # Check if already verified
-        c.execute("""SELECT subscription_status FROM subscriptions 
-                   WHERE gumroad_license_key = ?""", (license_key,))
-        existing = c.fetchone()
-        conn.close()
+        existing = store.subscriptions.user_for_license(license_key)
         
         if existing:
             return jsonify({
                 'success': True,
                 'message': 'License already verified',
-                'status': existing[0]
+                'status': existing[1]
             })
         else:
             return jsonify({
                 'error': 'Invalid license key or not found. Please check your Gumroad purchase confirmation email.'
             }), 404
 
+# Run queued jobs on a worker thread unless a separate worker process does (JOBS_WORKER)
+jobs.start()
+
 if __name__ == '__main__':
     import os
-    print("Starting Healing Guru app...")
-    print(f"Python version: {os.sys.version}")
-    print(f"PORT: {os.environ.get('PORT', '5002')}")
+    logger.info("starting Healing Guru app",
+                extra={'python_version': os.sys.version, 'port': os.environ.get('PORT', '5002')})
     
     # Get port from environment variable (Railway) or use 5002 for local
     port = int(os.environ.get('PORT', 5002))
@@ -0,0 +1,152 @@
+"""
+Structured JSON logging for Healing Guru.
+
+Request threads only build a LogRecord and put it on a queue; a background
+QueueListener does the JSON encoding, redaction and the actual write, so a
+slow stdout never holds up a request. Every line carries the request id
+(taken from X-Request-ID or generated) so one request can be followed
+through the logs.
+
+Settings (environment):
+    LOG_LEVEL              minimum level, default INFO
+    LOG_FILE               write here instead of stdout
+    LOG_DEBUG_SAMPLE_RATE  fraction of DEBUG records kept, default 0.05
+    LOG_REDACT             set to 0 to log message content verbatim (local debugging only)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FILE = os.environ.get('LOG_FILE')
+DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.05'))
+REDACT = os.environ.get('LOG_REDACT', '1').lower() not in ('0', 'false', 'no')
+
+# Extra fields that can hold what users wrote or identify a purchase
+REDACTED_FIELDS = {'message', 'content', 'reflection', 'description', 'email', 'license_key', 'title'}
+
+# Attributes every LogRecord has - anything else passed via extra= becomes a JSON field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id (runs in the request thread, before queueing)"""
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = _current_request_id()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep only a sample of DEBUG records - they are high volume and rarely all needed"""
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue records with as little work as possible; formatting happens in the listener"""
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks can't cross to the listener thread safely once frames move on
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = redact(key, value)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def redact(key, value):
+    """Replace user-written content with its length unless redaction is switched off"""
+    if REDACT and key in REDACTED_FIELDS and value is not None:
+        return f"[redacted len={len(str(value))}]"
+    return value
+
+
+def _current_request_id():
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return None
+    if has_request_context():
+        return g.get('request_id')
+    return None
+
+
+def configure():
+    """Install the queue handler on the root logger and start the background writer (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    if LOG_FILE:
+        output = logging.FileHandler(LOG_FILE, encoding='utf-8')
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(DebugSamplingFilter(DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def init_app(app):
+    """Give every request an id (reused from X-Request-ID when a proxy sets one)"""
+    from flask import g, request
+
+    @app.before_request
+    def _assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or secrets.token_hex(8)
+
+    @app.after_request
+    def _echo_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+
+def get_logger(name):
+    configure()
+    return logging.getLogger(name)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted static assets for Healing Guru.
+
+Page stylesheets and scripts live in static/css and static/js. At startup
+each file is read once, named after a hash of its content and compressed
+(gzip, plus brotli when the `brotli` package is installed). Templates link
+them with the url_for-style helper:
+
+    <link rel="stylesheet" href="{{ asset_url('css/chat.css') }}">
+    ->  /assets/css/chat.1f3c9a0b7e.css
+
+/assets/ responses are cacheable for a year and marked immutable, because
+any change to a file changes its URL. Each client gets the smallest
+encoding it accepts, with no compression work per request.
+
+static/ itself is still served as-is at /static/ (web manifest, icons),
+since those URLs have to stay fixed.
+
+The service worker is generated from the same manifest: /sw.js renders
+templates/sw.js with a version derived from everything it precaches, and its
+precache holds the current /assets/ URLs plus the web manifest's existing
+static files. A new deploy that changes any asset therefore installs a new
+worker, and that worker drops the old caches. The two workers it replaced
+(/static/sw.js, /static/service-worker.js) are answered with a stub that
+unregisters itself.
+
+    python assets.py    # list the fingerprinted assets and their sizes
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+ASSET_DIRS = ('css', 'js')
+URL_PREFIX = '/assets/'
+MAX_AGE = 31536000
+
+# Preferred first; an encoding is only offered when it is actually smaller
+ENCODINGS = ('br', 'gzip')
+
+SERVICE_WORKER_TEMPLATE = 'sw.js'
+WEB_MANIFEST = 'manifest.json'
+STATIC_PRECACHE = ('pwa-install.js',)
+RETIRED_WORKERS = ('/static/sw.js', '/static/service-worker.js')
+
+RETIRED_WORKER_JS = """// Replaced by /sw.js - removes itself and the caches it made
+self.addEventListener('install', () => self.skipWaiting());
+self.addEventListener('activate', event => {
+  event.waitUntil(
+    caches.keys()
+      .then(names => Promise.all(names.filter(name => name.startsWith('healing-guru-v')).map(name => caches.delete(name))))
+      .then(() => self.registration.unregister())
+  );
+});
+"""
+
+
+def _compress(data):
+    bodies = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        bodies['br'] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in bodies.items() if len(body) < len(data)}
+
+
+class Asset:
+    def __init__(self, name, data):
+        self.name = name
+        self.digest = hashlib.sha1(data).hexdigest()[:10]
+        stem, ext = os.path.splitext(name)
+        self.url_path = f'{stem}.{self.digest}{ext}'
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.bodies = {'identity': data}
+        self.bodies.update(_compress(data))
+
+
+class AssetManifest:
+    """Fingerprinted URLs and precompressed bodies for everything under static/css and static/js"""
+
+    def __init__(self, root=STATIC_DIR, dirs=ASSET_DIRS):
+        self.root = root
+        self.dirs = dirs
+        self.assets = {}   # 'css/chat.css' -> Asset
+        self.by_url = {}   # 'css/chat.1f3c9a0b7e.css' -> Asset
+
+    def build(self):
+        assets = {}
+        for directory in self.dirs:
+            base = os.path.join(self.root, directory)
+            if not os.path.isdir(base):
+                continue
+            for dirpath, _, filenames in os.walk(base):
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        assets[name] = Asset(name, f.read())
+        self.assets = assets
+        self.by_url = {asset.url_path: asset for asset in assets.values()}
+        return self
+
+    def url(self, name):
+        """URL of an asset by its path under static/ (unknown names fall back to /static/)"""
+        asset = self.assets.get(name)
+        if asset is None:
+            return '/static/' + name
+        return URL_PREFIX + asset.url_path
+
+    def precache_urls(self):
+        """Current asset URLs plus the web manifest and the static files it references that exist"""
+        urls = [URL_PREFIX + asset.url_path for _, asset in sorted(self.assets.items())]
+        static_files = [WEB_MANIFEST, *STATIC_PRECACHE]
+        manifest_path = os.path.join(self.root, WEB_MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                web_manifest = json.load(f)
+            for entry in web_manifest.get('icons', []) + web_manifest.get('screenshots', []):
+                static_files.append(entry['src'].replace('/static/', '', 1))
+        for name in static_files:
+            if os.path.exists(os.path.join(self.root, name)) and '/static/' + name not in urls:
+                urls.append('/static/' + name)
+        return urls
+
+    def service_worker_version(self, template_source):
+        """Changes whenever the worker script or anything it precaches changes"""
+        digest = hashlib.sha1(template_source.encode('utf-8'))
+        for url in self.precache_urls():
+            digest.update(url.encode('utf-8'))
+            if url.startswith('/static/'):
+                # Unfingerprinted files count by content
+                with open(os.path.join(self.root, url[len('/static/'):]), 'rb') as f:
+                    digest.update(f.read())
+        return digest.hexdigest()[:10]
+
+    def response(self, url_path, request):
+        from flask import Response, abort
+
+        asset = self.by_url.get(url_path)
+        if asset is None:
+            abort(404)
+
+        encoding = 'identity'
+        for candidate in ENCODINGS:
+            if candidate in asset.bodies and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f'{asset.digest}-{encoding}')
+        response.cache_control.public = True
+        response.cache_control.max_age = MAX_AGE
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+
+
+manifest = AssetManifest()
+
+
+def init_app(app):
+    """Build the manifest, expose asset_url() to templates, serve /assets/ and the service worker"""
+    from flask import Response, render_template, request
+
+    manifest.build()
+    app.jinja_env.globals['asset_url'] = manifest.url
+
+    def serve_asset(filename):
+        return manifest.response(filename, request)
+
+    def service_worker():
+        source = app.jinja_env.loader.get_source(app.jinja_env, SERVICE_WORKER_TEMPLATE)[0]
+        version = manifest.service_worker_version(source)
+        body = render_template(SERVICE_WORKER_TEMPLATE, version=version, precache_urls=manifest.precache_urls())
+        response = Response(body, mimetype='application/javascript')
+        # Browsers must always revalidate the worker script so new versions are picked up
+        response.set_etag(version)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def retired_worker():
+        response = Response(RETIRED_WORKER_JS, mimetype='application/javascript')
+        response.cache_control.no_cache = True
+        return response
+
+    app.add_url_rule(URL_PREFIX + '<path:filename>', 'asset', serve_asset)
+    app.add_url_rule('/sw.js', 'service_worker', service_worker)
+    for index, url in enumerate(RETIRED_WORKERS):
+        app.add_url_rule(url, f'retired_worker_{index}', retired_worker)
+
+
+def main():
+    manifest.build()
+    for name, asset in sorted(manifest.assets.items()):
+        sizes = ', '.join(f'{encoding} {len(body)}' for encoding, body in asset.bodies.items())
+        print(f"{name:28} {URL_PREFIX}{asset.url_path:36} {sizes}")
+
+
+if __name__ == '__main__':
+    main()
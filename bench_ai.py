@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Healing Guru AI Benchmark
+Runs a large message corpus (every test_scenarios.json message, optional
+anonymized corpus files and a seeded synthetic corpus) through
+HealingGuruAI.analyze_message directly (no server, no network) and reports
+per-detector timings, throughput, latency percentiles and allocation stats.
+
+Usage:
+    python bench_ai.py                       # run and compare against bench_baseline.json
+    python bench_ai.py --update-baseline     # run and overwrite the baseline
+    python bench_ai.py --corpus extra.txt    # add anonymized messages (one per line)
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, 'bench_baseline.json')
+SCENARIOS_FILE = os.path.join(BASE_DIR, 'test_scenarios.json')
+
+# HealingGuruAI methods timed individually (times are inclusive of nested calls)
+DETECTORS = [
+    'detect_positive_state',
+    'assess_emotional_intensity',
+    'detect_emotion',
+    'detect_exit_intention',
+    'detect_farewell_intention',
+    'extract_time_period',
+    'detect_dysregulation_in_positivity',
+    'get_crisis_response',
+    'select_intelligent_tool',
+    'format_tool_offer',
+    'generate_empathetic_response',
+]
+
+# Sentence shapes used to turn phrase-table keywords into realistic messages
+SYNTHETIC_TEMPLATES = [
+    "I feel {kw}",
+    "I'm so {kw} right now",
+    "Honestly today has been {kw}",
+    "{kw}",
+    "I don't know why but {kw} keeps coming up",
+    "My friend said I was {kw} and it stuck with me",
+    "It's been {kw} at work all week...",
+    "I keep thinking {kw} and I can't stop",
+    "Lately everything feels {kw}, is that normal?",
+    "I wanted to share that {kw} happened today",
+]
+
+FILLER_MESSAGES = [
+    "Hi", "Hello", "hey there", "ok", "yeah", "thanks", "I guess", "not sure",
+    "can you help me", "what should I do", "I'm back", "bye for now",
+]
+
+
+def load_scenario_messages():
+    """Every scenario message from the test_bot.py scenario table"""
+    with open(SCENARIOS_FILE) as f:
+        return [scenario['message'] for scenario in json.load(f)['scenarios']]
+
+
+def load_corpus_file(path):
+    """Load anonymized messages: one per line, or a JSON list of strings"""
+    with open(path) as f:
+        if path.endswith('.json'):
+            return [m for m in json.load(f) if isinstance(m, str) and m.strip()]
+        return [line.strip() for line in f if line.strip()]
+
+
+def build_synthetic_messages(ai, count, rng):
+    """Generate messages from the AI's own phrase tables so table growth is exercised"""
+    keywords = []
+    for state in ai.emotional_states.values():
+        keywords.extend(state['keywords'])
+        keywords.extend(state.get('physical_cues', []))
+    for pattern in ai.patterns.values():
+        keywords.extend(pattern['keywords'])
+    for topic in ai.life_topics.values():
+        keywords.extend(topic['keywords'])
+        keywords.extend(topic['celebration_keywords'])
+        keywords.extend(topic['stress_keywords'])
+
+    messages = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            messages.append(rng.choice(FILLER_MESSAGES))
+            continue
+        text = rng.choice(SYNTHETIC_TEMPLATES).format(kw=rng.choice(keywords))
+        # Some messages carry two signals, like real users mixing topics
+        if rng.random() < 0.3:
+            text += " and " + rng.choice(SYNTHETIC_TEMPLATES).format(kw=rng.choice(keywords)).lower()
+        messages.append(text)
+    return messages
+
+
+def build_cases(messages, rng, history_ratio=0.5):
+    """Pair messages with conversation histories shaped like the DB returns them (newest first)"""
+    cases = []
+    for message in messages:
+        history = []
+        if rng.random() < history_ratio:
+            for _ in range(rng.randint(1, 5)):
+                history.append(('assistant', rng.choice(messages)))
+                history.append(('user', rng.choice(messages)))
+        cases.append((message, history))
+    return cases
+
+
+def instrument(ai):
+    """Wrap detector methods on this instance to collect call counts and time"""
+    stats = {name: {'calls': 0, 'total_ns': 0} for name in DETECTORS}
+
+    def wrap(name, method):
+        entry = stats[name]
+        perf = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = perf()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                entry['calls'] += 1
+                entry['total_ns'] += perf() - start
+        return timed
+
+    for name in DETECTORS:
+        setattr(ai, name, wrap(name, getattr(ai, name)))
+    return stats
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_benchmark(ai_class, cases, seed, warmup=200):
+    """Timed pass (per-message latency + detectors) followed by an allocation pass"""
+    ai = ai_class()
+    detector_stats = instrument(ai)
+
+    random.seed(seed)
+    for message, history in cases[:warmup]:
+        ai.analyze_message(message, history)
+    for entry in detector_stats.values():
+        entry['calls'] = 0
+        entry['total_ns'] = 0
+
+    random.seed(seed)
+    latencies = []
+    patterns = {}
+    gc_before = gc.get_stats()[0]['collections']
+    perf = time.perf_counter_ns
+    wall_start = perf()
+    for message, history in cases:
+        start = perf()
+        result = ai.analyze_message(message, history)
+        latencies.append(perf() - start)
+        pattern = result.get('pattern') or 'none'
+        patterns[pattern] = patterns.get(pattern, 0) + 1
+    wall_ns = perf() - wall_start
+    gc_collections = gc.get_stats()[0]['collections'] - gc_before
+
+    # Allocation pass runs separately - tracemalloc would distort the timings above
+    random.seed(seed)
+    plain_ai = ai_class()
+    peaks = []
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    for message, history in cases:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        plain_ai.analyze_message(message, history)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+
+    latencies.sort()
+    peaks.sort()
+    to_us = lambda ns: round(ns / 1000.0, 2)
+
+    return {
+        'messages': len(cases),
+        'throughput_msgs_per_sec': round(len(cases) / (wall_ns / 1e9), 1),
+        'latency_us': {
+            'mean': to_us(sum(latencies) / len(latencies)),
+            'p50': to_us(percentile(latencies, 50)),
+            'p95': to_us(percentile(latencies, 95)),
+            'p99': to_us(percentile(latencies, 99)),
+            'max': to_us(latencies[-1]),
+        },
+        'detectors': {
+            name: {
+                'calls': entry['calls'],
+                'total_ms': round(entry['total_ns'] / 1e6, 3),
+                'mean_us': to_us(entry['total_ns'] / entry['calls']) if entry['calls'] else 0.0,
+            }
+            for name, entry in detector_stats.items()
+        },
+        'allocations': {
+            'peak_bytes_p50': percentile(peaks, 50),
+            'peak_bytes_p95': percentile(peaks, 95),
+            'peak_bytes_max': peaks[-1],
+            'retained_blocks': retained_blocks,
+            'gc_gen0_collections': gc_collections,
+        },
+        'patterns': dict(sorted(patterns.items())),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of regressions (empty when within tolerance)"""
+    regressions = []
+
+    def check(label, current, previous):
+        if previous and current > previous * (1 + tolerance):
+            regressions.append(f"{label}: {current} vs baseline {previous} (+{(current / previous - 1) * 100:.0f}%)")
+
+    for key in ['p50', 'p95', 'p99']:
+        check(f"latency {key} (us)", results['latency_us'][key], baseline['latency_us'].get(key))
+    for name, entry in results['detectors'].items():
+        previous = baseline['detectors'].get(name, {})
+        check(f"{name} mean (us)", entry['mean_us'], previous.get('mean_us'))
+    check("peak bytes p95", results['allocations']['peak_bytes_p95'],
+          baseline['allocations'].get('peak_bytes_p95'))
+
+    # Pattern routing is deterministic for a fixed seed, so any drift means a phrase table changed
+    if baseline.get('messages') == results['messages'] and baseline.get('patterns') != results['patterns']:
+        changed = sorted(set(baseline.get('patterns', {})) | set(results['patterns']))
+        diffs = [f"{p} {baseline['patterns'].get(p, 0)}->{results['patterns'].get(p, 0)}"
+                 for p in changed if baseline['patterns'].get(p, 0) != results['patterns'].get(p, 0)]
+        regressions.append("pattern distribution changed: " + ", ".join(diffs))
+
+    return regressions
+
+
+def print_report(results):
+    print("\n" + "=" * 70)
+    print("📊 HEALING GURU AI BENCHMARK")
+    print("=" * 70)
+    print(f"Messages:   {results['messages']}")
+    print(f"Throughput: {results['throughput_msgs_per_sec']} msg/s")
+    latency = results['latency_us']
+    print(f"Latency:    p50 {latency['p50']}us  p95 {latency['p95']}us  p99 {latency['p99']}us  max {latency['max']}us")
+
+    print(f"\n{'Detector':<38}{'calls':>8}{'total ms':>12}{'mean us':>10}")
+    for name, entry in sorted(results['detectors'].items(), key=lambda item: -item[1]['total_ms']):
+        print(f"{name:<38}{entry['calls']:>8}{entry['total_ms']:>12}{entry['mean_us']:>10}")
+
+    allocations = results['allocations']
+    print(f"\nPeak bytes/message: p50 {allocations['peak_bytes_p50']}  p95 {allocations['peak_bytes_p95']}  max {allocations['peak_bytes_max']}")
+    print(f"Retained blocks: {allocations['retained_blocks']}  GC gen0 collections: {allocations['gc_gen0_collections']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HealingGuruAI.analyze_message offline')
+    parser.add_argument('--synthetic', type=int, default=5000, help='number of synthetic messages to generate')
+    parser.add_argument('--corpus', action='append', default=[], help='extra anonymized corpus file (.txt or .json)')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true', help='write results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown before failing (0.5 = 50%%)')
+    parser.add_argument('--output', help='also write the full results JSON here')
+    args = parser.parse_args()
+
+    # app_chat initialises its SQLite database on import - point it at a scratch file
+    os.environ['HEALING_GURU_DB'] = os.path.join(tempfile.mkdtemp(prefix='healing_guru_bench_'), 'healing_guru_chat.db')
+    from app_chat import HealingGuruAI
+
+    rng = random.Random(args.seed)
+    messages = load_scenario_messages()
+    for path in args.corpus:
+        messages.extend(load_corpus_file(path))
+    messages.extend(build_synthetic_messages(HealingGuruAI(), args.synthetic, rng))
+    cases = build_cases(messages, rng)
+
+    results = run_benchmark(HealingGuruAI, cases, args.seed)
+    results['timestamp'] = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results['python'] = platform.python_version()
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"\n📄 Baseline written to: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline found - run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("\n❌ REGRESSIONS vs baseline:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return 1
+
+    print("\n✅ Within tolerance of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Response compression for Healing Guru.
+
+Compresses text responses (HTML, JSON, CSS, JS, SVG) for clients that send
+Accept-Encoding. Brotli is used when the `brotli` package is installed and
+the client accepts it; otherwise gzip.
+
+- Responses below COMPRESS_MIN_SIZE bytes are sent as they are; gzip
+  framing would eat most of the saving.
+- Streamed responses are compressed chunk by chunk, flushing after each
+  chunk, so the client still receives every chunk as it is produced.
+- Responses that already carry a Content-Encoding pass through untouched.
+  That covers the precompressed /assets/ files (assets.py), so static
+  assets are never compressed per request.
+- A compressed response's ETag becomes weak. Conditional requests still
+  get a 304, and the variant is not mistaken for the identity bytes.
+
+Settings: COMPRESSION_ENABLED (default on), COMPRESS_MIN_SIZE (500),
+COMPRESS_LEVEL (gzip level, 6).
+"""
+
+import os
+import zlib
+
+ENABLED = os.environ.get('COMPRESSION_ENABLED', '1').lower() in ('1', 'true', 'yes')
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '500'))
+LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))
+
+# Files larger than this served with send_file are left alone rather than read into memory
+MAX_BUFFERED_SIZE = 1024 * 1024
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/manifest+json',
+                      'application/xml', 'image/svg+xml')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class _Gzip:
+    def __init__(self):
+        # wbits=31: zlib stream with a gzip header and trailer
+        self.compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+ENCODERS = {'gzip': _Gzip}
+if brotli is not None:
+    ENCODERS = {'br': _Brotli, 'gzip': _Gzip}
+
+
+def choose_encoding(request):
+    for encoding in ENCODERS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def _compressible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or response.cache_control.no_transform:
+        return False
+    return response.mimetype is not None and response.mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _stream(iterable, encoder):
+    for chunk in iterable:
+        if chunk:
+            data = encoder.compress(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+            data += encoder.flush()
+            if data:
+                yield data
+    yield encoder.finish()
+    close = getattr(iterable, 'close', None)
+    if close is not None:
+        close()
+
+
+def compress_response(response, request):
+    """Compress the response in place if the client and the content allow it"""
+    if request.method == 'HEAD' or not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request)
+    if encoding is None:
+        return response
+
+    if response.is_streamed and not response.direct_passthrough:
+        response.response = _stream(response.response, ENCODERS[encoding]())
+        response.headers.pop('Content-Length', None)
+    else:
+        if response.direct_passthrough:
+            # send_file() responses (e.g. /static/manifest.json): only small files are worth buffering
+            if response.content_length is None or response.content_length > MAX_BUFFERED_SIZE:
+                return response
+            response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        encoder = ENCODERS[encoding]()
+        compressed = encoder.compress(data) + encoder.finish()
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    if not ENABLED:
+        return
+    from flask import request
+
+    @app.after_request
+    def compress(response):
+        return compress_response(response, request)
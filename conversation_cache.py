@@ -0,0 +1,152 @@
+"""
+Per-user conversation cache.
+
+Holds each active user's last N chat turns so /api/chat doesn't have to
+re-read them from the messages table on every turn. The cache is filled
+from the database on a user's first turn and then kept current
+write-through by chat(), so steady-state turns need no read query.
+Assistant replies are held in their compact stored form (see reply_codec.py)
+and rendered by get(), so each entry stays small.
+
+Two backends:
+    in-process (default)  bounded LRU with idle eviction - right for a single
+                          app process (the Procfile's `python app_chat.py`)
+    shared                Redis lists, set CONVERSATION_CACHE_URL=redis://...
+                          (requires the optional `redis` package); use this
+                          when several worker processes serve the same users
+
+Settings (environment):
+    CONVERSATION_CACHE_TURNS         turns kept per user, default 10
+    CONVERSATION_CACHE_USERS         max users held in-process, default 10000
+    CONVERSATION_CACHE_IDLE_SECONDS  evict users idle this long, default 1800
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+MAX_TURNS = int(os.environ.get('CONVERSATION_CACHE_TURNS', '10'))
+MAX_USERS = int(os.environ.get('CONVERSATION_CACHE_USERS', '10000'))
+IDLE_SECONDS = int(os.environ.get('CONVERSATION_CACHE_IDLE_SECONDS', '1800'))
+CACHE_URL = os.environ.get('CONVERSATION_CACHE_URL')
+
+
+class ConversationCache:
+    """Bounded in-process LRU of recent turns, evicting users idle for too long"""
+
+    def __init__(self, render=None, max_turns=MAX_TURNS, max_users=MAX_USERS, idle_seconds=IDLE_SECONDS):
+        self.render = render
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.idle_seconds = idle_seconds
+        self.users = OrderedDict()  # user_id -> [deque of turns oldest..newest, last access]
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        """Recent turns newest first (the shape the messages query returns), or None on a miss"""
+        now = time.monotonic()
+        with self.lock:
+            self._evict_idle(now)
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            entry[1] = now
+            self.users.move_to_end(user_id)
+            turns = list(reversed(entry[0]))
+        return _rendered(turns, self.render)
+
+    def load(self, user_id, turns_newest_first):
+        """Seed a user's entry from the database after a miss"""
+        turns = deque(reversed([tuple(turn) for turn in turns_newest_first]), maxlen=self.max_turns)
+        with self.lock:
+            self.users[user_id] = [turns, time.monotonic()]
+            self.users.move_to_end(user_id)
+            while len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+
+    def append(self, user_id, role, content):
+        """Write-through after a turn is stored; users not in the cache are left to the next miss"""
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is not None:
+                entry[0].append((role, content))
+                entry[1] = time.monotonic()
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def _evict_idle(self, now):
+        # Entries are in access order, so idle users are always at the front
+        while self.users:
+            user_id, entry = next(iter(self.users.items()))
+            if now - entry[1] < self.idle_seconds:
+                break
+            self.users.popitem(last=False)
+
+
+class RedisConversationCache:
+    """Shared cache in Redis so every worker process sees the same recent turns"""
+
+    # Marks a cached user with no history yet (an empty Redis list would look like a miss)
+    EMPTY_MARKER = '__empty__'
+
+    def __init__(self, url, render=None, max_turns=MAX_TURNS, idle_seconds=IDLE_SECONDS):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CONVERSATION_CACHE_URL is set but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.render = render
+        self.max_turns = max_turns
+        self.idle_seconds = idle_seconds
+
+    def _key(self, user_id):
+        return f"healing_guru:conversation:{user_id}"
+
+    def get(self, user_id):
+        key = self._key(user_id)
+        items = self.client.lrange(key, 0, self.max_turns - 1)
+        if not items:
+            return None
+        self.client.expire(key, self.idle_seconds)
+        turns = [tuple(json.loads(item)) for item in items if item != self.EMPTY_MARKER.encode()]
+        return _rendered(turns, self.render)
+
+    def load(self, user_id, turns_newest_first):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        for turn in turns_newest_first[:self.max_turns]:
+            pipe.rpush(key, json.dumps(list(turn)))
+        pipe.rpush(key, self.EMPTY_MARKER)
+        pipe.ltrim(key, 0, self.max_turns)
+        pipe.expire(key, self.idle_seconds)
+        pipe.execute()
+
+    def append(self, user_id, role, content):
+        key = self._key(user_id)
+        pipe = self.client.pipeline()
+        # LPUSHX only pushes onto an existing list - users not cached stay a miss
+        pipe.lpushx(key, json.dumps([role, content]))
+        pipe.ltrim(key, 0, self.max_turns)
+        pipe.expire(key, self.idle_seconds)
+        pipe.execute()
+
+    def invalidate(self, user_id):
+        self.client.delete(self._key(user_id))
+
+
+def _rendered(turns, render):
+    if render is None:
+        return turns
+    return [(role, render(content) if role == 'assistant' else content) for role, content in turns]
+
+
+def create_cache(render=None):
+    """render turns a stored assistant reply back into text"""
+    if CACHE_URL:
+        return RedisConversationCache(CACHE_URL, render)
+    return ConversationCache(render)
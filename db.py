@@ -0,0 +1,215 @@
+"""
+Database access for Healing Guru.
+
+Every route gets its connection from get_db() so instrumentation (metrics,
+query profiling) and configuration live in one place instead of in 27
+inline sqlite3.connect() calls.
+
+Per-user tables (messages, insights, journal, message_archive,
+insight_counts) go through get_user_db(user_id). With
+HEALING_GURU_SHARDS=N they live in N shard files next to the main
+database, picked by a stable hash of the user id, each with its own small
+connection pool; catalog, community, progress and subscriptions stay in the
+main database. Unset (the default), get_user_db() is just get_db().
+Split an existing database with shard_migrate.py before turning sharding on.
+
+The background job queue and the webhook inbox use get_queue_db(), a
+separate file (QUEUE_DATABASE), so a burst of deliveries or enqueues never
+waits on the lock chat writes take, or holds it. Server-side sessions get
+a file of their own the same way (get_session_db(), SESSION_DATABASE).
+"""
+
+import os
+import queue
+import sqlite3
+import time
+import zlib
+
+import metrics
+import query_profiler
+
+# SQLite database file (override for scratch databases, e.g. the in-process test runner)
+DATABASE = os.environ.get('HEALING_GURU_DB', 'healing_guru_chat.db')
+
+# Job queue and webhook inbox, in a file of their own so queue writes never contend with chat writes
+QUEUE_DATABASE = os.environ.get('HEALING_GURU_QUEUE_DB') or f"{os.path.splitext(DATABASE)[0]}_queue.db"
+
+# Server-side sessions (sessions.py), likewise apart from the main database
+SESSION_DATABASE = os.environ.get('HEALING_GURU_SESSION_DB') or f"{os.path.splitext(DATABASE)[0]}_sessions.db"
+
+INSTRUMENTED = metrics.ENABLED or query_profiler.ENABLED
+
+# Per-user sharding (0 = everything in DATABASE)
+SHARD_COUNT = int(os.environ.get('HEALING_GURU_SHARDS', '0'))
+SHARD_POOL_SIZE = int(os.environ.get('HEALING_GURU_SHARD_POOL_SIZE', '8'))
+SHARDED_TABLES = ('messages', 'insights', 'journal', 'message_archive', 'insight_counts')
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times every statement for metrics and the query profiler"""
+    profile_key = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(sql, (), time.perf_counter() - start)
+
+    def _record(self, sql, parameters, duration):
+        if metrics.ENABLED:
+            metrics.record_query(duration)
+        if query_profiler.ENABLED:
+            self.profile_key = query_profiler.record(sql, parameters, duration, self.connection, self.rowcount)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if query_profiler.ENABLED and row is not None:
+            query_profiler.record_rows(self.profile_key, 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size if size is not None else self.arraysize)
+        if query_profiler.ENABLED:
+            query_profiler.record_rows(self.profile_key, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if query_profiler.ENABLED:
+            query_profiler.record_rows(self.profile_key, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+
+def _connect(path, timeout, **kwargs):
+    if INSTRUMENTED:
+        return sqlite3.connect(path, timeout=timeout, factory=InstrumentedConnection, **kwargs)
+    return sqlite3.connect(path, timeout=timeout, **kwargs)
+
+
+def get_db(timeout=5.0):
+    """Open a connection to the main database (instrumented when metrics or profiling are on)"""
+    return _connect(DATABASE, timeout)
+
+
+def get_queue_db(timeout=5.0):
+    """Open a connection to the queue database (jobs.py, webhook_inbox.py)"""
+    return _connect(QUEUE_DATABASE, timeout)
+
+
+def get_session_db(timeout=5.0):
+    """Open a connection to the session database (sessions.py)"""
+    return _connect(SESSION_DATABASE, timeout)
+
+
+# ===== PER-USER SHARDS =====
+
+def shard_for(user_id, shard_count=None):
+    """Shard index for a user - crc32 rather than hash() so it is stable across processes"""
+    shard_count = shard_count or SHARD_COUNT
+    return zlib.crc32((user_id or '').encode('utf-8')) % shard_count
+
+
+def shard_path(index, database=None):
+    """healing_guru_chat.db -> healing_guru_chat_shard0.db, ... in the same directory"""
+    base, ext = os.path.splitext(database or DATABASE)
+    return f"{base}_shard{index}{ext or '.db'}"
+
+
+class ConnectionPool:
+    """Reuses connections to one shard file; holds at most `size` idle connections"""
+
+    def __init__(self, path, size=SHARD_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.idle = queue.LifoQueue()
+
+    def acquire(self, timeout=5.0):
+        try:
+            connection = self.idle.get_nowait()
+        except queue.Empty:
+            # Pooled connections move between request threads, one at a time
+            connection = _connect(self.path, timeout, check_same_thread=False)
+        return PooledConnection(connection, self)
+
+    def release(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+        if self.idle.qsize() < self.size:
+            self.idle.put(connection)
+        else:
+            connection.close()
+
+
+class PooledConnection:
+    """Behaves like the sqlite3 connection it wraps, but close() hands it back to the pool"""
+
+    def __init__(self, connection, pool):
+        self._connection = connection
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+
+_shard_pools = []
+
+
+def get_user_db(user_id, timeout=5.0):
+    """Connection holding this user's messages, insights and journal"""
+    if not SHARD_COUNT:
+        return get_db(timeout)
+    return _shard_pools[shard_for(user_id)].acquire(timeout)
+
+
+def all_user_dbs():
+    """One connection per database holding per-user tables (each shard, or just the main file)"""
+    if not SHARD_COUNT:
+        return [get_db()]
+    return [pool.acquire() for pool in _shard_pools]
+
+
+def copy_schema(source, target, tables=SHARDED_TABLES):
+    """Create the per-user tables (and their indexes) in target exactly as they are in source"""
+    placeholders = ', '.join('?' for _ in tables)
+    rows = source.execute(f"""SELECT type, name, sql FROM sqlite_master
+                              WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL
+                              ORDER BY type = 'table' DESC""", tables).fetchall()
+    existing = {row[0] for row in target.execute('SELECT name FROM sqlite_master')}
+    for _, name, sql in rows:
+        if name not in existing:
+            target.execute(sql)
+    target.commit()
+
+
+def init_shards():
+    """Create shard files and pools (call after the main schema exists)"""
+    if not SHARD_COUNT or _shard_pools:
+        return
+    main = get_db()
+    for index in range(SHARD_COUNT):
+        shard = _connect(shard_path(index), 5.0)
+        copy_schema(main, shard)
+        shard.close()
+        _shard_pools.append(ConnectionPool(shard_path(index)))
+    main.close()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Durable background jobs for Healing Guru.
+
+Work that doesn't have to finish inside a request - account export and
+deletion, Gumroad webhook processing, retention passes, insight
+aggregation - is written to the jobs table in the queue database
+(db.QUEUE_DATABASE, a SQLite file of its own) and run by a worker, so
+routes enqueue and return immediately.
+
+- enqueue() with an idempotency key returns the existing job instead of
+  adding another, so client retries and repeated deliveries are harmless
+- a worker claims a job by leasing it for its kind's visibility timeout; if
+  the worker dies, the job is claimed again once the lease runs out
+- a failing job is retried with exponential backoff (with jitter) up to
+  JOBS_MAX_ATTEMPTS times, then left as 'failed' with its last error
+- finished jobs are purged after JOBS_KEEP_DAYS
+
+Handlers are registered with @jobs.handler('kind') and recurring jobs with
+jobs.every('kind', seconds); app_chat.py registers both at import.
+
+With JOBS_WORKER=thread (the default) the web process runs one worker
+thread, so a single-process deploy needs nothing extra. With
+JOBS_WORKER=external the web process only enqueues, and a separate worker
+process runs the jobs. The queue is a local SQLite file, so that process
+must see the same filesystem as the web process (same host, or a shared
+volume); a platform `worker` dyno/service in its own container never would.
+
+    python jobs.py            # work until stopped
+    python jobs.py --once     # run everything that is due, then exit
+    python jobs.py --stats    # job counts by kind and status
+
+Other settings: JOBS_POLL_SECONDS, JOBS_VISIBILITY_TIMEOUT,
+JOBS_BACKOFF_SECONDS, JOBS_BACKOFF_MAX_SECONDS.
+"""
+
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+from db import get_queue_db
+
+WORKER_MODE = os.environ.get('JOBS_WORKER', 'thread').lower()
+POLL_SECONDS = float(os.environ.get('JOBS_POLL_SECONDS', '1.0'))
+VISIBILITY_TIMEOUT = float(os.environ.get('JOBS_VISIBILITY_TIMEOUT', '300'))
+MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', '5'))
+BACKOFF_SECONDS = float(os.environ.get('JOBS_BACKOFF_SECONDS', '5'))
+BACKOFF_MAX_SECONDS = float(os.environ.get('JOBS_BACKOFF_MAX_SECONDS', '900'))
+KEEP_DAYS = int(os.environ.get('JOBS_KEEP_DAYS', '7'))
+
+HANDLERS = {}   # kind -> (function, visibility timeout in seconds)
+SCHEDULE = {}   # kind -> interval in seconds
+
+# Set by enqueue() so a worker thread in the same process starts at once instead of at its next poll
+_wakeup = threading.Event()
+_logger = None
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        import app_logging
+        _logger = app_logging.get_logger('healing_guru.jobs')
+    return _logger
+
+
+def handler(kind, timeout=VISIBILITY_TIMEOUT):
+    """Register the function run for jobs of `kind`; it gets the payload dict and may return a JSON-able result"""
+    def register(function):
+        HANDLERS[kind] = (function, timeout)
+        return function
+    return register
+
+
+def every(kind, seconds):
+    """Run a `kind` job once every `seconds` (one per interval, however many workers are running)"""
+    SCHEDULE[kind] = seconds
+
+
+def enqueue(kind, payload=None, idempotency_key=None, delay=0, max_attempts=MAX_ATTEMPTS):
+    """Add a job and return its id (the existing job's id if the idempotency key was used before)"""
+    conn = get_queue_db()
+    c = conn.cursor()
+    c.execute('''INSERT INTO jobs (kind, payload, idempotency_key, max_attempts, run_at)
+                 VALUES (?, ?, ?, ?, ?)
+                 ON CONFLICT(idempotency_key) DO NOTHING''',
+              (kind, json.dumps(payload or {}), idempotency_key, max_attempts, time.time() + delay))
+    if c.rowcount:
+        job_id = c.lastrowid
+    else:
+        c.execute('SELECT id FROM jobs WHERE idempotency_key = ?', (idempotency_key,))
+        job_id = c.fetchone()[0]
+    conn.commit()
+    conn.close()
+    _wakeup.set()
+    return job_id
+
+
+def get(job_id):
+    """A job as a dict, or None"""
+    conn = get_queue_db()
+    c = conn.cursor()
+    c.execute('''SELECT id, kind, payload, status, attempts, result, last_error, created_at, finished_at
+                 FROM jobs WHERE id = ?''', (job_id,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {'id': row[0], 'kind': row[1], 'payload': json.loads(row[2]), 'status': row[3],
+            'attempts': row[4], 'result': json.loads(row[5]) if row[5] else None,
+            'last_error': row[6], 'created_at': row[7], 'finished_at': row[8]}
+
+
+def claim(worker=None, kinds=None):
+    """Lease the next due job this worker has a handler for; returns it as a dict, or None"""
+    kinds = list(kinds or HANDLERS)
+    if not kinds:
+        return None
+    now = time.time()
+    placeholders = ', '.join('?' for _ in kinds)
+
+    conn = get_queue_db()
+    c = conn.cursor()
+    # Take the write lock up front so two workers can't lease the same row
+    c.execute('BEGIN IMMEDIATE')
+    job = None
+    while job is None:
+        c.execute(f'''SELECT id, kind, payload, attempts, max_attempts FROM jobs
+                      WHERE kind IN ({placeholders})
+                        AND ((status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until <= ?))
+                      ORDER BY run_at, id LIMIT 1''', (*kinds, now, now))
+        row = c.fetchone()
+        if row is None:
+            break
+        job_id, kind, payload, attempts, max_attempts = row
+        if attempts >= max_attempts:
+            # Its last worker never reported back (crashed, or overran the visibility timeout)
+            c.execute('''UPDATE jobs SET status = 'failed', locked_until = NULL, finished_at = CURRENT_TIMESTAMP,
+                                last_error = 'visibility timeout expired' WHERE id = ?''', (job_id,))
+            continue
+        c.execute('''UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, worker = ?
+                     WHERE id = ?''', (now + HANDLERS[kind][1], worker, job_id))
+        job = {'id': job_id, 'kind': kind, 'payload': json.loads(payload),
+               'attempt': attempts + 1, 'max_attempts': max_attempts}
+    conn.commit()
+    conn.close()
+    return job
+
+
+def backoff(attempt):
+    """Seconds to wait before retrying after the given failed attempt"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def complete(job, result=None):
+    conn = get_queue_db()
+    c = conn.cursor()
+    # The attempt number identifies the lease: a worker that lost it must not overwrite the new one
+    c.execute('''UPDATE jobs SET status = 'done', result = ?, last_error = NULL, locked_until = NULL,
+                        finished_at = CURRENT_TIMESTAMP
+                 WHERE id = ? AND attempts = ? AND status = 'running' ''',
+              (json.dumps(result) if result is not None else None, job['id'], job['attempt']))
+    conn.commit()
+    conn.close()
+
+
+def fail(job, error):
+    conn = get_queue_db()
+    c = conn.cursor()
+    if job['attempt'] >= job['max_attempts']:
+        c.execute('''UPDATE jobs SET status = 'failed', last_error = ?, locked_until = NULL,
+                            finished_at = CURRENT_TIMESTAMP
+                     WHERE id = ? AND attempts = ? AND status = 'running' ''',
+                  (error, job['id'], job['attempt']))
+    else:
+        c.execute('''UPDATE jobs SET status = 'queued', last_error = ?, locked_until = NULL, run_at = ?
+                     WHERE id = ? AND attempts = ? AND status = 'running' ''',
+                  (error, time.time() + backoff(job['attempt']), job['id'], job['attempt']))
+    conn.commit()
+    conn.close()
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome; returns True if it succeeded"""
+    function = HANDLERS[job['kind']][0]
+    started = time.perf_counter()
+    try:
+        result = function(job['payload'])
+    except Exception as e:
+        _get_logger().exception("job failed", extra={'job_id': job['id'], 'kind': job['kind'],
+                                                     'attempt': job['attempt']})
+        fail(job, f'{type(e).__name__}: {e}')
+        return False
+    complete(job, result)
+    _get_logger().info("job done", extra={'job_id': job['id'], 'kind': job['kind'], 'attempt': job['attempt'],
+                                          'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+    return True
+
+
+def run_pending(worker=None, limit=None):
+    """Run due jobs until none are left (or `limit` have run); returns how many ran"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def discard(kind, key_prefix):
+    """Delete jobs of `kind` whose idempotency key starts with key_prefix (e.g. a deleted user's exports)"""
+    conn = get_queue_db()
+    c = conn.cursor()
+    c.execute('DELETE FROM jobs WHERE kind = ? AND substr(idempotency_key, 1, ?) = ?',
+              (kind, len(key_prefix), key_prefix))
+    conn.commit()
+    conn.close()
+
+
+def purge(days=KEEP_DAYS):
+    """Delete jobs that finished more than `days` ago; returns rows deleted"""
+    conn = get_queue_db()
+    c = conn.cursor()
+    c.execute('''DELETE FROM jobs WHERE status IN ('done', 'failed')
+                 AND finished_at < datetime('now', ?)''', (f'-{days} days',))
+    deleted = c.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+@handler('purge_jobs')
+def _purge_jobs(payload):
+    return {'deleted': purge()}
+
+
+every('purge_jobs', 3600)
+
+
+def stats():
+    """{(kind, status): count}"""
+    conn = get_queue_db()
+    c = conn.cursor()
+    c.execute('SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status ORDER BY kind, status')
+    rows = c.fetchall()
+    conn.close()
+    return {(kind, status): count for kind, status, count in rows}
+
+
+class Worker:
+    """Enqueues scheduled jobs when their interval comes round and runs whatever is due"""
+
+    def __init__(self, name=None, poll=POLL_SECONDS):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll = poll
+        self.stopping = threading.Event()
+        self.scheduled = {}   # kind -> last interval enqueued by this worker
+
+    def schedule(self):
+        now = time.time()
+        for kind, seconds in SCHEDULE.items():
+            interval = int(now // seconds)
+            if self.scheduled.get(kind) != interval:
+                # The key makes this one job per interval across every worker
+                enqueue(kind, idempotency_key=f'{kind}:{seconds}:{interval}')
+                self.scheduled[kind] = interval
+
+    def run_once(self):
+        self.schedule()
+        return run_pending(self.name)
+
+    def run_forever(self):
+        while not self.stopping.is_set():
+            _wakeup.clear()
+            try:
+                self.run_once()
+            except Exception:
+                _get_logger().exception("job worker loop failed", extra={'worker': self.name})
+            _wakeup.wait(self.poll)
+
+    def stop(self):
+        self.stopping.set()
+        _wakeup.set()
+
+
+def start():
+    """Run a worker on a daemon thread in this process (JOBS_WORKER=thread)"""
+    if WORKER_MODE != 'thread':
+        return None
+    worker = Worker(f'{socket.gethostname()}:{os.getpid()}:thread')
+    thread = threading.Thread(target=worker.run_forever, name='jobs', daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description='Run background jobs')
+    parser.add_argument('--once', action='store_true', help='run everything that is due, then exit')
+    parser.add_argument('--stats', action='store_true', help='print job counts by kind and status')
+    args = parser.parse_args()
+
+    # This process is the worker: importing the app must not start another worker thread
+    os.environ['JOBS_WORKER'] = 'external'
+    import app_chat  # noqa: F401 - creates the schema and stores and registers the handlers
+    import jobs
+
+    if args.stats:
+        for (kind, status), count in jobs.stats().items():
+            print(f"{kind:24} {status:8} {count}")
+        return
+
+    worker = jobs.Worker()
+    if args.once:
+        print(f"Ran {worker.run_once()} jobs")
+        return
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    jobs._get_logger().info("job worker started", extra={'worker': worker.name, 'kinds': sorted(jobs.HANDLERS)})
+    try:
+        worker.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Enabled with METRICS_ENABLED=1. When disabled nothing is instrumented: the
+request hooks are not registered, get_db() hands out plain sqlite3
+connections and the AI detectors are left unwrapped, so the cost is a
+single boolean check at startup.
+"""
+
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# Default latency buckets (seconds) - chat turns are expected in the low milliseconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DETECTOR_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][i] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, entry in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['buckets']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + ('+Inf',))} {entry['count']}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {entry['sum']:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {entry['count']}")
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+# ===== METRIC DEFINITIONS =====
+
+REQUEST_LATENCY = Histogram('healing_guru_request_duration_seconds', 'Request latency by route',
+                            ('method', 'route', 'status'))
+DB_QUERIES = Counter('healing_guru_db_queries_total', 'SQL statements executed', ('route',))
+DB_QUERIES_PER_REQUEST = Histogram('healing_guru_db_queries_per_request', 'SQL statements per request',
+                                   ('route',), QUERY_COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram('healing_guru_db_time_per_request_seconds', 'Time spent in SQL per request',
+                                ('route',))
+DETECTOR_LATENCY = Histogram('healing_guru_detector_duration_seconds', 'HealingGuruAI detector latency',
+                             ('detector',), DETECTOR_BUCKETS)
+CHAT_OUTCOMES = Counter('healing_guru_chat_outcomes_total',
+                        'Chat turns by outcome (crisis, tool_offered, pattern, no_pattern, ai_error)', ('outcome',))
+CHAT_PATTERNS = Counter('healing_guru_chat_patterns_total', 'Detected patterns', ('pattern',))
+RATE_LIMITED = Counter('healing_guru_rate_limited_total',
+                       'Chat turns turned away with 429 (rate: token bucket empty, busy: admission control)', ('reason',))
+
+REGISTRY = [REQUEST_LATENCY, DB_QUERIES, DB_QUERIES_PER_REQUEST, DB_TIME_PER_REQUEST,
+            DETECTOR_LATENCY, CHAT_OUTCOMES, CHAT_PATTERNS, RATE_LIMITED]
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ===== PER-REQUEST DB ACCOUNTING =====
+
+_request_state = threading.local()
+
+
+def record_query(duration):
+    """Called by db's instrumented cursors for every statement"""
+    state = getattr(_request_state, 'db', None)
+    if state is not None:
+        state[0] += 1
+        state[1] += duration
+    else:
+        # Outside a request (startup seeding, background threads)
+        DB_QUERIES.inc('none')
+
+
+# ===== FLASK INTEGRATION =====
+
+def init_app(app):
+    """Register request timing hooks (only when metrics are enabled)"""
+    if not ENABLED:
+        return
+
+    from flask import request
+
+    @app.before_request
+    def _start_request_timer():
+        _request_state.start = time.perf_counter()
+        _request_state.db = [0, 0.0]
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(_request_state, 'start', None)
+        if start is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        queries, db_time = _request_state.db
+        REQUEST_LATENCY.observe(time.perf_counter() - start, request.method, route, response.status_code)
+        DB_QUERIES.inc(route, amount=queries)
+        DB_QUERIES_PER_REQUEST.observe(queries, route)
+        DB_TIME_PER_REQUEST.observe(db_time, route)
+        _request_state.start = None
+        _request_state.db = None
+        return response
+
+
+def instrument_detectors(ai, names):
+    """Wrap HealingGuruAI detector methods on this instance with latency histograms"""
+    if not ENABLED:
+        return
+
+    def wrap(name, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                DETECTOR_LATENCY.observe(time.perf_counter() - start, name)
+        return timed
+
+    for name in names:
+        setattr(ai, name, wrap(name, getattr(ai, name)))
+
+
+def record_chat_outcome(analysis, ai_error=False):
+    """Count crisis / tool / pattern outcomes for one chat turn"""
+    if not ENABLED:
+        return
+    if ai_error:
+        CHAT_OUTCOMES.inc('ai_error')
+    pattern = analysis.get('pattern')
+    if pattern == 'crisis_intervention':
+        CHAT_OUTCOMES.inc('crisis')
+    if analysis.get('needs_tool'):
+        CHAT_OUTCOMES.inc('tool_offered')
+    if pattern:
+        CHAT_OUTCOMES.inc('pattern')
+        CHAT_PATTERNS.inc(pattern)
+    else:
+        CHAT_OUTCOMES.inc('no_pattern')
+
+
+def record_rate_limited(reason):
+    if ENABLED:
+        RATE_LIMITED.inc(reason)
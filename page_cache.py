@@ -0,0 +1,114 @@
+"""
+Rendered-page cache for Healing Guru's shared pages.
+
+/, /path/<slug>, /privacy and /terms render the same HTML for every visitor.
+Per-user bits (module progress, premium state) are not in the page: the
+path page fetches them from /api/path/<slug>/state and applies them itself.
+Each page is therefore rendered once per catalog version and then served
+from memory. It carries an ETag and Last-Modified, so a browser revalidating
+it gets a 304.
+
+/ and /path/<slug> also mint a first-time visitor's session cookie, so they
+are sent private: a shared cache must not store them and replay that
+Set-Cookie (the whole server-side identity) to someone else.
+
+The catalog version is a hash of the paths and modules tables, which are
+seeded from code at startup. Templates and assets ship with the deploy, so
+they count through Last-Modified (the newest file under templates/ and
+static/). A catalog change or a deploy therefore invalidates every cached
+page.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+WATCHED_DIRS = ('templates', 'static')
+
+
+def catalog_version(conn):
+    """(version hash, last change) of the paths and modules tables"""
+    c = conn.cursor()
+    digest = hashlib.sha1()
+    updated = None
+    for table in ('paths', 'modules'):
+        c.execute(f'SELECT * FROM {table} ORDER BY id')
+        for row in c.fetchall():
+            digest.update(repr(row).encode('utf-8'))
+        c.execute(f'SELECT MAX(created_at) FROM {table}')
+        latest = c.fetchone()[0]
+        if latest and (updated is None or latest > updated):
+            updated = latest
+    if updated:
+        updated = datetime.strptime(updated, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return digest.hexdigest()[:12], updated
+
+
+def _newest_file(root=ROOT, dirs=WATCHED_DIRS):
+    newest = 0
+    for directory in dirs:
+        for dirpath, _, filenames in os.walk(os.path.join(root, directory)):
+            for filename in filenames:
+                newest = max(newest, os.path.getmtime(os.path.join(dirpath, filename)))
+    return datetime.fromtimestamp(int(newest), timezone.utc)
+
+
+class Page:
+    def __init__(self, body, version, last_modified):
+        self.body = body.encode('utf-8')
+        self.etag = hashlib.sha1(version.encode('utf-8') + self.body).hexdigest()[:16]
+        self.last_modified = last_modified
+
+
+class PageCache:
+    """Rendered HTML per page key for the current catalog version"""
+
+    def __init__(self):
+        self.version = None
+        self.last_modified = None
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    def set_catalog(self, version, updated=None):
+        """Start over for a (new) catalog version"""
+        files_changed = _newest_file()
+        with self.lock:
+            self.version = version
+            self.last_modified = max(updated, files_changed) if updated else files_changed
+            self.pages = {}
+
+    def get(self, key, render):
+        """The cached page for key, rendering it with render() the first time (None if render() returns None)"""
+        page = self.pages.get(key)
+        if page is None:
+            body = render()
+            if body is None:
+                return None
+            page = Page(body, self.version, self.last_modified)
+            with self.lock:
+                self.pages[key] = page
+        return page
+
+    def response(self, key, render, request, max_age=0, private=False):
+        """A conditional response for the page, or None if there is no such page.
+        max_age=0 makes browsers revalidate every time; private=True keeps it out of shared caches
+        (for routes that may set the session cookie)."""
+        from flask import Response
+
+        page = self.get(key, render)
+        if page is None:
+            return None
+        response = Response(page.body, mimetype='text/html')
+        response.set_etag(page.etag)
+        response.last_modified = page.last_modified
+        if private:
+            response.cache_control.private = True
+        elif max_age:
+            response.cache_control.public = True
+        if max_age:
+            response.cache_control.max_age = max_age
+        else:
+            response.cache_control.no_cache = True
+        return response.make_conditional(request)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Opt-in SQL query profiler for Healing Guru.
+
+With QUERY_PROFILER=1 every statement run through db.get_db() is recorded
+under its normalized text (literals replaced by ?) with call count,
+total/max time and rows returned (or affected). Statements slower than SLOW_QUERY_MS
+(default 50) are logged together with their EXPLAIN QUERY PLAN.
+
+The running app serves the collected stats at /debug/queries (send
+PROFILER_TOKEN as X-Profiler-Token when it is set); this file doubles as
+the CLI that dumps the top offenders:
+
+    python query_profiler.py --url http://localhost:5002 --sort total_ms --limit 20
+"""
+
+import os
+import re
+import sqlite3
+import threading
+
+ENABLED = os.environ.get('QUERY_PROFILER', '').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '50'))
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')
+
+_stats = {}
+_lock = threading.Lock()
+_logger = None
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(sql):
+    """Collapse whitespace and literals so identical statements share one entry"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (?)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _entry(key):
+    entry = _stats.get(key)
+    if entry is None:
+        entry = _stats[key] = {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+    return entry
+
+
+def record(sql, parameters, duration, connection, rowcount):
+    """Account one statement; returns the stats key so fetched rows can be added later"""
+    key = normalize(sql)
+    duration_ms = duration * 1000
+    with _lock:
+        entry = _entry(key)
+        entry['calls'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        if rowcount > 0:
+            entry['rows'] += rowcount
+
+    if duration_ms >= SLOW_QUERY_MS:
+        _log_slow_query(key, sql, parameters, duration_ms, connection)
+    return key
+
+
+def record_rows(key, rows):
+    """Add rows returned by fetchone/fetchmany/fetchall to a statement's entry"""
+    if key is None or not rows:
+        return
+    with _lock:
+        _entry(key)['rows'] += rows
+
+
+def explain(connection, sql, parameters=()):
+    """EXPLAIN QUERY PLAN lines for a statement (plain cursor, so it isn't profiled itself)"""
+    try:
+        cursor = sqlite3.Cursor(connection)
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+
+
+def _log_slow_query(key, sql, parameters, duration_ms, connection):
+    global _logger
+    if _logger is None:
+        import app_logging
+        _logger = app_logging.get_logger('healing_guru.sql')
+    _logger.warning("slow query", extra={
+        'sql': key,
+        'duration_ms': round(duration_ms, 2),
+        'plan': explain(connection, sql, parameters),
+    })
+
+
+def top(limit=20, sort='total_ms'):
+    """Top statements ordered by total_ms, max_ms, calls or rows"""
+    with _lock:
+        rows = [dict(entry, sql=key, mean_ms=entry['total_ms'] / entry['calls'] if entry['calls'] else 0.0)
+                for key, entry in _stats.items()]
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    for row in rows:
+        for field in ('total_ms', 'max_ms', 'mean_ms'):
+            row[field] = round(row[field], 3)
+    return rows[:limit]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def main():
+    import argparse
+    import json
+    import urllib.request
+
+    parser = argparse.ArgumentParser(description='Dump the slowest SQL statements from a running Healing Guru instance')
+    parser.add_argument('--url', default='http://localhost:5002', help='app base URL')
+    parser.add_argument('--sort', default='total_ms', choices=['total_ms', 'max_ms', 'mean_ms', 'calls', 'rows'])
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--token', default=PROFILER_TOKEN, help='X-Profiler-Token (defaults to $PROFILER_TOKEN)')
+    parser.add_argument('--reset', action='store_true', help='clear the stats after reading them')
+    parser.add_argument('--json', action='store_true', help='print raw JSON')
+    args = parser.parse_args()
+
+    query = f"?sort={args.sort}&limit={args.limit}" + ("&reset=1" if args.reset else "")
+    req = urllib.request.Request(f"{args.url.rstrip('/')}/debug/queries{query}")
+    if args.token:
+        req.add_header('X-Profiler-Token', args.token)
+    with urllib.request.urlopen(req, timeout=10) as response:
+        data = json.load(response)
+
+    if args.json:
+        print(json.dumps(data, indent=2))
+        return
+
+    print(f"{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}{'rows':>9}  statement")
+    for row in data['queries']:
+        print(f"{row['calls']:>8}{row['total_ms']:>12.1f}{row['mean_ms']:>10.2f}{row['max_ms']:>10.2f}{row['rows']:>9}  {row['sql'][:120]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Rate limiting and admission control for /api/chat.
+
+Every chat turn does two or three writes, and under SQLite one client
+sending as fast as it can makes everyone else wait on the write lock. Two
+checks run before the route touches the database, and both answer with a
+fast 429 and Retry-After:
+
+- Token buckets per session user_id and per client IP. A bucket holds up to
+  BURST tokens, refills at RATE per minute, and each turn takes one.
+- Admission control: at most CHAT_MAX_CONCURRENT turns run at once in this
+  process. One more is turned away rather than queued behind the lock.
+
+Messages that look like a crisis skip both checks (the route passes
+exempt=...). Someone reaching out in crisis always gets the crisis response.
+
+Buckets live in process memory (a bounded LRU). With several worker
+processes, set RATE_LIMIT_URL=redis://... (requires the optional `redis`
+package) so all of them share the buckets. Admission stays per process,
+since it protects that process's own connections.
+
+Settings (environment):
+    RATE_LIMIT_ENABLED         default on
+    CHAT_RATE_PER_MINUTE       per user, default 20
+    CHAT_BURST                 per user, default 10
+    CHAT_IP_RATE_PER_MINUTE    per IP, default 300 (many users can share an IP)
+    CHAT_IP_BURST              per IP, default 200
+    CHAT_MAX_CONCURRENT        chat turns in flight per process, default 16
+    RATE_LIMIT_PROXY_HOPS      proxies in front of the app that append to
+                               X-Forwarded-For, default 1; set 0 when clients
+                               connect directly, so the header can't be forged
+    RATE_LIMIT_URL             shared Redis store for the buckets
+
+Load tests from a single machine hit the IP bucket; run them with
+RATE_LIMIT_ENABLED=0.
+"""
+
+import functools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1').lower() in ('1', 'true', 'yes')
+USER_RATE = float(os.environ.get('CHAT_RATE_PER_MINUTE', '20')) / 60
+USER_BURST = int(os.environ.get('CHAT_BURST', '10'))
+IP_RATE = float(os.environ.get('CHAT_IP_RATE_PER_MINUTE', '300')) / 60
+IP_BURST = int(os.environ.get('CHAT_IP_BURST', '200'))
+MAX_CONCURRENT = int(os.environ.get('CHAT_MAX_CONCURRENT', '16'))
+PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '1'))
+STORE_URL = os.environ.get('RATE_LIMIT_URL')
+
+# In-process buckets kept (least recently used dropped first; a dropped bucket was full anyway
+# unless its owner is sending right now)
+MAX_KEYS = 100000
+
+# Retry-After for a request turned away by admission control
+BUSY_RETRY_AFTER = 1
+
+
+class MemoryBucketStore:
+    """Token buckets in this process"""
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self.buckets = OrderedDict()  # key -> (tokens, updated)
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, now=None):
+        """Take one token; returns 0 if there was one, else seconds until there will be"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class RedisBucketStore:
+    """Token buckets in Redis, shared by every worker process"""
+
+    # Refill and take atomically; returns the wait in milliseconds (0 = allowed)
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = math.ceil((1 - tokens) / rate * 1000)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return wait
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_URL is set but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        return self.script(keys=[f'healing_guru:ratelimit:{key}'], args=[rate, burst, now]) / 1000
+
+
+def create_store():
+    if STORE_URL:
+        return RedisBucketStore(STORE_URL)
+    return MemoryBucketStore()
+
+
+def client_ip(request, proxy_hops=PROXY_HOPS):
+    """The client address: added by the nearest trusted proxy, or the peer when there is none"""
+    if proxy_hops:
+        route = request.access_route
+        if len(route) >= proxy_hops:
+            return route[-proxy_hops]
+    return request.remote_addr
+
+
+class ChatLimiter:
+    """Per-user and per-IP token buckets plus a cap on turns in flight"""
+
+    def __init__(self, store=None, max_concurrent=MAX_CONCURRENT):
+        self.store = store or create_store()
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+
+    def check(self, user_id, ip):
+        """Seconds the client should wait, or 0 if this turn may go ahead"""
+        wait = self.store.take(f'ip:{ip}', IP_RATE, IP_BURST)
+        if not wait and user_id:
+            wait = self.store.take(f'user:{user_id}', USER_RATE, USER_BURST)
+        return wait
+
+    def admit(self):
+        """Claim a slot without waiting; False if every slot is busy"""
+        return self.slots.acquire(blocking=False)
+
+    def release(self):
+        self.slots.release()
+
+
+def _too_many(reason, retry_after):
+    from flask import jsonify
+
+    metrics.record_rate_limited(reason)
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({
+        'error': 'rate_limited',
+        'message': "You're sending messages faster than I can keep up with. "
+                   f"Take a breath - you can send your next one in {retry_after} seconds.",
+        'retry_after': retry_after,
+        'pattern': None,
+        'emotion': None
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def limited(limiter, exempt=None):
+    """Route decorator: rate limit and admit the request before the view runs.
+    exempt(request) returning True lets the request skip both checks."""
+    from flask import request, session
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ENABLED or (exempt is not None and exempt(request)):
+                return view(*args, **kwargs)
+            wait = limiter.check(session.get('user_id'), client_ip(request))
+            if wait:
+                return _too_many('rate', wait)
+            if not limiter.admit():
+                return _too_many('busy', BUSY_RETRY_AFTER)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.release()
+        return wrapper
+    return decorator
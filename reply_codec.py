@@ -0,0 +1,135 @@
+"""
+Compact storage encoding for assistant replies.
+
+Nearly every assistant reply is assembled from canned text in HealingGuruAI
+(emotional state responses, affirmations, tool offers, crisis text), so
+storing it verbatim repeats the same few hundred strings on every turn.
+Replies are stored instead as a list of response-template ids and literal
+dynamic parts (quoted snippets, tool names, joins), and rendered on read:
+MARKER + '[12," Reminder: ",87]' is template 12, the literal text, then
+template 87.
+
+Templates are harvested from the HealingGuruAI instance at startup and kept
+in the response_templates table, so an id keeps rendering the same text even
+after the phrase tables change. Content without the leading marker (user
+messages, replies stored before this encoding, replies with no template
+text) is plain text and renders as itself.
+"""
+
+import json
+import threading
+import types
+
+MARKER = '\x1e'
+
+# Shorter fragments aren't worth an id; the prefix length keys the match index
+MIN_TEMPLATE_LENGTH = 24
+PREFIX_LENGTH = 16
+
+
+def harvest_templates(ai):
+    """Every canned string of MIN_TEMPLATE_LENGTH+ in the AI's data tables and method literals"""
+    found = set()
+
+    def walk(value):
+        if isinstance(value, str):
+            if len(value) >= MIN_TEMPLATE_LENGTH:
+                found.add(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, (list, tuple, set)):
+            for item in value:
+                walk(item)
+
+    def walk_code(code):
+        for const in code.co_consts:
+            if isinstance(const, str) and len(const) >= MIN_TEMPLATE_LENGTH:
+                found.add(const)
+            elif isinstance(const, types.CodeType):
+                walk_code(const)
+
+    walk(vars(ai))
+    for attribute in vars(type(ai)).values():
+        if isinstance(attribute, types.FunctionType):
+            walk_code(attribute.__code__)
+    return sorted(found)
+
+
+class ReplyCodec:
+    """Encodes replies against the response_templates table and renders them back"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.texts = {}   # id -> text
+        self.index = {}   # first PREFIX_LENGTH chars -> [(text, id)], longest first
+        self.lock = threading.Lock()
+
+    def register(self, templates):
+        """Add any new templates to the table, then load the full id mapping"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('SELECT text FROM response_templates')
+        known = {row[0] for row in c.fetchall()}
+        for text in templates:
+            if text not in known:
+                c.execute('INSERT INTO response_templates (text) VALUES (?) ON CONFLICT(text) DO NOTHING', (text,))
+        conn.commit()
+        conn.close()
+        self.load()
+
+    def load(self):
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('SELECT id, text FROM response_templates')
+        rows = c.fetchall()
+        conn.close()
+
+        index = {}
+        for template_id, text in sorted(rows, key=lambda row: len(row[1]), reverse=True):
+            index.setdefault(text[:PREFIX_LENGTH], []).append((text, template_id))
+        with self.lock:
+            self.texts = dict(rows)
+            self.index = index
+
+    def encode(self, text):
+        """Stored form of a reply: template ids plus literal parts, or the text itself if that isn't shorter"""
+        if not text or not self.index:
+            return text
+        parts = []
+        literal_start = i = 0
+        while i <= len(text) - MIN_TEMPLATE_LENGTH:
+            match = None
+            for template, template_id in self.index.get(text[i:i + PREFIX_LENGTH], ()):
+                if text.startswith(template, i):
+                    match = (template, template_id)
+                    break
+            if match is None:
+                i += 1
+                continue
+            if literal_start < i:
+                parts.append(text[literal_start:i])
+            parts.append(match[1])
+            i += len(match[0])
+            literal_start = i
+        if not any(isinstance(part, int) for part in parts):
+            return text
+        if literal_start < len(text):
+            parts.append(text[literal_start:])
+
+        encoded = MARKER + json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+        if len(encoded) >= len(text) or self.render(encoded) != text:
+            return text
+        return encoded
+
+    def render(self, content):
+        """Text of a stored message (plain content is returned unchanged)"""
+        if not content or content[0] != MARKER:
+            return content
+        parts = json.loads(content[1:])
+        texts = self.texts
+        if any(isinstance(part, int) and part not in texts for part in parts):
+            # Registered by another process since we loaded
+            self.load()
+            texts = self.texts
+        return ''.join(texts[part] if isinstance(part, int) else part for part in parts)
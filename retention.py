@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Message retention for Healing Guru.
+
+Messages and insights older than RETENTION_DAYS are moved out of the hot
+tables into message_archive: one zlib-compressed JSON blob per user per run,
+stored next to the user's other rows (so shards and storage backends need
+nothing special). /api/history, /api/insights, /account and /account/export
+read archived ranges transparently through storage.MessageRepository.
+
+Work is done in small batches - at most RETENTION_BATCH_USERS users per
+batch and RETENTION_BATCH_ROWS rows per user and kind, each user in its own
+short transaction, with a pause between batches - so archiving never holds
+the write lock for long.
+
+With RETENTION_ENABLED=1 the app schedules a pass every
+RETENTION_INTERVAL_SECONDS as a background job (see jobs.py). It can also be
+run by hand or from cron:
+
+    python retention.py --days 180
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+ENABLED = os.environ.get('RETENTION_ENABLED', '').lower() in ('1', 'true', 'yes')
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', '180'))
+INTERVAL_SECONDS = int(os.environ.get('RETENTION_INTERVAL_SECONDS', '3600'))
+BATCH_USERS = int(os.environ.get('RETENTION_BATCH_USERS', '50'))
+BATCH_ROWS = int(os.environ.get('RETENTION_BATCH_ROWS', '500'))
+BATCH_PAUSE_SECONDS = float(os.environ.get('RETENTION_BATCH_PAUSE_SECONDS', '0.5'))
+
+_logger = None
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        import app_logging
+        _logger = app_logging.get_logger('healing_guru.retention')
+    return _logger
+
+
+def cutoff_for(days):
+    """Timestamp in the same format as SQLite's CURRENT_TIMESTAMP (UTC)"""
+    return (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def run_once(store, days=RETENTION_DAYS, batch_users=BATCH_USERS, batch_rows=BATCH_ROWS,
+             pause=BATCH_PAUSE_SECONDS, max_batches=None):
+    """Archive everything older than `days`, batch by batch; returns (users, rows) archived"""
+    cutoff = cutoff_for(days)
+    users_done = set()
+    rows_done = batches = 0
+    while max_batches is None or batches < max_batches:
+        users = store.messages.users_to_archive(cutoff, batch_users)
+        if not users:
+            break
+        for user_id in users:
+            rows_done += store.messages.archive_user(user_id, cutoff, batch_rows)
+        users_done.update(users)
+        batches += 1
+        time.sleep(pause)
+
+    if rows_done:
+        _get_logger().info("retention pass archived rows",
+                           extra={'users': len(users_done), 'rows': rows_done, 'cutoff': cutoff})
+    return len(users_done), rows_done
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Archive messages and insights older than the retention window')
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS)
+    parser.add_argument('--batch-users', type=int, default=BATCH_USERS)
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--max-batches', type=int, default=None, help='stop after this many batches')
+    args = parser.parse_args()
+
+    from db import init_shards
+    from storage import create_storage
+    init_shards()
+    store = create_storage()
+    users, rows = run_once(store, args.days, args.batch_users, args.batch_rows, max_batches=args.max_batches)
+    print(f"Archived {rows} rows for {users} users (older than {args.days} days)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Full-text search for Healing Guru (SQLite FTS5).
+
+Community search: community_search holds one row per post (rowid = post id)
+with its title, its content and the text of all its comments. Triggers on
+community_posts and community_comments keep it in step with every insert,
+edit and delete, so nothing in the write path has to remember it exists.
+/community/search ranks matches with bm25 (a title match counts most, a
+comment match least) and shows a highlighted snippet from whichever column
+matched best.
+
+Private search: user_search indexes each user's own chat messages, journal
+entries and module reflections, next to their per-user tables (in their
+shard when sharding is on). user_id is an indexed column, and every query
+filters on it inside MATCH, so FTS5 intersects posting lists instead of
+scoring other users' rows. Assistant replies are indexed as the text the
+user read, not reply_codec's stored form. The repositories keep it current:
+MessageRepository.add()/add_reply() and ProgressRepository.complete() index
+as they write, and delete_user() and the retention archive remove entries.
+Rows get rowid = source id * 4 + kind code, so one entry is replaced or
+removed by rowid without a search. A store that gets the index for the
+first time is filled by the 'search_reindex' job.
+
+Servers without FTS5, and the PostgreSQL storage backend, fall back to a
+LIKE scan (see CommunityRepository.search and MessageRepository.search).
+"""
+
+import re
+import sqlite3
+
+from markupsafe import Markup, escape
+
+# bm25 weights for (title, content, comments)
+COMMUNITY_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Snippets are built with control characters around the matches and only turned into
+# <mark> after escaping, so post text can never inject HTML
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+SNIPPET_TOKENS = 24
+
+COMMUNITY_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS community_search
+       USING fts5(title, content, comments, tokenize='porter unicode61')''',
+    '''CREATE TRIGGER IF NOT EXISTS community_search_post_insert AFTER INSERT ON community_posts BEGIN
+         INSERT INTO community_search (rowid, title, content, comments) VALUES (new.id, new.title, new.content, '');
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS community_search_post_update AFTER UPDATE OF title, content ON community_posts BEGIN
+         UPDATE community_search SET title = new.title, content = new.content WHERE rowid = new.id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS community_search_post_delete AFTER DELETE ON community_posts BEGIN
+         DELETE FROM community_search WHERE rowid = old.id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS community_search_comment_insert AFTER INSERT ON community_comments BEGIN
+         UPDATE community_search SET comments = (SELECT COALESCE(group_concat(content, char(10)), '')
+                                                 FROM community_comments WHERE post_id = new.post_id)
+         WHERE rowid = new.post_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS community_search_comment_update AFTER UPDATE OF content ON community_comments BEGIN
+         UPDATE community_search SET comments = (SELECT COALESCE(group_concat(content, char(10)), '')
+                                                 FROM community_comments WHERE post_id = new.post_id)
+         WHERE rowid = new.post_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS community_search_comment_delete AFTER DELETE ON community_comments BEGIN
+         UPDATE community_search SET comments = (SELECT COALESCE(group_concat(content, char(10)), '')
+                                                 FROM community_comments WHERE post_id = old.post_id)
+         WHERE rowid = old.post_id;
+       END''',
+]
+
+COMMUNITY_BACKFILL = '''INSERT INTO community_search (rowid, title, content, comments)
+                        SELECT cp.id, cp.title, cp.content,
+                               (SELECT COALESCE(group_concat(cc.content, char(10)), '')
+                                FROM community_comments cc WHERE cc.post_id = cp.id)
+                        FROM community_posts cp'''
+
+
+USER_SCHEMA = '''CREATE VIRTUAL TABLE IF NOT EXISTS user_search
+                 USING fts5(user_id, body, kind UNINDEXED, ref_id UNINDEXED, created_at UNINDEXED,
+                            tokenize='porter unicode61')'''
+
+# kind -> rowid code; ref_id is the message id, journal entry id or module id
+USER_KINDS = {'message': 1, 'journal': 2, 'reflection': 3}
+
+
+def _fts5_available():
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+# Whether the linked SQLite library was built with FTS5
+FTS5 = _fts5_available()
+
+
+def create_community_index(conn):
+    """Create the community index and its triggers; index existing posts the first time.
+    Returns False if this SQLite has no FTS5."""
+    if not FTS5:
+        return False
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'community_search'")
+    exists = c.fetchone() is not None
+    for statement in COMMUNITY_SCHEMA:
+        c.execute(statement)
+    if not exists:
+        c.execute(COMMUNITY_BACKFILL)
+    return True
+
+
+def create_user_index(conn):
+    """Create the private search index in one user store; True if it did not exist before"""
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'user_search'")
+    if c.fetchone() is not None:
+        return False
+    c.execute(USER_SCHEMA)
+    conn.commit()
+    return True
+
+
+def entry_rowid(kind, source_id):
+    return source_id * 4 + USER_KINDS[kind]
+
+
+def index_entry(c, kind, source_id, user_id, ref_id, body, created_at=None):
+    """Add or replace one entry in user_search (source_id: the row's id in its own table)"""
+    rowid = entry_rowid(kind, source_id)
+    c.execute('DELETE FROM user_search WHERE rowid = ?', (rowid,))
+    if body:
+        c.execute('''INSERT INTO user_search (rowid, user_id, body, kind, ref_id, created_at)
+                     VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))''',
+                  (rowid, user_id, body, kind, ref_id, created_at))
+
+
+def user_filter(user_id):
+    """MATCH expression selecting one user's entries"""
+    return 'user_id : "%s"' % str(user_id).replace('"', '""')
+
+
+def user_query(user_id, text):
+    """MATCH expression for text in one user's entries, or None if nothing searchable"""
+    match = fts_query(text)
+    if match is None:
+        return None
+    return f'{user_filter(user_id)} AND body : ({match})'
+
+
+def fts_query(text):
+    """A safe FTS5 MATCH expression for what a user typed, or None if nothing searchable.
+
+    Every word is quoted (so FTS5 operators and punctuation are taken literally) and all
+    words must match; the last one also matches as a prefix, for search-as-you-type.
+    """
+    words = re.findall(r'\w+', text or '')[:12]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    """HTML for a snippet(): escaped text with the matched terms in <mark>"""
+    html = str(escape(snippet or ''))
+    return Markup(html.replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
@@ -0,0 +1,269 @@
+"""
+Server-side sessions for Healing Guru.
+
+Flask's default session is the whole session dict in a cookie signed with
+app.secret_key. That key used to be generated at every process start, so
+after a restart (or on a second worker) every cookie failed to verify and
+every visitor silently became a new user_id: their history, progress and
+premium status were orphaned.
+
+Here the cookie carries only a compact random session id (22 characters
+plus a signature). The data lives server-side, in the session database
+(db.SESSION_DATABASE) or, with SESSION_STORE_URL=redis://..., in Redis
+(requires the optional `redis` package). Any worker and any restart finds
+the same session, and so the same user_id.
+
+The signing key is SECRET_KEY from the environment; set it in production.
+Without it, a key is generated once and kept in a file next to the database
+(<database>.secret), so every process using that database agrees on it.
+
+Expiry slides: a session lives SESSION_LIFETIME_DAYS past its last use.
+To keep a page view from being a write, the expiry (and the cookie) is
+only pushed forward once SESSION_REFRESH_SECONDS have passed since it was
+last set. Expired rows are removed by the 'purge_sessions' job.
+
+Settings (environment):
+    SECRET_KEY                session cookie signing key
+    SESSION_LIFETIME_DAYS     default 30
+    SESSION_REFRESH_SECONDS   default 3600
+    SESSION_STORE_URL         shared Redis store instead of SQLite
+"""
+
+import json
+import os
+import secrets
+import tempfile
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from db import DATABASE, get_session_db
+
+LIFETIME_SECONDS = int(float(os.environ.get('SESSION_LIFETIME_DAYS', '30')) * 86400)
+REFRESH_SECONDS = int(os.environ.get('SESSION_REFRESH_SECONDS', '3600'))
+STORE_URL = os.environ.get('SESSION_STORE_URL')
+KEY_FILE = f"{os.path.splitext(DATABASE)[0]}.secret"
+
+SALT = 'healing-guru-session'
+
+
+def _get_logger():
+    import app_logging
+    return app_logging.get_logger('healing_guru.sessions')
+
+
+def load_secret_key(key_file=KEY_FILE):
+    """SECRET_KEY, or the key kept in key_file (created on first use)"""
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    if os.path.exists(key_file):
+        return _read_key(key_file)
+    # Write a complete key to a temp file, then link it into place: link() fails if the file
+    # exists, so when several workers start at once exactly one key wins, and nobody can read
+    # a file that has been created but not written yet
+    key = secrets.token_hex(32)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(key_file)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(key)
+        os.link(temp_path, key_file)
+    except FileExistsError:
+        return _read_key(key_file)
+    finally:
+        os.unlink(temp_path)
+    _get_logger().warning("SECRET_KEY is not set; generated one in %s", key_file)
+    return key
+
+
+def _read_key(key_file):
+    with open(key_file) as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"{key_file} is empty; delete it or set SECRET_KEY")
+    return key
+
+
+class SQLiteSessionStore:
+    """Sessions in the session database; expires_at is a Unix timestamp"""
+
+    def load(self, sid):
+        """(data, expires_at), or None for an unknown or expired session"""
+        conn = get_session_db()
+        c = conn.cursor()
+        c.execute('SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?', (sid, time.time()))
+        row = c.fetchone()
+        conn.close()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, sid, data, expires_at):
+        conn = get_session_db()
+        conn.cursor().execute('''INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)
+                                 ON CONFLICT (id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at''',
+                              (sid, json.dumps(data), expires_at))
+        conn.commit()
+        conn.close()
+
+    def touch(self, sid, expires_at):
+        conn = get_session_db()
+        conn.cursor().execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (expires_at, sid))
+        conn.commit()
+        conn.close()
+
+    def delete(self, sid):
+        conn = get_session_db()
+        conn.cursor().execute('DELETE FROM sessions WHERE id = ?', (sid,))
+        conn.commit()
+        conn.close()
+
+    def purge(self):
+        """Delete expired sessions; returns how many"""
+        conn = get_session_db()
+        c = conn.cursor()
+        c.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),))
+        deleted = c.rowcount
+        conn.commit()
+        conn.close()
+        return deleted
+
+
+class RedisSessionStore:
+    """Sessions in Redis, expired by Redis itself"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_STORE_URL is set but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, sid):
+        return f"healing_guru:session:{sid}"
+
+    def load(self, sid):
+        pipe = self.client.pipeline()
+        pipe.get(self._key(sid))
+        pipe.ttl(self._key(sid))
+        data, ttl = pipe.execute()
+        if data is None:
+            return None
+        return json.loads(data), time.time() + max(ttl, 0)
+
+    def save(self, sid, data, expires_at):
+        self.client.set(self._key(sid), json.dumps(data), exat=int(expires_at))
+
+    def touch(self, sid, expires_at):
+        self.client.expireat(self._key(sid), int(expires_at))
+
+    def delete(self, sid):
+        self.client.delete(self._key(sid))
+
+    def purge(self):
+        return 0
+
+
+def create_store():
+    if STORE_URL:
+        return RedisSessionStore(STORE_URL)
+    return SQLiteSessionStore()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data plus its id; tracks access and changes like Flask's cookie session"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class ServerSessionInterface(SessionInterface):
+    """Session id in a signed cookie, data in the session store"""
+
+    def __init__(self, store=None, lifetime=LIFETIME_SECONDS, refresh=REFRESH_SECONDS):
+        self.store = store or create_store()
+        self.lifetime = lifetime
+        self.refresh = refresh
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=SALT)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            stored = self.store.load(sid) if sid else None
+            if stored is not None:
+                data, expires_at = stored
+                return ServerSession(data, sid, expires_at)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.sid is not None and session.modified:
+                # Cleared (e.g. account deletion): end the session for good
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        expires_at = now + self.lifetime
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(16)
+            self.store.save(session.sid, dict(session), expires_at)
+        elif session.modified:
+            self.store.save(session.sid, dict(session), expires_at)
+        elif session.expires_at is not None and expires_at - session.expires_at >= self.refresh:
+            self.store.touch(session.sid, expires_at)
+        else:
+            return
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode('ascii'),
+            expires=int(expires_at),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def init_app(app):
+    """Give the app its stable signing key and the server-side session store"""
+    app.secret_key = load_secret_key()
+    app.session_interface = ServerSessionInterface()
+    return app.session_interface
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Split an existing Healing Guru database into per-user shards.
+
+Copies the per-user tables (db.SHARDED_TABLES: messages, insights, journal,
+archived history and insight counts) from the main database into N shard files (routed
+with the same db.shard_for() hash the app uses), keeping row ids, then
+verifies every shard received exactly the rows routed to it.
+Catalog, community, progress and subscription tables are left where they are.
+The private search index (search.py) is not copied: the app creates it in
+each new shard at startup and the 'search_reindex' job fills it.
+
+Run it with the app stopped, before starting the app with the same shard
+count:
+
+    python shard_migrate.py --shards 4
+    HEALING_GURU_SHARDS=4 python app_chat.py
+
+Re-running after an interrupted copy is safe with --resume (rows are
+inserted by id, so already copied rows are skipped). --delete-source
+removes the copied rows from the main database once verification passes.
+"""
+
+import argparse
+import sqlite3
+import sys
+
+import db
+
+
+def migrate_table(source, shards, table, shard_count, batch_size):
+    """Copy one table in id order, batch by batch; returns rows routed to each shard"""
+    columns = [row[1] for row in source.execute(f'PRAGMA table_info({table})')]
+    user_column = columns.index('user_id')
+    insert = (f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+              f"VALUES ({', '.join('?' for _ in columns)})")
+
+    routed = [0] * shard_count
+    cursor = source.execute(f'SELECT {", ".join(columns)} FROM {table} ORDER BY id')
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        batches = [[] for _ in range(shard_count)]
+        for row in rows:
+            batches[db.shard_for(row[user_column], shard_count)].append(row)
+        for index, batch in enumerate(batches):
+            if batch:
+                shards[index].executemany(insert, batch)
+                shards[index].commit()
+                routed[index] += len(batch)
+        print(f"  {table}: {sum(routed)} rows copied", end='\r')
+    print()
+    return routed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split the per-user tables into shard files')
+    parser.add_argument('--shards', type=int, required=True, help='number of shards (HEALING_GURU_SHARDS)')
+    parser.add_argument('--source', default=db.DATABASE, help='main database file')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--resume', action='store_true', help='continue into shards that already hold rows')
+    parser.add_argument('--delete-source', action='store_true',
+                        help='delete the copied rows from the main database after verification')
+    args = parser.parse_args()
+
+    if args.shards < 1:
+        parser.error('--shards must be at least 1')
+
+    source = sqlite3.connect(args.source)
+    shards = [sqlite3.connect(db.shard_path(index, args.source)) for index in range(args.shards)]
+
+    for shard in shards:
+        db.copy_schema(source, shard)
+
+    # Databases from before a table existed simply have nothing to copy for it
+    existing = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    tables = [table for table in db.SHARDED_TABLES if table in existing]
+
+    if not args.resume:
+        for index, shard in enumerate(shards):
+            for table in tables:
+                if shard.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+                    print(f"❌ {db.shard_path(index, args.source)} already has rows in {table} "
+                          f"(use --resume to continue an interrupted migration)")
+                    return 1
+
+    print(f"Splitting {args.source} into {args.shards} shards")
+    routed = {}
+    for table in tables:
+        routed[table] = migrate_table(source, shards, table, args.shards, args.batch_size)
+
+    # Verify: each shard holds exactly the rows routed to it
+    ok = True
+    for table in tables:
+        for index, shard in enumerate(shards):
+            expected = routed[table][index]
+            actual = shard.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            status = '✅' if actual == expected else '❌'
+            ok = ok and actual == expected
+            print(f"{status} shard {index} {table}: {actual} rows (expected {expected})")
+
+    if not ok:
+        print("❌ Verification failed - main database left untouched")
+        return 1
+
+    if args.delete_source:
+        for table in tables:
+            source.execute(f'DELETE FROM {table}')
+        source.commit()
+        print("Removed migrated rows from the main database")
+
+    print(f"✅ Done - start the app with HEALING_GURU_SHARDS={args.shards}")
+    for connection in shards + [source]:
+        connection.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+function updateConsent(type, value) {
+    fetch('/account/consent', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            type: type,
+            value: value
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            console.log('Consent updated');
+        }
+    });
+}
+
+function confirmDelete() {
+    document.getElementById('deleteConfirm').style.display = 'flex';
+}
+
+function closeDeleteModal() {
+    document.getElementById('deleteConfirm').style.display = 'none';
+    document.getElementById('deleteInput').value = '';
+}
+
+// Close modal if clicking outside
+document.getElementById('deleteConfirm').addEventListener('click', function(e) {
+    if (e.target === this) {
+        closeDeleteModal();
+    }
+});
@@ -0,0 +1,222 @@
+const chatContainer = document.getElementById('chatContainer');
+const messageInput = document.getElementById('messageInput');
+const sendBtn = document.getElementById('sendBtn');
+
+// Tool catalog is fetched once (ETag-cached by the browser); replies only carry tool ids
+let toolCatalogPromise = null;
+
+function loadToolCatalog() {
+    if (!toolCatalogPromise) {
+        toolCatalogPromise = fetch('/api/tools')
+            .then(response => response.json())
+            .then(data => {
+                const catalog = {};
+                data.tools.forEach(tool => { catalog[tool.id] = tool; });
+                return catalog;
+            })
+            .catch(error => {
+                toolCatalogPromise = null;
+                return {};
+            });
+    }
+    return toolCatalogPromise;
+}
+
+async function resolveTools(toolIds) {
+    if (!toolIds || toolIds.length === 0) return null;
+    const catalog = await loadToolCatalog();
+    return toolIds.map(id => catalog[id]).filter(Boolean);
+}
+
+function addMessage(content, role, pattern = null, emotion = null, tools = null) {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `message ${role}`;
+
+    let messageHTML = `<div class="message-content">${content}`;
+
+    if (pattern) {
+        messageHTML += `<div class="pattern-badge">Pattern detected: ${pattern.replace('_', ' ')}</div>`;
+    }
+
+    if (tools && tools.length > 0) {
+        messageHTML += '<div class="tools-box"><h4>🛠️ Try these tools right now:</h4>';
+        tools.forEach(tool => {
+            messageHTML += `<div class="tool-item"><strong>${tool.name}:</strong> ${tool.description}</div>`;
+        });
+        messageHTML += '</div>';
+    }
+
+    messageHTML += '</div>';
+    messageDiv.innerHTML = messageHTML;
+
+    // Remove typing indicator if exists
+    const typingIndicator = document.querySelector('.typing-indicator');
+    if (typingIndicator) {
+        typingIndicator.remove();
+    }
+
+    chatContainer.appendChild(messageDiv);
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+}
+
+function showTyping() {
+    const typingDiv = document.createElement('div');
+    typingDiv.className = 'message assistant';
+    typingDiv.innerHTML = '<div class="typing-indicator active"><span></span><span></span><span></span></div>';
+    chatContainer.appendChild(typingDiv);
+    chatContainer.scrollTop = chatContainer.scrollHeight;
+}
+
+async function sendMessage() {
+    const message = messageInput.value.trim();
+    if (!message) return;
+
+    // Add user message
+    addMessage(message, 'user');
+    messageInput.value = '';
+    messageInput.style.height = 'auto';
+
+    // Disable input
+    sendBtn.disabled = true;
+    messageInput.disabled = true;
+
+    // Show typing indicator
+    showTyping();
+
+    try {
+        const response = await fetch('/api/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ message })
+        });
+
+        const data = await response.json();
+        const tools = await resolveTools(data.tool_ids);
+
+        // Add AI response
+        addMessage(
+            data.message,
+            'assistant',
+            data.pattern,
+            data.emotion,
+            tools
+        );
+
+        // Count this turn's pattern without refetching /api/insights
+        if (data.insight_delta) {
+            mergeInsight(data.insight_delta);
+        }
+
+    } catch (error) {
+        addMessage('I apologize, I\'m having trouble responding right now. Please try again.', 'assistant');
+    }
+
+    // Re-enable input
+    sendBtn.disabled = false;
+    messageInput.disabled = false;
+    messageInput.focus();
+}
+
+function quickMessage(text) {
+    messageInput.value = text;
+    sendMessage();
+}
+
+function handleKeyPress(event) {
+    if (event.key === 'Enter' && !event.shiftKey) {
+        event.preventDefault();
+        sendMessage();
+    }
+}
+
+// Auto-resize textarea
+messageInput.addEventListener('input', function() {
+    this.style.height = 'auto';
+    this.style.height = Math.min(this.scrollHeight, 120) + 'px';
+});
+
+function toggleInsights() {
+    const panel = document.getElementById('insightsPanel');
+    panel.classList.toggle('open');
+    if (panel.classList.contains('open')) {
+        loadInsights();
+    }
+}
+
+// Pattern counts as last loaded from /api/insights, plus deltas from chat replies since
+let insights = null;
+
+async function loadInsights() {
+    try {
+        // The browser revalidates with If-None-Match, so an unchanged list is a 304
+        const response = await fetch('/api/insights');
+        const data = await response.json();
+        insights = data.insights;
+        renderInsights();
+    } catch (error) {
+        console.error('Error loading insights:', error);
+    }
+}
+
+function mergeInsight(delta) {
+    if (insights === null) return;  // not loaded yet - the panel fetches when opened
+    const existing = insights.find(insight => insight.pattern === delta.pattern);
+    if (existing) {
+        existing.count += delta.count;
+        existing.last_seen = delta.last_seen;
+    } else {
+        insights.push(delta);
+    }
+    insights.sort((a, b) => b.count - a.count);
+    renderInsights();
+}
+
+function renderInsights() {
+    const insightsList = document.getElementById('insightsList');
+
+    if (insights.length === 0) {
+        insightsList.innerHTML = '<p style="color: #999; font-style: italic;">Start chatting to see patterns emerge...</p>';
+        return;
+    }
+
+    insightsList.innerHTML = '';
+    insights.forEach(insight => {
+        const insightDiv = document.createElement('div');
+        insightDiv.className = 'insight-item';
+        insightDiv.innerHTML = `
+            <h3>${insight.pattern.replace('_', ' ')}</h3>
+            <p class="insight-count">Detected ${insight.count} time${insight.count > 1 ? 's' : ''}</p>
+            <p class="insight-count" style="margin-top: 5px; font-size: 11px;">Last seen: ${new Date(insight.last_seen).toLocaleDateString()}</p>
+        `;
+        insightsList.appendChild(insightDiv);
+    });
+}
+
+// Messages sent while offline are queued by the service worker (/sw.js) and replayed later
+if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.addEventListener('message', async event => {
+        if (event.data && event.data.type === 'chat-replayed') {
+            const reply = event.data.reply;
+            addMessage(reply.message, 'assistant', reply.pattern, reply.emotion, await resolveTools(reply.tool_ids));
+            if (reply.insight_delta) {
+                mergeInsight(reply.insight_delta);
+            }
+        }
+    });
+
+    // Browsers without Background Sync: ask the worker to send the queue once back online
+    window.addEventListener('online', () => {
+        navigator.serviceWorker.ready.then(registration => {
+            if (registration.active && !('sync' in registration)) {
+                registration.active.postMessage({ type: 'flush-outbox' });
+            }
+        });
+    });
+}
+
+// Load insights on page load
+window.addEventListener('load', () => {
+    messageInput.focus();
+});
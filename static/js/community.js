@@ -0,0 +1,6 @@
+function filterPosts(select, type) {
+    const params = new URLSearchParams(window.location.search);
+    params.set(type, select.value);
+    params.delete('page');
+    window.location.search = params.toString();
+}
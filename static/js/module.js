@@ -0,0 +1,56 @@
+// Toggle tool expansion
+document.addEventListener('DOMContentLoaded', function() {
+    const toolTags = document.querySelectorAll('.tool-tag');
+    toolTags.forEach(tool => {
+        tool.addEventListener('click', function() {
+            this.classList.toggle('active');
+        });
+    });
+});
+
+// Guided practice animation
+function startPractice(button) {
+    button.classList.add('hidden');
+    const stepsContainer = button.nextElementSibling;
+    const steps = stepsContainer.querySelectorAll('.tool-step');
+    stepsContainer.style.display = 'block';
+
+    let delay = 0;
+    steps.forEach((step, index) => {
+        setTimeout(() => {
+            step.classList.add('show');
+        }, delay);
+        delay += 4000; // 4 seconds between each step
+    });
+}
+
+async function completeModule() {
+    const reflection = document.getElementById('reflectionInput').value;
+    const button = document.querySelector('.complete-button');
+
+    button.disabled = true;
+    button.textContent = 'Saving...';
+
+    try {
+        const response = await fetch(document.body.dataset.moduleUrl + '/complete', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ reflection })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            document.getElementById('completionMessage').classList.add('show');
+            button.style.display = 'none';
+            document.getElementById('reflectionInput').disabled = true;
+        }
+    } catch (error) {
+        console.error('Error:', error);
+        button.disabled = false;
+        button.textContent = 'Mark as Complete';
+        alert('Something went wrong. Please try again.');
+    }
+}
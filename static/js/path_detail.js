@@ -0,0 +1,34 @@
+// The page is cached and shared by everyone; this applies the user's own progress and premium access
+fetch('/api/path/' + encodeURIComponent(document.body.dataset.slug) + '/state')
+    .then(response => response.json())
+    .then(state => {
+        const completed = new Set(state.completed || []);
+        document.querySelectorAll('.module-card').forEach(card => {
+            const isFree = card.dataset.free === '1';
+            const isCompleted = completed.has(Number(card.dataset.moduleId));
+            const isLocked = !isFree && !state.has_premium;
+
+            card.classList.toggle('locked', isLocked);
+            card.classList.toggle('completed', isCompleted);
+            const lockIcon = card.querySelector('.lock-icon');
+            if (lockIcon && !isLocked) {
+                lockIcon.remove();
+            }
+
+            const badge = card.querySelector('.module-badge');
+            if (isCompleted) {
+                badge.className = 'module-badge badge-completed';
+                badge.textContent = '✓ Completed';
+            } else if (isLocked) {
+                badge.className = 'module-badge badge-locked';
+                badge.textContent = 'Premium';
+            } else if (isFree) {
+                badge.className = 'module-badge badge-free';
+                badge.textContent = 'Free';
+            } else {
+                badge.className = 'module-badge badge-premium';
+                badge.textContent = 'Premium';
+            }
+        });
+    })
+    .catch(error => console.error('Error loading progress:', error));
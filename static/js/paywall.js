@@ -0,0 +1,87 @@
+// If user completes Gumroad purchase, they'll be redirected with a license key
+const urlParams = new URLSearchParams(window.location.search);
+const licenseKey = urlParams.get('license_key');
+
+if (licenseKey) {
+    // Save license key and redirect to module
+    fetch('/verify-license', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ license_key: licenseKey })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            window.location.href = document.body.dataset.moduleUrl;
+        } else {
+            showLicenseMessage(data.message || 'License verification failed', 'error');
+        }
+    })
+    .catch(error => {
+        console.error('License verification error:', error);
+        showLicenseMessage('Connection error. Please try again.', 'error');
+    });
+}
+
+// Manual license entry form handler
+document.getElementById('licenseForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+
+    const licenseInput = document.getElementById('licenseKey');
+    const submitButton = e.target.querySelector('button[type="submit"]');
+    const originalButtonText = submitButton.textContent;
+
+    // Show loading state
+    submitButton.textContent = 'Verifying...';
+    submitButton.disabled = true;
+
+    try {
+        const response = await fetch('/verify-license', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ license_key: licenseInput.value.trim() })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showLicenseMessage(
+                '✓ License verified! Activating premium access...',
+                'success'
+            );
+
+            // Redirect after 1 second
+            setTimeout(() => {
+                window.location.href = document.body.dataset.moduleUrl;
+            }, 1000);
+        } else {
+            showLicenseMessage(
+                data.message || 'Invalid license key. Please check and try again.',
+                'error'
+            );
+            submitButton.textContent = originalButtonText;
+            submitButton.disabled = false;
+        }
+    } catch (error) {
+        console.error('License verification error:', error);
+        showLicenseMessage('Connection error. Please try again.', 'error');
+        submitButton.textContent = originalButtonText;
+        submitButton.disabled = false;
+    }
+});
+
+function showLicenseMessage(message, type) {
+    const messageDiv = document.getElementById('licenseMessage');
+    messageDiv.textContent = message;
+    messageDiv.style.display = 'block';
+
+    if (type === 'success') {
+        messageDiv.style.background = '#d4edda';
+        messageDiv.style.color = '#155724';
+        messageDiv.style.border = '1px solid #c3e6cb';
+    } else {
+        messageDiv.style.background = '#f8d7da';
+        messageDiv.style.color = '#721c24';
+        messageDiv.style.border = '1px solid #f5c6cb';
+    }
+}
@@ -67,7 +67,7 @@ function dismissInstallBanner() {
 // Register service worker
 if ('serviceWorker' in navigator) {
   window.addEventListener('load', () => {
-    navigator.serviceWorker.register('/static/sw.js')
+    navigator.serviceWorker.register('/sw.js')
       .then((registration) => {
         console.log('ServiceWorker registered: ', registration);
       })
@@ -0,0 +1,1158 @@
+"""
+Storage backends and repositories for Healing Guru's user data.
+
+Routes read and write messages, progress, community, subscriptions and
+consent through the repositories here instead of inline SQL, so the same
+code runs against:
+
+    STORAGE_BACKEND=sqlite    (default) the local SQLite file(s) from db.py,
+                              including per-user shards
+    STORAGE_BACKEND=postgres  a PostgreSQL server at DATABASE_URL through a
+                              psycopg2 connection pool (STORAGE_POOL_MIN/MAX)
+    STORAGE_BACKEND=memory    the server code path (pool, schema, RETURNING
+                              ids) over an in-memory SQLite database - a
+                              containerless stand-in for tests, e.g.
+                              STORAGE_BACKEND=memory python test_bot.py --in-process client
+
+The course catalog (paths, modules) is seeded from code at startup and stays
+in the local SQLite database in every mode, so repositories return catalog
+ids and routes look titles up from the catalog themselves.
+
+SQL is written once with ? placeholders; server backends translate it.
+"""
+
+import atexit
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import search
+from db import all_user_dbs, get_db, get_user_db
+from reply_codec import ReplyCodec
+
+BACKEND = os.environ.get('STORAGE_BACKEND', 'sqlite').lower()
+DATABASE_URL = os.environ.get('DATABASE_URL')
+POOL_MIN = int(os.environ.get('STORAGE_POOL_MIN', '1'))
+POOL_MAX = int(os.environ.get('STORAGE_POOL_MAX', '10'))
+SUBSCRIPTION_CACHE_SECONDS = float(os.environ.get('SUBSCRIPTION_CACHE_SECONDS', '60'))
+SUBSCRIPTION_CACHE_SIZE = 10000
+# 0 writes "module started" marks straight away; > 0 buffers them and writes them in batches this often
+PROGRESS_FLUSH_SECONDS = float(os.environ.get('PROGRESS_FLUSH_SECONDS', '0'))
+PROGRESS_FLUSH_BATCH = 500
+
+# Feed cards show the start of a post (the card clamps it to three lines anyway)
+EXCERPT_CHARS = 240
+READING_WORDS_PER_MINUTE = 200
+
+# Schema for server backends ({pk}, {ts} and {blob} differ between PostgreSQL and the stand-in)
+SERVER_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS messages
+       (id {pk}, user_id TEXT, role TEXT, content TEXT,
+        timestamp {ts} DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS insights
+       (id {pk}, user_id TEXT, pattern_type TEXT, description TEXT,
+        detected_at {ts} DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS journal
+       (id {pk}, user_id TEXT, emotion TEXT, intensity INTEGER, content TEXT,
+        timestamp {ts} DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS message_archive
+       (id {pk}, user_id TEXT, kind TEXT, first_at {ts}, last_at {ts}, row_count INTEGER,
+        summary TEXT, payload {blob}, archived_at {ts} DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS insight_counts
+       (id {pk}, user_id TEXT, pattern_type TEXT, count INTEGER, last_seen {ts},
+        UNIQUE (user_id, pattern_type))''',
+    '''CREATE TABLE IF NOT EXISTS response_templates
+       (id {pk}, text TEXT UNIQUE NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS user_progress
+       (id {pk}, user_id TEXT, path_id INTEGER, module_id INTEGER,
+        started_at {ts} DEFAULT CURRENT_TIMESTAMP, completed_at {ts}, reflection_response TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS subscriptions
+       (id {pk}, user_id TEXT UNIQUE, gumroad_license_key TEXT, subscription_status TEXT,
+        started_at {ts} DEFAULT CURRENT_TIMESTAMP, expires_at TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS pending_subscriptions
+       (id {pk}, license_key TEXT UNIQUE, email TEXT, subscription_status TEXT, expires_at TEXT,
+        created_at {ts} DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS community_posts
+       (id {pk}, user_id TEXT, display_name TEXT, path_slug TEXT, category TEXT,
+        title TEXT NOT NULL, content TEXT NOT NULL, created_at {ts} DEFAULT CURRENT_TIMESTAMP,
+        excerpt TEXT, word_count INTEGER, reading_minutes INTEGER)''',
+    '''CREATE TABLE IF NOT EXISTS community_comments
+       (id {pk}, post_id INTEGER, user_id TEXT, display_name TEXT, content TEXT NOT NULL,
+        created_at {ts} DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS user_consent
+       (id {pk}, user_id TEXT UNIQUE, cookies_accepted BOOLEAN DEFAULT FALSE,
+        data_processing_accepted BOOLEAN DEFAULT FALSE, consent_date {ts} DEFAULT CURRENT_TIMESTAMP,
+        ip_address TEXT, last_updated {ts} DEFAULT CURRENT_TIMESTAMP)''',
+    'CREATE INDEX IF NOT EXISTS idx_messages_user ON messages (user_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_insights_user ON insights (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_message_archive_user ON message_archive (user_id, kind, first_at)',
+    'CREATE INDEX IF NOT EXISTS idx_progress_user ON user_progress (user_id, path_id)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_progress_user_module ON user_progress (user_id, module_id)',
+    'CREATE INDEX IF NOT EXISTS idx_subscriptions_license ON subscriptions (gumroad_license_key)',
+    'CREATE INDEX IF NOT EXISTS idx_comments_post ON community_comments (post_id)',
+]
+
+# Columns added after a server schema was first created (the in-memory stand-in is always new)
+SERVER_MIGRATIONS = {
+    'postgres': [
+        'ALTER TABLE community_posts ADD COLUMN IF NOT EXISTS excerpt TEXT',
+        'ALTER TABLE community_posts ADD COLUMN IF NOT EXISTS word_count INTEGER',
+        'ALTER TABLE community_posts ADD COLUMN IF NOT EXISTS reading_minutes INTEGER',
+    ],
+}
+
+
+# Tables retention.py moves into message_archive: kind -> (table, time column), and the
+# archived fields (time column last, so it gives each blob's first/last timestamps)
+ARCHIVED_TABLES = {'messages': ('messages', 'timestamp'), 'insights': ('insights', 'detected_at')}
+ARCHIVED_FIELDS = {'messages': 'role, content, timestamp', 'insights': 'pattern_type, description, detected_at'}
+
+
+# ===== BACKENDS =====
+
+class SQLiteBackend:
+    """The local SQLite database; per-user tables follow db.get_user_db() sharding"""
+    name = 'sqlite'
+    # The FTS5 indexes are created by init_db() and MessageRepository.create_search_index()
+    full_text_search = search.FTS5
+
+    def connect(self):
+        return get_db()
+
+    def connect_user(self, user_id):
+        return get_user_db(user_id)
+
+    def connect_user_stores(self):
+        """A connection to every database holding per-user tables (one per shard)"""
+        return all_user_dbs()
+
+    def insert(self, cursor, sql, params):
+        cursor.execute(sql, params)
+        return cursor.lastrowid
+
+
+class ServerCursor:
+    """Translates ? placeholders and returns timestamps as text, like sqlite3 does"""
+
+    def __init__(self, cursor, paramstyle):
+        self.cursor = cursor
+        self.paramstyle = paramstyle
+
+    def execute(self, sql, params=()):
+        if self.paramstyle == 'format':
+            sql = sql.replace('%', '%%').replace('?', '%s')
+        self.cursor.execute(sql, tuple(params))
+        return self
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        return _text_row(row) if row is not None else None
+
+    def fetchall(self):
+        return [_text_row(row) for row in self.cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+
+def _text_row(row):
+    return tuple(value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+                 for value in row)
+
+
+class ServerConnection:
+    """A pooled connection with the sqlite3-style surface routes and repositories use"""
+
+    def __init__(self, pool, paramstyle):
+        self.pool = pool
+        self.paramstyle = paramstyle
+        self.connection = pool.getconn()
+
+    def cursor(self):
+        return ServerCursor(self.connection.cursor(), self.paramstyle)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.rollback()
+            self.pool.putconn(self.connection)
+            self.connection = None
+
+
+class ServerBackend:
+    """A pooled client/server database (PostgreSQL, or the in-memory stand-in)"""
+
+    def __init__(self, name, pool, paramstyle, **types):
+        self.name = name
+        self.pool = pool
+        self.paramstyle = paramstyle
+        # The in-memory stand-in is SQLite, so it gets the same FTS5 index; PostgreSQL doesn't
+        self.full_text_search = name == 'memory' and search.FTS5
+        self.create_schema(types)
+
+    def connect(self):
+        return ServerConnection(self.pool, self.paramstyle)
+
+    def connect_user(self, user_id):
+        return self.connect()
+
+    def connect_user_stores(self):
+        return [self.connect()]
+
+    def insert(self, cursor, sql, params):
+        cursor.execute(sql + ' RETURNING id', params)
+        return cursor.fetchone()[0]
+
+    def create_schema(self, types):
+        conn = self.connect()
+        c = conn.cursor()
+        for statement in SERVER_SCHEMA:
+            c.execute(statement.format(**types))
+        for statement in SERVER_MIGRATIONS.get(self.name, []):
+            c.execute(statement)
+        if self.full_text_search:
+            for statement in search.COMMUNITY_SCHEMA + [search.USER_SCHEMA]:
+                c.execute(statement)
+        conn.commit()
+        conn.close()
+
+
+class MemoryPool:
+    """getconn/putconn over one shared-cache in-memory SQLite database"""
+
+    def __init__(self, size=POOL_MAX):
+        self.uri = f"file:healing_guru_storage_{os.getpid()}_{id(self)}?mode=memory&cache=shared"
+        self.idle = queue.LifoQueue()
+        self.size = size
+        # The database lives only while a connection is open, so keep one for the pool's lifetime
+        self.keepalive = self._open()
+
+    def _open(self):
+        return sqlite3.connect(self.uri, uri=True, check_same_thread=False, timeout=5.0)
+
+    def getconn(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self._open()
+
+    def putconn(self, connection):
+        if self.idle.qsize() < self.size:
+            self.idle.put(connection)
+        else:
+            connection.close()
+
+
+def create_backend(name=BACKEND):
+    if name == 'sqlite':
+        return SQLiteBackend()
+    if name == 'postgres':
+        if not DATABASE_URL:
+            raise RuntimeError("STORAGE_BACKEND=postgres needs DATABASE_URL")
+        try:
+            from psycopg2.pool import ThreadedConnectionPool
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=postgres needs the 'psycopg2' package")
+        pool = ThreadedConnectionPool(POOL_MIN, POOL_MAX, DATABASE_URL)
+        return ServerBackend('postgres', pool, 'format', pk='SERIAL PRIMARY KEY', ts='TIMESTAMP', blob='BYTEA')
+    if name == 'memory':
+        return ServerBackend('memory', MemoryPool(), 'qmark', pk='INTEGER PRIMARY KEY AUTOINCREMENT', ts='DATETIME', blob='BLOB')
+    raise RuntimeError(f"Unknown STORAGE_BACKEND {name!r} (expected sqlite, postgres or memory)")
+
+
+# ===== REPOSITORIES =====
+
+class MessageRepository:
+    """Chat messages, detected insights and journal entries (per-user tables)
+
+    Assistant replies are stored in reply_codec's compact form and rendered on read.
+    """
+
+    def __init__(self, backend, codec):
+        self.backend = backend
+        self.codec = codec
+
+    def render(self, role, content):
+        return self.codec.render(content) if role == 'assistant' else content
+
+    def recent(self, user_id, limit=10, rendered=True):
+        """Last turns newest first as (role, content); rendered=False keeps replies in stored form"""
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        c.execute('SELECT role, content FROM messages WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?',
+                  (user_id, limit))
+        rows = c.fetchall()
+        conn.close()
+        if rendered:
+            rows = [(role, self.render(role, content)) for role, content in rows]
+        return rows
+
+    def add(self, user_id, role, content):
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        message_id = self.backend.insert(c, 'INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)',
+                                         (user_id, role, content))
+        if self.backend.full_text_search:
+            search.index_entry(c, 'message', message_id, user_id, message_id, self.render(role, content))
+        conn.commit()
+        conn.close()
+
+    def add_reply(self, user_id, content, pattern=None, description=None):
+        """Store an assistant reply and, if a pattern was detected, its insight - one transaction.
+        Returns the reply's stored (encoded) form."""
+        stored = self.codec.encode(content)
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        message_id = self.backend.insert(c, 'INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)',
+                                         (user_id, 'assistant', stored))
+        if self.backend.full_text_search:
+            # Indexed as the text the user read, not the stored form
+            search.index_entry(c, 'message', message_id, user_id, message_id, content)
+        if pattern:
+            c.execute('INSERT INTO insights (user_id, pattern_type, description) VALUES (?, ?, ?)',
+                      (user_id, pattern, description))
+            self._count_insight(c, user_id, pattern)
+        conn.commit()
+        conn.close()
+        return stored
+
+    def history(self, user_id):
+        """Whole conversation oldest first as (role, content, timestamp), archived turns included"""
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        rows = self._archived(c, user_id, 'messages')
+        c.execute('SELECT role, content, timestamp FROM messages WHERE user_id = ? ORDER BY timestamp',
+                  (user_id,))
+        rows.extend(c.fetchall())
+        conn.close()
+        return [(role, self.render(role, content), timestamp) for role, content, timestamp in rows]
+
+    def insight_summary(self, user_id):
+        """(pattern, count, last_seen) per pattern, most frequent first, from insight_counts
+        (counted live for a user whose insights haven't been counted there yet)"""
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        c.execute('''SELECT pattern_type, count, last_seen FROM insight_counts
+                     WHERE user_id = ? ORDER BY count DESC''', (user_id,))
+        rows = c.fetchall()
+        if not rows:
+            rows = self._count_insights(c, user_id)
+        conn.close()
+        return rows
+
+    def aggregate_insights(self, user_id):
+        """Recount a user's insights into insight_counts from scratch"""
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        patterns = self._write_insight_counts(c, user_id)
+        conn.commit()
+        conn.close()
+        return patterns
+
+    def _write_insight_counts(self, c, user_id):
+        rows = self._count_insights(c, user_id)
+        c.execute('DELETE FROM insight_counts WHERE user_id = ?', (user_id,))
+        for pattern, count, last_seen in rows:
+            c.execute('''INSERT INTO insight_counts (user_id, pattern_type, count, last_seen)
+                         VALUES (?, ?, ?, ?)''', (user_id, pattern, count, last_seen))
+        return len(rows)
+
+    def _count_insight(self, c, user_id, pattern):
+        """Add one new insight to insight_counts, in the caller's transaction. A user with no counts
+        yet (insights from before the table existed) gets a full recount instead."""
+        c.execute('SELECT 1 FROM insight_counts WHERE user_id = ? LIMIT 1', (user_id,))
+        if c.fetchone() is None:
+            self._write_insight_counts(c, user_id)
+            return
+        c.execute('''INSERT INTO insight_counts (user_id, pattern_type, count, last_seen)
+                     VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+                     ON CONFLICT (user_id, pattern_type)
+                     DO UPDATE SET count = insight_counts.count + 1, last_seen = excluded.last_seen''',
+                  (user_id, pattern))
+
+    def _count_insights(self, c, user_id):
+        c.execute('''SELECT pattern_type, COUNT(*) as count, MAX(detected_at) as last_seen
+                     FROM insights WHERE user_id = ?
+                     GROUP BY pattern_type ORDER BY count DESC''',
+                  (user_id,))
+        rows = c.fetchall()
+
+        # Archived insights carry per-pattern counts, so they are merged without unpacking
+        c.execute("SELECT summary FROM message_archive WHERE user_id = ? AND kind = 'insights'", (user_id,))
+        archived = c.fetchall()
+        if not archived:
+            return rows
+
+        merged = {pattern: [count, last_seen] for pattern, count, last_seen in rows}
+        for (summary,) in archived:
+            for pattern, (count, last_seen) in json.loads(summary).items():
+                entry = merged.setdefault(pattern, [0, last_seen])
+                entry[0] += count
+                entry[1] = max(entry[1], last_seen)
+        return sorted(((pattern, count, last_seen) for pattern, (count, last_seen) in merged.items()),
+                      key=lambda row: row[1], reverse=True)
+
+    def stats(self, user_id):
+        """(message count, journal entry count, first message timestamp), archived messages included"""
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        c.execute('SELECT COUNT(*), MIN(timestamp) FROM messages WHERE user_id = ?', (user_id,))
+        message_count, first_activity = c.fetchone()
+        c.execute('''SELECT SUM(row_count), MIN(first_at) FROM message_archive
+                     WHERE user_id = ? AND kind = 'messages' ''', (user_id,))
+        archived_count, archived_first = c.fetchone()
+        c.execute('SELECT COUNT(*) FROM journal WHERE user_id = ?', (user_id,))
+        journal_count = c.fetchone()[0]
+        conn.close()
+        if archived_count:
+            message_count += archived_count
+            first_activity = archived_first
+        return message_count, journal_count, first_activity
+
+    def export(self, user_id):
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        messages = self._archived(c, user_id, 'messages')
+        c.execute('SELECT role, content, timestamp FROM messages WHERE user_id = ? ORDER BY timestamp', (user_id,))
+        messages = [{'role': r[0], 'content': self.render(r[0], r[1]), 'timestamp': r[2]} for r in messages + c.fetchall()]
+        c.execute('SELECT emotion, intensity, content, timestamp FROM journal WHERE user_id = ? ORDER BY timestamp', (user_id,))
+        journal = [{'emotion': r[0], 'intensity': r[1], 'content': r[2], 'timestamp': r[3]} for r in c.fetchall()]
+        insights = self._archived(c, user_id, 'insights')
+        c.execute('SELECT pattern_type, description, detected_at FROM insights WHERE user_id = ? ORDER BY detected_at', (user_id,))
+        insights = [{'pattern': r[0], 'description': r[1], 'detected_at': r[2]} for r in insights + c.fetchall()]
+        conn.close()
+        return {'messages': messages, 'journal': journal, 'insights': insights}
+
+    def delete_user(self, user_id):
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        c.execute('DELETE FROM messages WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM journal WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM insights WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM message_archive WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM insight_counts WHERE user_id = ?', (user_id,))
+        if self.backend.full_text_search:
+            c.execute('DELETE FROM user_search WHERE rowid IN (SELECT rowid FROM user_search WHERE user_search MATCH ?)',
+                      (search.user_filter(user_id),))
+        conn.commit()
+        conn.close()
+
+    # ----- private search (see search.py) -----
+
+    def create_search_index(self):
+        """Create user_search in every user store; True if any store did not have it yet"""
+        if not self.backend.full_text_search:
+            return False
+        created = False
+        for conn in self.backend.connect_user_stores():
+            created = search.create_user_index(conn) or created
+            conn.close()
+        return created
+
+    def search(self, user_id, text, kinds=None, page=1, per_page=20):
+        """A user's own messages, journal entries and reflections matching text, best match first,
+        as ([(kind, ref_id, created_at, snippet)], has_more). kind is 'message', 'journal' or
+        'reflection'; ref_id is the message id, journal entry id or module id."""
+        if not self.backend.full_text_search:
+            return self._search_like(user_id, text, kinds, page, per_page)
+        match = search.user_query(user_id, text)
+        if match is None:
+            return [], False
+        query = """SELECT kind, ref_id, created_at, snippet(user_search, 1, ?, ?, '…', ?)
+                   FROM user_search WHERE user_search MATCH ?"""
+        params = [search.MATCH_START, search.MATCH_END, search.SNIPPET_TOKENS, match]
+        if kinds:
+            query += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            params.extend(kinds)
+        query += " ORDER BY rank LIMIT ? OFFSET ?"
+        params += [per_page + 1, (page - 1) * per_page]
+
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        c.execute(query, params)
+        rows = c.fetchall()
+        conn.close()
+        return rows[:per_page], len(rows) > per_page
+
+    def _search_like(self, user_id, text, kinds, page, per_page):
+        """search() without an FTS index: a scan of the user's own messages and journal, newest first.
+        Replies are stored encoded, so only the user's side of the conversation is found."""
+        words = re.findall(r'\w+', text or '')[:12]
+        if not words:
+            return [], False
+        like = ' AND '.join('LOWER(content) LIKE ?' for _ in words)
+        patterns = [f'%{word.lower()}%' for word in words]
+        offset = (page - 1) * per_page
+        parts = []
+        params = []
+        if not kinds or 'message' in kinds:
+            parts.append(f"""SELECT 'message', id, timestamp, substr(content, 1, 200) FROM messages
+                             WHERE user_id = ? AND role = 'user' AND {like}""")
+            params += [user_id] + patterns
+        if not kinds or 'journal' in kinds:
+            parts.append(f"""SELECT 'journal', id, timestamp, substr(content, 1, 200) FROM journal
+                             WHERE user_id = ? AND {like}""")
+            params += [user_id] + patterns
+        if not parts:
+            return [], False
+
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        c.execute(' UNION ALL '.join(parts) + ' ORDER BY 3 DESC LIMIT ? OFFSET ?', params + [per_page + 1, offset])
+        rows = c.fetchall()
+        conn.close()
+        return rows[:per_page], len(rows) > per_page
+
+    def context(self, user_id, message_id, size=2):
+        """The message and up to `size` turns either side of it, oldest first, as (id, role, content, timestamp)"""
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        c.execute('''SELECT id, role, content, timestamp FROM messages
+                     WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?''', (user_id, message_id, size))
+        before = c.fetchall()
+        c.execute('''SELECT id, role, content, timestamp FROM messages
+                     WHERE user_id = ? AND id >= ? ORDER BY id LIMIT ?''', (user_id, message_id, size + 1))
+        after = c.fetchall()
+        conn.close()
+        return [(row_id, role, self.render(role, content), timestamp)
+                for row_id, role, content, timestamp in before[::-1] + after]
+
+    def reindex_search(self, batch_size=500):
+        """Rebuild user_search from messages and journal (the 'search_reindex' job, followed by
+        ProgressRepository.reindex_search() for reflections)"""
+        if not self.backend.full_text_search:
+            return 0
+        indexed = 0
+        for conn in self.backend.connect_user_stores():
+            c = conn.cursor()
+            c.execute('DELETE FROM user_search')
+            for kind, sql in (('message', 'SELECT id, user_id, role, content, timestamp FROM messages'),
+                              ('journal', "SELECT id, user_id, 'user', content, timestamp FROM journal")):
+                last_id = 0
+                while True:
+                    c.execute(f'{sql} WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size))
+                    rows = c.fetchall()
+                    if not rows:
+                        break
+                    for row_id, user_id, role, content, timestamp in rows:
+                        search.index_entry(c, kind, row_id, user_id, row_id, self.render(role, content), timestamp)
+                    conn.commit()
+                    indexed += len(rows)
+                    last_id = rows[-1][0]
+            conn.commit()
+            conn.close()
+        return indexed
+
+    # ----- archive (written by retention.py) -----
+
+    def _archived(self, c, user_id, kind):
+        """Unpack a user's archived rows of one kind, oldest first"""
+        c.execute('''SELECT payload FROM message_archive
+                     WHERE user_id = ? AND kind = ? ORDER BY first_at, id''', (user_id, kind))
+        rows = []
+        for (payload,) in c.fetchall():
+            rows.extend(tuple(row) for row in json.loads(zlib.decompress(bytes(payload))))
+        return rows
+
+    def users_to_archive(self, cutoff, limit):
+        """Up to `limit` user ids with messages or insights older than cutoff, across every store"""
+        users = []
+        for conn in self.backend.connect_user_stores():
+            c = conn.cursor()
+            for table, column in ARCHIVED_TABLES.values():
+                if len(users) < limit:
+                    c.execute(f'SELECT DISTINCT user_id FROM {table} WHERE {column} < ? LIMIT ?',
+                              (cutoff, limit))
+                    users.extend(row[0] for row in c.fetchall() if row[0] not in users)
+            conn.close()
+        return users[:limit]
+
+    def archive_user(self, user_id, cutoff, max_rows):
+        """Move up to max_rows of each kind older than cutoff into one compressed blob; returns rows moved"""
+        conn = self.backend.connect_user(user_id)
+        c = conn.cursor()
+        moved = 0
+        for kind, (table, column) in ARCHIVED_TABLES.items():
+            c.execute(f'''SELECT id, {ARCHIVED_FIELDS[kind]} FROM {table}
+                          WHERE user_id = ? AND {column} < ?
+                          ORDER BY {column}, id LIMIT ?''', (user_id, cutoff, max_rows))
+            rows = c.fetchall()
+            if not rows:
+                continue
+
+            summary = None
+            if kind == 'insights':
+                counts = {}
+                for _, pattern, _, detected_at in rows:
+                    entry = counts.setdefault(pattern, [0, detected_at])
+                    entry[0] += 1
+                    entry[1] = max(entry[1], detected_at)
+                summary = json.dumps(counts)
+
+            payload = zlib.compress(json.dumps([row[1:] for row in rows]).encode('utf-8'))
+            c.execute('''INSERT INTO message_archive (user_id, kind, first_at, last_at, row_count, summary, payload)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                      (user_id, kind, rows[0][-1], rows[-1][-1], len(rows), summary, payload))
+            ids = [row[0] for row in rows]
+            c.execute(f'DELETE FROM {table} WHERE id IN ({", ".join("?" for _ in ids)})', ids)
+            if kind == 'messages' and self.backend.full_text_search:
+                # Archived turns have no context to show, so they leave the search index too
+                rowids = [search.entry_rowid('message', id_) for id_ in ids]
+                c.execute(f'DELETE FROM user_search WHERE rowid IN ({", ".join("?" for _ in rowids)})', rowids)
+            moved += len(rows)
+        conn.commit()
+        conn.close()
+        return moved
+
+
+class ProgressRepository:
+    """Module progress and reflections (module/path ids refer to the SQLite catalog)
+
+    There is one row per (user_id, module_id), so start() and complete() are single upserts.
+    start() is the only write a module page view makes. With PROGRESS_FLUSH_SECONDS set it
+    is buffered, and a background thread writes the buffer in one transaction per batch.
+    The reads here include buffered marks. Completions are always written straight away.
+    """
+
+    def __init__(self, backend, flush_seconds=PROGRESS_FLUSH_SECONDS):
+        self.backend = backend
+        self.flush_seconds = flush_seconds
+        self.pending = {}   # (user_id, module_id) -> path_id: started marks not written yet
+        self.lock = threading.Lock()
+        # Held from taking the buffer until it is written, so delete_user() can't slip in between
+        self.flush_lock = threading.Lock()
+        self.writer = None
+
+    def for_path(self, user_id, path_id):
+        """{module_id: completed_at} for one path"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''SELECT module_id, completed_at FROM user_progress
+                     WHERE user_id = ? AND path_id = ?''', (user_id, path_id))
+        progress = {row[0]: row[1] for row in c.fetchall()}
+        conn.close()
+        with self.lock:
+            for (pending_user, module_id), pending_path in self.pending.items():
+                if pending_user == user_id and pending_path == path_id:
+                    progress.setdefault(module_id, None)
+        return progress
+
+    def get(self, user_id, module_id):
+        """(reflection_response, completed_at) or None if the module was never opened"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''SELECT reflection_response, completed_at FROM user_progress
+                     WHERE user_id = ? AND module_id = ?''', (user_id, module_id))
+        row = c.fetchone()
+        conn.close()
+        if row is None and (user_id, module_id) in self.pending:
+            return (None, None)
+        return row
+
+    def start(self, user_id, path_id, module_id):
+        """Mark a module started; nothing changes if it already was"""
+        if self.flush_seconds <= 0:
+            self._write_starts([(user_id, path_id, module_id)])
+            return
+        with self.lock:
+            self.pending[(user_id, module_id)] = path_id
+            full = len(self.pending) >= PROGRESS_FLUSH_BATCH
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._run_writer, name='progress-writer', daemon=True)
+                self.writer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write buffered started marks in one transaction; returns how many"""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return 0
+            try:
+                self._write_starts([(user_id, path_id, module_id)
+                                    for (user_id, module_id), path_id in pending.items()])
+            except Exception:
+                with self.lock:
+                    for key, path_id in pending.items():
+                        self.pending.setdefault(key, path_id)
+                raise
+            return len(pending)
+
+    def _write_starts(self, rows):
+        conn = self.backend.connect()
+        c = conn.cursor()
+        for row in rows:
+            c.execute('''INSERT INTO user_progress (user_id, path_id, module_id) VALUES (?, ?, ?)
+                         ON CONFLICT (user_id, module_id) DO NOTHING''', row)
+        conn.commit()
+        conn.close()
+
+    def _run_writer(self):
+        atexit.register(self.flush)
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception:
+                import app_logging
+                app_logging.get_logger('healing_guru.storage').exception("progress flush failed")
+
+    def complete(self, user_id, path_id, module_id, reflection):
+        """Mark a module completed with its reflection (started too, if it wasn't)"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''INSERT INTO user_progress (user_id, path_id, module_id, completed_at, reflection_response)
+                     VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)
+                     ON CONFLICT (user_id, module_id) DO UPDATE
+                     SET completed_at = excluded.completed_at, reflection_response = excluded.reflection_response''',
+                  (user_id, path_id, module_id, reflection))
+        c.execute('SELECT id FROM user_progress WHERE user_id = ? AND module_id = ?', (user_id, module_id))
+        progress_id = c.fetchone()[0]
+        conn.commit()
+        conn.close()
+        with self.lock:
+            self.pending.pop((user_id, module_id), None)
+        self._index_reflection(progress_id, user_id, module_id, reflection)
+
+    def _index_reflection(self, progress_id, user_id, module_id, reflection, completed_at=None):
+        """Reflections are searched with the user's messages, so they are indexed in the user's store"""
+        if not self.backend.full_text_search:
+            return
+        conn = self.backend.connect_user(user_id)
+        search.index_entry(conn.cursor(), 'reflection', progress_id, user_id, module_id, reflection, completed_at)
+        conn.commit()
+        conn.close()
+
+    def reindex_search(self):
+        """Index every reflection (after MessageRepository.reindex_search() has cleared the index)"""
+        if not self.backend.full_text_search:
+            return 0
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute("""SELECT id, user_id, module_id, reflection_response, completed_at FROM user_progress
+                     WHERE reflection_response IS NOT NULL AND reflection_response != ''""")
+        rows = c.fetchall()
+        conn.close()
+        for row in rows:
+            self._index_reflection(*row)
+        return len(rows)
+
+    def for_user(self, user_id):
+        """Every progress row as (path_id, module_id, started_at, completed_at, reflection), oldest first"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''SELECT path_id, module_id, started_at, completed_at, reflection_response
+                     FROM user_progress WHERE user_id = ? ORDER BY started_at''', (user_id,))
+        rows = c.fetchall()
+        conn.close()
+        with self.lock:
+            written = {row[1] for row in rows}
+            rows.extend((path_id, module_id, None, None, None)
+                        for (pending_user, module_id), path_id in self.pending.items()
+                        if pending_user == user_id and module_id not in written)
+        return rows
+
+    def delete_user(self, user_id):
+        # After any flush in flight, or that flush would write the user's marks back
+        with self.flush_lock:
+            with self.lock:
+                self.pending = {key: path_id for key, path_id in self.pending.items() if key[0] != user_id}
+            conn = self.backend.connect()
+            conn.cursor().execute('DELETE FROM user_progress WHERE user_id = ?', (user_id,))
+            conn.commit()
+            conn.close()
+
+
+def post_summary(content):
+    """(excerpt, word count, reading minutes) for a post body, stored with the post when it is created"""
+    words = content.split()
+    excerpt = ' '.join(words)
+    if len(excerpt) > EXCERPT_CHARS:
+        excerpt = excerpt[:EXCERPT_CHARS].rsplit(' ', 1)[0].rstrip('.,;:!?-') + '…'
+    return excerpt, len(words), max(1, round(len(words) / READING_WORDS_PER_MINUTE))
+
+
+class CommunityRepository:
+    """Community posts and comments
+
+    Listings (feed, search) select a card projection - the stored excerpt, never the body -
+    so their cost doesn't grow with post length; get_post() loads the full content.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def feed(self, path_slug=None, category=None, limit=50):
+        """Newest posts as (id, display_name, path_slug, category, title, excerpt, created_at,
+        comment_count, reading_minutes)"""
+        query = """SELECT cp.id, cp.display_name, cp.path_slug, cp.category, cp.title,
+                          cp.excerpt, cp.created_at,
+                          (SELECT COUNT(*) FROM community_comments WHERE post_id = cp.id) as comment_count,
+                          cp.reading_minutes
+                   FROM community_posts cp
+                   WHERE 1=1"""
+        params = []
+        if path_slug:
+            query += " AND cp.path_slug = ?"
+            params.append(path_slug)
+        if category:
+            query += " AND cp.category = ?"
+            params.append(category)
+        query += " ORDER BY cp.created_at DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute(query, params)
+        rows = c.fetchall()
+        conn.close()
+        return rows
+
+    def search(self, text, path_slug=None, category=None, page=1, per_page=20):
+        """Posts matching text, best match first, as ([(id, display_name, path_slug, category, title,
+        snippet, created_at, comment_count, reading_minutes)], has_more). Matches in the snippet are wrapped in
+        search.MATCH_START/MATCH_END; render it with search.highlight()."""
+        if not self.backend.full_text_search:
+            return self._search_like(text, path_slug, category, page, per_page)
+        match = search.fts_query(text)
+        if match is None:
+            return [], False
+        weights = ', '.join(str(weight) for weight in search.COMMUNITY_WEIGHTS)
+        query = """SELECT cp.id, cp.display_name, cp.path_slug, cp.category, cp.title,
+                          snippet(community_search, -1, ?, ?, '…', ?), cp.created_at,
+                          (SELECT COUNT(*) FROM community_comments WHERE post_id = cp.id) as comment_count,
+                          cp.reading_minutes
+                   FROM community_search
+                   JOIN community_posts cp ON cp.id = community_search.rowid
+                   WHERE community_search MATCH ?"""
+        params = [search.MATCH_START, search.MATCH_END, search.SNIPPET_TOKENS, match]
+        if path_slug:
+            query += " AND cp.path_slug = ?"
+            params.append(path_slug)
+        if category:
+            query += " AND cp.category = ?"
+            params.append(category)
+        # One extra row tells whether there is a next page without counting every match
+        query += f" ORDER BY bm25(community_search, {weights}) LIMIT ? OFFSET ?"
+        params += [per_page + 1, (page - 1) * per_page]
+
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute(query, params)
+        rows = c.fetchall()
+        conn.close()
+        return rows[:per_page], len(rows) > per_page
+
+    def _search_like(self, text, path_slug, category, page, per_page):
+        """search() without an FTS index: a scan, newest first, with the excerpt as snippet"""
+        words = re.findall(r'\w+', text or '')[:12]
+        if not words:
+            return [], False
+        query = """SELECT cp.id, cp.display_name, cp.path_slug, cp.category, cp.title,
+                          cp.excerpt, cp.created_at,
+                          (SELECT COUNT(*) FROM community_comments WHERE post_id = cp.id) as comment_count,
+                          cp.reading_minutes
+                   FROM community_posts cp
+                   WHERE 1=1"""
+        params = []
+        for word in words:
+            query += " AND (LOWER(cp.title) LIKE ? OR LOWER(cp.content) LIKE ?)"
+            params += [f'%{word.lower()}%'] * 2
+        if path_slug:
+            query += " AND cp.path_slug = ?"
+            params.append(path_slug)
+        if category:
+            query += " AND cp.category = ?"
+            params.append(category)
+        query += " ORDER BY cp.created_at DESC LIMIT ? OFFSET ?"
+        params += [per_page + 1, (page - 1) * per_page]
+
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute(query, params)
+        rows = c.fetchall()
+        conn.close()
+        return rows[:per_page], len(rows) > per_page
+
+    def get_post(self, post_id):
+        """(id, display_name, path_slug, category, title, content, created_at) or None"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''SELECT id, display_name, path_slug, category, title, content, created_at
+                     FROM community_posts WHERE id = ?''', (post_id,))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    def comments(self, post_id):
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''SELECT id, display_name, content, created_at
+                     FROM community_comments
+                     WHERE post_id = ?
+                     ORDER BY created_at ASC''', (post_id,))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+
+    def create_post(self, user_id, display_name, path_slug, category, title, content):
+        excerpt, word_count, reading_minutes = post_summary(content)
+        conn = self.backend.connect()
+        post_id = self.backend.insert(conn.cursor(),
+                                      '''INSERT INTO community_posts
+                                         (user_id, display_name, path_slug, category, title, content,
+                                          excerpt, word_count, reading_minutes)
+                                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                                      (user_id, display_name, path_slug, category, title, content,
+                                       excerpt, word_count, reading_minutes))
+        conn.commit()
+        conn.close()
+        return post_id
+
+    def backfill_summaries(self, batch_size=500):
+        """Compute excerpts for posts created before they were stored; returns posts updated"""
+        updated = 0
+        conn = self.backend.connect()
+        c = conn.cursor()
+        while True:
+            c.execute('SELECT id, content FROM community_posts WHERE excerpt IS NULL ORDER BY id LIMIT ?',
+                      (batch_size,))
+            rows = c.fetchall()
+            if not rows:
+                break
+            for post_id, content in rows:
+                c.execute('''UPDATE community_posts SET excerpt = ?, word_count = ?, reading_minutes = ?
+                             WHERE id = ?''', post_summary(content) + (post_id,))
+            conn.commit()
+            updated += len(rows)
+        conn.close()
+        return updated
+
+    def add_comment(self, post_id, user_id, display_name, content):
+        conn = self.backend.connect()
+        conn.cursor().execute('''INSERT INTO community_comments
+                                 (post_id, user_id, display_name, content)
+                                 VALUES (?, ?, ?, ?)''',
+                              (post_id, user_id, display_name, content))
+        conn.commit()
+        conn.close()
+
+    def count_posts(self, user_id):
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('SELECT COUNT(*) FROM community_posts WHERE user_id = ?', (user_id,))
+        count = c.fetchone()[0]
+        conn.close()
+        return count
+
+    def export(self, user_id):
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('SELECT title, content, category, path_slug, created_at FROM community_posts WHERE user_id = ? ORDER BY created_at', (user_id,))
+        posts = [{'title': r[0], 'content': r[1], 'category': r[2], 'path': r[3], 'created_at': r[4]} for r in c.fetchall()]
+        c.execute('SELECT content, post_id, created_at FROM community_comments WHERE user_id = ? ORDER BY created_at', (user_id,))
+        comments = [{'content': r[0], 'post_id': r[1], 'created_at': r[2]} for r in c.fetchall()]
+        conn.close()
+        return {'community_posts': posts, 'community_comments': comments}
+
+    def delete_user(self, user_id):
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('DELETE FROM community_posts WHERE user_id = ?', (user_id,))
+        c.execute('DELETE FROM community_comments WHERE user_id = ?', (user_id,))
+        conn.commit()
+        conn.close()
+
+
+class SubscriptionRepository:
+    """Premium subscriptions and Gumroad purchases waiting to be linked to a session
+
+    get() is served from an entitlement cache of SUBSCRIPTION_CACHE_SECONDS that every
+    write here invalidates, so paywall checks don't query on every page. Writes made by
+    another process (a separate job worker) show up once the entry expires.
+    """
+
+    def __init__(self, backend, cache_seconds=SUBSCRIPTION_CACHE_SECONDS):
+        self.backend = backend
+        self.cache_seconds = cache_seconds
+        self.cache = {}   # user_id -> (row, expires at)
+
+    def get(self, user_id):
+        """(subscription_status, expires_at, started_at) or None"""
+        entry = self.cache.get(user_id)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''SELECT subscription_status, expires_at, started_at FROM subscriptions
+                     WHERE user_id = ?''', (user_id,))
+        row = c.fetchone()
+        conn.close()
+        if self.cache_seconds > 0:
+            if len(self.cache) >= SUBSCRIPTION_CACHE_SIZE:
+                self.cache.clear()
+            self.cache[user_id] = (row, time.monotonic() + self.cache_seconds)
+        return row
+
+    def invalidate(self, user_id):
+        self.cache.pop(user_id, None)
+
+    def set_status(self, user_id, status, expires_at=None):
+        conn = self.backend.connect()
+        if expires_at is None:
+            conn.cursor().execute('UPDATE subscriptions SET subscription_status = ? WHERE user_id = ?',
+                                  (status, user_id))
+        else:
+            conn.cursor().execute('UPDATE subscriptions SET subscription_status = ?, expires_at = ? WHERE user_id = ?',
+                                  (status, expires_at, user_id))
+        conn.commit()
+        conn.close()
+        self.invalidate(user_id)
+
+    def activate(self, user_id, license_key, status='active', expires_at=None):
+        """Create or replace the user's subscription"""
+        conn = self.backend.connect()
+        conn.cursor().execute('''INSERT INTO subscriptions
+                                 (user_id, gumroad_license_key, subscription_status, expires_at, started_at)
+                                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                                 ON CONFLICT(user_id) DO UPDATE SET
+                                 gumroad_license_key = excluded.gumroad_license_key,
+                                 subscription_status = excluded.subscription_status,
+                                 expires_at = excluded.expires_at,
+                                 started_at = excluded.started_at''',
+                              (user_id, license_key, status, expires_at))
+        conn.commit()
+        conn.close()
+        self.invalidate(user_id)
+
+    def user_for_license(self, license_key):
+        """(user_id, subscription_status) of the subscription holding this key, or None"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('SELECT user_id, subscription_status FROM subscriptions WHERE gumroad_license_key = ?',
+                  (license_key,))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    def add_pending(self, license_key, email, status, expires_at):
+        conn = self.backend.connect()
+        conn.cursor().execute('''INSERT INTO pending_subscriptions
+                                 (license_key, email, subscription_status, expires_at)
+                                 VALUES (?, ?, ?, ?)
+                                 ON CONFLICT(license_key) DO UPDATE SET
+                                 email = excluded.email,
+                                 subscription_status = excluded.subscription_status,
+                                 expires_at = excluded.expires_at''',
+                              (license_key, email, status, expires_at))
+        conn.commit()
+        conn.close()
+
+    def claim_pending(self, user_id, license_key):
+        """Move a pending purchase onto this user; returns (status, expires_at) or None"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('''SELECT subscription_status, expires_at FROM pending_subscriptions
+                     WHERE license_key = ?''', (license_key,))
+        pending = c.fetchone()
+        if pending:
+            status, expires_at = pending
+            c.execute('''INSERT INTO subscriptions
+                         (user_id, gumroad_license_key, subscription_status, expires_at, started_at)
+                         VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                         ON CONFLICT(user_id) DO UPDATE SET
+                         gumroad_license_key = excluded.gumroad_license_key,
+                         subscription_status = excluded.subscription_status,
+                         expires_at = excluded.expires_at,
+                         started_at = excluded.started_at''',
+                      (user_id, license_key, status, expires_at))
+            c.execute('DELETE FROM pending_subscriptions WHERE license_key = ?', (license_key,))
+            conn.commit()
+            self.invalidate(user_id)
+        conn.close()
+        return pending
+
+    def delete_user(self, user_id):
+        conn = self.backend.connect()
+        conn.cursor().execute('DELETE FROM subscriptions WHERE user_id = ?', (user_id,))
+        conn.commit()
+        conn.close()
+        self.invalidate(user_id)
+
+
+class ConsentRepository:
+    """GDPR consent records"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, user_id):
+        """(cookies_accepted, data_processing_accepted, consent_date) or None"""
+        conn = self.backend.connect()
+        c = conn.cursor()
+        c.execute('SELECT cookies_accepted, data_processing_accepted, consent_date FROM user_consent WHERE user_id = ?',
+                  (user_id,))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    def record(self, user_id, cookies, processing, ip_address):
+        conn = self.backend.connect()
+        conn.cursor().execute('''INSERT INTO user_consent
+                                 (user_id, cookies_accepted, data_processing_accepted, ip_address, last_updated)
+                                 VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                                 ON CONFLICT(user_id) DO UPDATE SET
+                                 cookies_accepted = excluded.cookies_accepted,
+                                 data_processing_accepted = excluded.data_processing_accepted,
+                                 last_updated = CURRENT_TIMESTAMP''',
+                              (user_id, cookies, processing, ip_address))
+        conn.commit()
+        conn.close()
+
+    def update(self, user_id, consent_type, value):
+        """Change one preference ('cookies' or 'processing')"""
+        column = {'cookies': 'cookies_accepted', 'processing': 'data_processing_accepted'}.get(consent_type)
+        if not column:
+            return
+        conn = self.backend.connect()
+        conn.cursor().execute(f'UPDATE user_consent SET {column} = ?, last_updated = CURRENT_TIMESTAMP WHERE user_id = ?',
+                              (value, user_id))
+        conn.commit()
+        conn.close()
+
+    def delete_user(self, user_id):
+        conn = self.backend.connect()
+        conn.cursor().execute('DELETE FROM user_consent WHERE user_id = ?', (user_id,))
+        conn.commit()
+        conn.close()
+
+
+class Storage:
+    """All repositories over one backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.replies = ReplyCodec(backend)
+        self.messages = MessageRepository(backend, self.replies)
+        self.progress = ProgressRepository(backend)
+        self.community = CommunityRepository(backend)
+        self.subscriptions = SubscriptionRepository(backend)
+        self.consent = ConsentRepository(backend)
+
+
+def create_storage(name=BACKEND):
+    return Storage(create_backend(name))
@@ -0,0 +1,206 @@
+// Service worker for the Healing Guru PWA - generated by assets.py (served at /sw.js)
+const VERSION = {{ version|tojson }};
+const PRECACHE = 'healing-guru-precache-' + VERSION;
+const RUNTIME = 'healing-guru-runtime-' + VERSION;
+const PRECACHE_URLS = {{ precache_urls|tojson }};
+
+// Public pages kept for offline use (network first, cached copy when offline)
+const PAGES = ['/', '/chat', '/privacy', '/terms'];
+// Path overviews are shown from cache straight away and refreshed in the background
+const PATH_OVERVIEW = /^\/path\/[^/]+\/?$/;
+// Per-user data and anything that changes state is never cached
+const NEVER_CACHE = /^\/(api|account|progress|consent|verify-license|webhook|debug|metrics)(\/|$)/;
+
+const OUTBOX_DB = 'healing-guru-outbox';
+const OUTBOX_SYNC_TAG = 'chat-outbox';
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    caches.open(PRECACHE)
+      .then(cache => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  // Drop every cache from older versions (and from the workers this one replaces)
+  event.waitUntil(
+    caches.keys()
+      .then(names => Promise.all(
+        names.filter(name => name !== PRECACHE && name !== RUNTIME).map(name => caches.delete(name))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+
+  if (request.method === 'POST' && url.pathname === '/api/chat') {
+    event.respondWith(sendOrQueueChat(request));
+    return;
+  }
+  if (request.method !== 'GET' || NEVER_CACHE.test(url.pathname)) {
+    return;
+  }
+
+  if (url.pathname.startsWith('/assets/') || PRECACHE_URLS.includes(url.pathname)) {
+    event.respondWith(cacheFirst(request));
+  } else if (PATH_OVERVIEW.test(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(request, event));
+  } else if (PAGES.includes(url.pathname)) {
+    event.respondWith(networkFirst(request));
+  }
+});
+
+async function cacheFirst(request) {
+  const cached = await caches.match(request);
+  if (cached) {
+    return cached;
+  }
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(RUNTIME);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+async function staleWhileRevalidate(request, event) {
+  const cache = await caches.open(RUNTIME);
+  const cached = await cache.match(request);
+  const refresh = fetch(request)
+    .then(response => {
+      if (response.ok) {
+        cache.put(request, response.clone());
+      }
+      return response;
+    });
+  if (cached) {
+    event.waitUntil(refresh.catch(() => null));
+    return cached;
+  }
+  return refresh;
+}
+
+async function networkFirst(request) {
+  const cache = await caches.open(RUNTIME);
+  try {
+    const response = await fetch(request);
+    if (response.ok) {
+      cache.put(request, response.clone());
+    }
+    return response;
+  } catch (error) {
+    const cached = await cache.match(request);
+    return cached || new Response('Offline - Please check your connection', {
+      status: 503,
+      headers: { 'Content-Type': 'text/plain' }
+    });
+  }
+}
+
+// ===== Offline chat: queue the message, send it when the connection is back =====
+
+async function sendOrQueueChat(request) {
+  const body = await request.clone().text();
+  try {
+    return await fetch(request);
+  } catch (error) {
+    await outboxAdd(body);
+    if (self.registration.sync) {
+      await self.registration.sync.register(OUTBOX_SYNC_TAG);
+    }
+    return new Response(JSON.stringify({
+      queued: true,
+      message: "You're offline right now. I'll send your message as soon as you're back online.",
+      pattern: null,
+      emotion: null
+    }), { status: 202, headers: { 'Content-Type': 'application/json' } });
+  }
+}
+
+self.addEventListener('sync', event => {
+  if (event.tag === OUTBOX_SYNC_TAG) {
+    event.waitUntil(flushOutbox());
+  }
+});
+
+// Browsers without Background Sync ask for a flush when they come back online
+self.addEventListener('message', event => {
+  if (event.data && event.data.type === 'flush-outbox') {
+    event.waitUntil(flushOutbox());
+  } else if (event.data && event.data.type === 'SKIP_WAITING') {
+    self.skipWaiting();
+  }
+});
+
+// One flush at a time: a sync event and an online message arriving together must not both
+// send the same queued entries
+let flushing = null;
+
+function flushOutbox() {
+  if (!flushing) {
+    flushing = sendOutbox().finally(() => { flushing = null; });
+  }
+  return flushing;
+}
+
+async function sendOutbox() {
+  for (const entry of await outboxAll()) {
+    // Throws while still offline, which leaves the rest queued and makes the sync retry
+    const response = await fetch('/api/chat', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'same-origin',
+      body: entry.body
+    });
+    if (!response.ok) {
+      // Rate limited (429) or a server error: keep this entry and the rest queued, in order
+      throw new Error(`Outbox replay failed with ${response.status}`);
+    }
+    const reply = await response.json();
+    await outboxDelete(entry.id);
+    const clients = await self.clients.matchAll({ type: 'window' });
+    clients.forEach(client => client.postMessage({
+      type: 'chat-replayed',
+      message: JSON.parse(entry.body).message,
+      reply
+    }));
+  }
+}
+
+function outboxOpen() {
+  return new Promise((resolve, reject) => {
+    const open = indexedDB.open(OUTBOX_DB, 1);
+    open.onupgradeneeded = () => open.result.createObjectStore('messages', { keyPath: 'id', autoIncrement: true });
+    open.onsuccess = () => resolve(open.result);
+    open.onerror = () => reject(open.error);
+  });
+}
+
+async function outboxTransaction(mode, run) {
+  const db = await outboxOpen();
+  return new Promise((resolve, reject) => {
+    const transaction = db.transaction('messages', mode);
+    const result = run(transaction.objectStore('messages'));
+    transaction.oncomplete = () => resolve(result.result);
+    transaction.onerror = () => reject(transaction.error);
+  });
+}
+
+function outboxAdd(body) {
+  return outboxTransaction('readwrite', store => store.add({ body, queuedAt: Date.now() }));
+}
+
+function outboxAll() {
+  return outboxTransaction('readonly', store => store.getAll());
+}
+
+function outboxDelete(id) {
+  return outboxTransaction('readwrite', store => store.delete(id));
+}
@@ -4,9 +4,15 @@ Healing Guru Test Bot
 Automatically tests the app with various scenarios and reports issues
 """
 
+import argparse
 import requests
 import json
+import os
+import random
+import tempfile
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
 # Test against Railway deployment
@@ -14,6 +20,50 @@ APP_URL = "https://valiant-growth-production-3977.up.railway.app"
 # Or test locally:
 # APP_URL = "http://localhost:5002"
 
+# Scenario table shared by the HTTP, in-process and load runners (and bench_ai.py)
+SCENARIOS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_scenarios.json')
+
+
+def load_scenarios(path=SCENARIOS_FILE):
+    """Load the scenario table: section, category, message and optional expectations"""
+    with open(path) as f:
+        return json.load(f)['scenarios']
+
+
+def check_response(response_text, detected_pattern, expected_patterns=None, should_not_contain=None):
+    """Return the list of issues with a chat response (empty when it passes)"""
+    issues = []
+    
+    if not response_text or len(response_text) < 10:
+        issues.append("Response too short or empty")
+    
+    if expected_patterns and detected_pattern not in expected_patterns:
+        issues.append(f"Expected pattern {expected_patterns}, got {detected_pattern}")
+    
+    if should_not_contain:
+        for phrase in should_not_contain:
+            if phrase.lower() in response_text.lower():
+                issues.append(f"Response should not contain '{phrase}'")
+    
+    return issues
+
+
+def chat_result(status_code, get_json, text):
+    """Normalise an /api/chat reply (HTTP or test client) into a result dict"""
+    if status_code == 200:
+        data = get_json()
+        return {
+            'success': True,
+            'response': data.get('message', ''),  # API returns 'message' not 'response'
+            'pattern': data.get('pattern'),
+            'emotion': data.get('emotion')
+        }
+    return {
+        'success': False,
+        'error': f"HTTP {status_code}: {text}"
+    }
+
+
 class TestBot:
     def __init__(self, base_url):
         self.base_url = base_url
@@ -30,19 +80,8 @@ class TestBot:
                 timeout=30
             )
             
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'success': True,
-                    'response': data.get('message', ''),  # API returns 'message' not 'response'
-                    'pattern': data.get('pattern'),
-                    'emotion': data.get('emotion')
-                }
-            else:
-                return {
-                    'success': False,
-                    'error': f"HTTP {response.status_code}: {response.text}"
-                }
+            return chat_result(response.status_code, response.json if response.status_code == 200 else None,
+                               response.text)
         except Exception as e:
             return {
                 'success': False,
@@ -55,7 +94,10 @@ class TestBot:
         print(f"   Message: '{test_message}'")
         
         result = self.send_message(test_message)
-        
+        return self.record_result(category, test_message, result, expected_patterns, should_not_contain)
+    
+    def record_result(self, category, test_message, result, expected_patterns=None, should_not_contain=None):
+        """Check a chat result against the scenario's expectations and record it"""
         if not result['success']:
             error = f"❌ FAIL: {category} - {result['error']}"
             print(error)
@@ -72,18 +114,7 @@ class TestBot:
         detected_pattern = result.get('pattern')
         
         # Check if response is appropriate
-        issues = []
-        
-        if not response_text or len(response_text) < 10:
-            issues.append("Response too short or empty")
-        
-        if expected_patterns and detected_pattern not in expected_patterns:
-            issues.append(f"Expected pattern {expected_patterns}, got {detected_pattern}")
-        
-        if should_not_contain:
-            for phrase in should_not_contain:
-                if phrase.lower() in response_text.lower():
-                    issues.append(f"Response should not contain '{phrase}'")
+        issues = check_response(response_text, detected_pattern, expected_patterns, should_not_contain)
         
         if issues:
             error = f"❌ FAIL: {category}\n   Issues: {', '.join(issues)}\n   Response: {response_text[:100]}..."
@@ -110,223 +141,26 @@ class TestBot:
             })
             return True
     
-    def run_all_tests(self):
+    def run_all_tests(self, scenarios=None):
         """Run comprehensive test suite"""
         print("\n" + "="*70)
         print("🤖 HEALING GURU TEST BOT - Starting Tests")
         print("="*70)
         
-        # Test 1: Greetings
-        print("\n📋 CATEGORY: Greetings")
-        self.test_scenario("Simple greeting", "Hi")
-        self.test_scenario("Friendly greeting", "Hey friend, how are you?")
-        
-        # Test 2: Neutral sharing
-        print("\n📋 CATEGORY: Neutral Sharing")
-        self.test_scenario("Want to share", "I wanted to share something with you", 
-                          should_not_contain=["difficult", "challenging", "struggle"])
-        self.test_scenario("Have news", "I have some news")
-        
-        # Test 3: False positive detection
-        print("\n📋 CATEGORY: Negation Detection (No False Positives)")
-        self.test_scenario("Not doing good", "I'm not doing too good",
-                          should_not_contain=["love that you're", "celebrate", "wonderful"])
-        self.test_scenario("Not feeling great", "I'm not feeling great today")
-        
-        # Test 4: Work - Stressed
-        print("\n📋 CATEGORY: Work Stress")
-        self.test_scenario("Boss was mean", "My boss was mean and I had too much to do",
-                          expected_patterns=['life_topic_work'])
-        self.test_scenario("Overwhelmed at work", "Feeling overwhelmed by my workload",
-                          expected_patterns=['life_topic_work'])
-        self.test_scenario("Don't want to go", "I don't want to go back to work tomorrow")
-        self.test_scenario("Feeling undervalued", "I've put in so much effort but no one seems to notice at work")
-        self.test_scenario("Conflict with colleague", "I had a tense exchange with a colleague and keep replaying it")
-        self.test_scenario("Afraid of losing job", "I'm sensing instability at the company and feel nervous")
-        
-        # Test 5: Work - Celebration
-        print("\n📋 CATEGORY: Work Celebration")
-        self.test_scenario("Got praised", "I got praised at work today!",
-                          expected_patterns=['life_topic_work'])
-        self.test_scenario("Finished project", "I finally finished that big project")
-        self.test_scenario("Excited about promotion", "I got promoted! I want to celebrate this moment")
-        
-        # Test 6: Relationships - Stressed
-        print("\n📋 CATEGORY: Relationship Stress")
-        self.test_scenario("Friend upset me", "My friend upset me today",
-                          expected_patterns=['life_topic_relationships'])
-        self.test_scenario("Feel misunderstood", "I don't feel understood at home")
-        self.test_scenario("Feeling left out", "My friends met up without me and it triggered abandonment feelings")
-        self.test_scenario("Healing from fallout", "A close friend said something hurtful and I'm unsure how to rebuild trust")
-        self.test_scenario("Growing apart", "I'm noticing misalignment and grieving the drifting of a friendship")
-        
-        # Test 7: Relationships - Celebration
-        print("\n📋 CATEGORY: Relationship Celebration")
-        self.test_scenario("Lovely day with mum", "I had a lovely day with my mum",
-                          expected_patterns=['life_topic_relationships'])
-        self.test_scenario("Unexpected kindness", "A friend supported me in a moment I didn't ask for")
-        self.test_scenario("Making new friend", "I'm making a new friend and feel excited but unsure")
-        
-        # Test 8: Family scenarios
-        print("\n📋 CATEGORY: Family Dynamics")
-        self.test_scenario("Tension with parent", "I had a disagreement with my dad that brought up old childhood patterns")
-        self.test_scenario("Setting boundaries", "I'm learning to say no to my family but feel guilty")
-        self.test_scenario("Family milestone", "My sister just had a baby and I want to share this joy")
-        self.test_scenario("Caring for elderly parent", "I'm caring for my elderly parent and feel exhausted and guilty")
-        self.test_scenario("Feeling unseen in family", "I'm doing everything right but still feel misunderstood by my family")
-        
-        # Test 9: Romantic relationships
-        print("\n📋 CATEGORY: Romantic Relationships")
-        self.test_scenario("After argument", "I love my partner but feel hurt after our argument")
-        self.test_scenario("New relationship", "I'm in a new relationship and have butterflies mixed with fear")
-        self.test_scenario("Breakup processing", "The relationship ended and I feel empty and confused")
-        self.test_scenario("Feeling neglected", "My partner isn't showing affection and it's affecting my self-worth")
-        self.test_scenario("Celebrating love", "We had a beautiful deep conversation and I want to honor it")
-        
-        # Test 10: Pets
-        print("\n📋 CATEGORY: Pets")
-        self.test_scenario("Dog did something cute", "My dog did something so cute today")
-        self.test_scenario("Cat is sick", "My cat is unwell and I'm scared")
-        self.test_scenario("Pet sick", "My pet is really sick and I feel helpless")
-        self.test_scenario("Pet funny", "My pet did something hilarious")
-        self.test_scenario("Grieving pet", "I'm grieving my pet who passed away")
-        self.test_scenario("Training challenges", "I'm feeling frustrated with training my dog")
-        self.test_scenario("Bonding with new pet", "I'm bonding with my new rescue and it's so sweet")
-        
-        # Test 11: Home
-        print("\n📋 CATEGORY: Home")
-        self.test_scenario("Tidied space", "I finally tidied my space")
-        self.test_scenario("Home feels chaotic", "My home feels really chaotic")
-        self.test_scenario("Overwhelmed with chores", "Laundry, dishes, clutter - everything feels like a mountain")
-        self.test_scenario("Moving homes", "I'm moving and feel stressed, excited, and nostalgic")
-        self.test_scenario("Conflict with neighbor", "I had a conflict with my neighbor over noise")
-        self.test_scenario("Unsafe at home", "I don't feel safe in my home environment")
-        self.test_scenario("Loving home", "I feel so grateful for my home space")
-        
-        # Test 12: Money
-        print("\n📋 CATEGORY: Money")
-        self.test_scenario("Money is tight", "Money is really tight right now")
-        self.test_scenario("Paid something off", "I just paid off my credit card!")
-        self.test_scenario("Unexpected bill", "An unexpected bill arrived and I feel panicked")
-        self.test_scenario("Worried about rent", "I'm worried about making rent this month")
-        self.test_scenario("Big financial decision", "I'm considering a big financial decision and feel confused")
-        self.test_scenario("Unexpected money", "I received unexpected money and feel grateful")
-        
-        # Test 13: Emotional & health
-        print("\n📋 CATEGORY: Health & Emotional Well-being")
-        self.test_scenario("Anxious no reason", "I'm feeling anxious but don't know why")
-        self.test_scenario("Chronic fatigue", "I'm tired of feeling tired all the time")
-        self.test_scenario("Therapy breakthrough", "I had a successful therapy session with breakthroughs")
-        self.test_scenario("Self-worth struggle", "I'm struggling with feeling not enough")
-        self.test_scenario("Personal growth", "I noticed I handled something better than I used to")
-        
-        # Test 14: Emotional states
-        print("\n📋 CATEGORY: Emotional States")
-        self.test_scenario("Feeling anxious", "I'm feeling really anxious")
-        self.test_scenario("Feel hopeless", "I feel completely hopeless")
-        self.test_scenario("Can't cope", "I can't cope anymore")
-        
-        # Test 15: Bullying/harm
-        print("\n📋 CATEGORY: Bullying & Conflict")
-        self.test_scenario("Being bullied", "Someone is bullying me at school")
-        self.test_scenario("I hurt someone", "I hurt someone and I feel guilty")
-        self.test_scenario("I snapped", "I lost control and snapped at them")
-        
-        # Test 16: School & academic
-        print("\n📋 CATEGORY: School & Academic Life")
-        self.test_scenario("Homework overwhelm", "I'm overwhelmed by homework and feel pressure piling up")
-        self.test_scenario("Exam stress", "I'm stressed about exams and afraid of failing")
-        self.test_scenario("Can't focus", "I'm struggling to focus in class")
-        self.test_scenario("Good grade excited", "I got a good grade and want to share this win")
-        self.test_scenario("Teacher conflict", "I had a misunderstanding with my teacher")
-        self.test_scenario("Falling behind", "I'm falling behind in school and feel ashamed to ask for help")
-        self.test_scenario("New school", "I'm starting a new school and feel nervous and hopeful")
-        
-        # Test 17: School social
-        print("\n📋 CATEGORY: School Social Life")
-        self.test_scenario("Excluded group chat", "I saw my friends talking in a group chat without me")
-        self.test_scenario("Rumors spread", "Rumors are being spread about me and I feel hurt")
-        self.test_scenario("Best friend drifting", "My best friend is drifting away and I can't explain why")
-        self.test_scenario("Social anxiety school", "I have social anxiety and overthink everything at school")
-        self.test_scenario("Invited nervous", "I got invited to something but I'm nervous about going")
-        
-        # Test 18: Teen family
-        print("\n📋 CATEGORY: Teen Family Dynamics")
-        self.test_scenario("Arguing with parents", "I'm arguing with my parents and feel unheard")
-        self.test_scenario("Sibling conflict", "My sibling keeps crossing my boundaries")
-        self.test_scenario("Pressure to succeed", "My parents are pushing too hard and I'm burnt out")
-        self.test_scenario("Parents divorce", "My parents are divorcing and I'm trying to make sense of it")
-        self.test_scenario("Invisible at home", "I feel invisible at home, my emotions are dismissed")
-        
-        # Test 19: Teen romantic
-        print("\n📋 CATEGORY: Teen Romantic Life")
-        self.test_scenario("First heartbreak", "I had my first heartbreak and it hurts so much")
-        self.test_scenario("Crush anxiety", "I'm overthinking every interaction with my crush")
-        self.test_scenario("Got ghosted", "They just ghosted me without explanation")
-        self.test_scenario("Pressure not ready", "I feel pressured to do things I'm not ready for")
-        
-        # Test 20: Identity & self-worth
-        print("\n📋 CATEGORY: Identity & Self-Worth")
-        self.test_scenario("Body insecurity", "I feel insecure about my body")
-        self.test_scenario("Not good enough", "I don't feel good enough")
-        self.test_scenario("Questioning identity", "I'm trying to understand who I am")
-        self.test_scenario("Feeling different", "I feel different and don't fit in any boxes")
-        self.test_scenario("Lost disconnected", "Nothing feels exciting, everything feels heavy")
-        
-        # Test 21: Digital life
-        print("\n📋 CATEGORY: Digital Life")
-        self.test_scenario("Online bullying", "Someone left harsh comments online and it really stings")
-        self.test_scenario("Embarrassing post", "I posted something embarrassing and can't stop thinking about it")
-        self.test_scenario("Phone addiction", "I know I scroll too much but can't stop")
-        self.test_scenario("Group chat drama", "There's drama in our group chat with screenshots and misunderstandings")
-        
-        # Test 22: Creative & performance
-        print("\n📋 CATEGORY: Creative & Performance")
-        self.test_scenario("Performance anxiety", "I have performance anxiety before my sports event")
-        self.test_scenario("Not chosen team", "I didn't get chosen for the team and feel rejected")
-        self.test_scenario("Proud of creation", "I made something I'm proud of but shy to share")
-        self.test_scenario("Comparing to others", "I keep comparing myself to more talented peers")
-        
-        # Test 23: Cultural scenarios
-        print("\n📋 CATEGORY: Cultural & Identity")
-        self.test_scenario("Family reputation pressure", "I feel pressure to achieve for my family's reputation")
-        self.test_scenario("First in family higher ed", "I'm the first in my family going to university")
-        self.test_scenario("Career expectations", "My family wants me to be a doctor but I want something else")
-        self.test_scenario("Adult responsibilities early", "I have to translate and help my parents with everything")
-        self.test_scenario("Cultural duty conflict", "I want independence but feel guilty about cultural duty")
-        self.test_scenario("Emotions not expressed", "In my culture we don't talk about emotions openly")
-        self.test_scenario("Language barriers", "I struggle to express complex feelings in English")
-        self.test_scenario("Caught between cultures", "I feel caught between cultures, not enough for either side")
-        self.test_scenario("Accent judgment", "People mock my accent and it hurts")
-        self.test_scenario("Mixed heritage", "I'm mixed heritage and trying to belong to multiple places")
-        self.test_scenario("Religious expectations", "I'm navigating religious rules and guilt around my choices")
-        self.test_scenario("Parents sacrificed", "My parents migrated and sacrificed so much for me")
-        self.test_scenario("Cultural festival joy", "I'm excited about our cultural festival and want to share traditions")
-        self.test_scenario("Heritage pride", "I'm proud of my heritage and want to share my culture")
-        
-        # Test 24: Discrimination
-        print("\n📋 CATEGORY: Discrimination & Safety")
-        self.test_scenario("Experiencing racism", "I experienced racism today and feel deeply hurt")
-        self.test_scenario("Microaggressions", "I keep experiencing microaggressions and feel unsafe")
-        self.test_scenario("Invasive questions", "People keep asking where I'm really from")
-        self.test_scenario("Online hate ethnicity", "I received online hate because of my ethnicity")
-        
-        # Test 25: Spiritual
-        print("\n📋 CATEGORY: Spiritual & Ritual")
-        self.test_scenario("Spiritual disconnection", "I feel disconnected from my spiritual traditions")
-        self.test_scenario("Spiritual practices shamed", "People judge my spiritual practices")
-        self.test_scenario("Spiritual milestone", "I'm going through a spiritual coming-of-age ceremony")
-        
-        # Test 26: Time period awareness
-        print("\n📋 CATEGORY: Time Period Detection")
-        self.test_scenario("Had a bad week", "I've had a bad week",
-                          should_not_contain=["How long has this been"])
-        self.test_scenario("Struggling for months", "I've been struggling for 3 months")
-        
-        # Test 27: Crisis situations
-        print("\n📋 CATEGORY: Crisis Detection")
-        self.test_scenario("Self-harm mention", "I want to hurt myself")
-        self.test_scenario("Suicidal ideation", "I don't want to be here anymore")
+        # /api/chat needs a session cookie, which any page visit sets
+        try:
+            self.session.get(f"{self.base_url}/chat", timeout=30)
+        except Exception as e:
+            print(f"⚠️  Could not open a session: {e}")
+        
+        section = None
+        for scenario in scenarios or load_scenarios():
+            if scenario['section'] != section:
+                section = scenario['section']
+                print(f"\n📋 CATEGORY: {section}")
+            self.test_scenario(scenario['category'], scenario['message'],
+                               expected_patterns=scenario.get('expected_patterns'),
+                               should_not_contain=scenario.get('should_not_contain'))
         
         # Generate report
         self.generate_report()
@@ -371,11 +205,312 @@ class TestBot:
         print(f"\n📄 Detailed report saved to: {report_file}")
         print("\n" + "="*70)
 
+# Latency histogram bucket upper bounds (ms); the last bucket catches everything slower
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# What chat() returns when it hits an exception (e.g. "database is locked") - a 200 that is really a failure
+CHAT_FALLBACK_MESSAGE = "I'm having trouble connecting right now"
+
+
+class EndpointStats:
+    """Thread-safe latency histogram and error counts for one endpoint"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.status_codes = {}
+        self.errors = 0
+        self.error_samples = []
+    
+    def record(self, latency_ms, status, error=None):
+        with self.lock:
+            self.latencies.append(latency_ms)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+            self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+            if error:
+                self.errors += 1
+                if len(self.error_samples) < 10:
+                    self.error_samples.append(error)
+    
+    def summary(self):
+        latencies = sorted(self.latencies)
+        total = len(latencies)
+        
+        def pct(p):
+            return round(latencies[min(total - 1, int(p / 100 * total))], 1) if total else 0
+        
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'requests': total,
+            'errors': self.errors,
+            'error_rate': f"{(self.errors / total) * 100:.1f}%" if total else "0.0%",
+            'status_codes': self.status_codes,
+            'latency_ms': {'p50': pct(50), 'p95': pct(95), 'p99': pct(99), 'max': pct(100)},
+            'histogram': dict(zip(labels, self.buckets)),
+            'error_samples': self.error_samples
+        }
+
+
+class LoadTester:
+    """
+    Replays the test scenarios from many simulated users at once to find the
+    concurrency level where the app (and SQLite locking) starts failing requests
+    """
+    ENDPOINTS = ['/api/chat', '/api/history', '/community', '/progress']
+    
+    def __init__(self, base_url, scenarios, timeout=30, messages_per_user=5):
+        self.base_url = base_url
+        self.scenarios = scenarios
+        self.timeout = timeout
+        self.messages_per_user = messages_per_user
+    
+    def request(self, session, stats, method, path, **kwargs):
+        """Send one request and record its latency/outcome against the endpoint"""
+        start = time.perf_counter()
+        try:
+            response = session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except Exception as e:
+            stats[path].record((time.perf_counter() - start) * 1000, 'exception', f"{type(e).__name__}: {e}")
+            return None
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        error = None
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}: {response.text[:100]}"
+        elif path == '/api/chat':
+            try:
+                if CHAT_FALLBACK_MESSAGE in response.json().get('message', ''):
+                    error = "chat fallback response (server-side exception)"
+            except ValueError:
+                error = "invalid JSON response"
+        stats[path].record(latency_ms, response.status_code, error)
+        return response
+    
+    def simulate_user(self, stats):
+        """One simulated user: open chat, send a few scenario messages, browse other pages"""
+        session = requests.Session()
+        try:
+            # Establish the session cookie (not measured - it's not one of the tracked endpoints)
+            session.get(f"{self.base_url}/chat", timeout=self.timeout)
+        except Exception:
+            pass
+        
+        for scenario in random.sample(self.scenarios, min(self.messages_per_user, len(self.scenarios))):
+            self.request(session, stats, 'POST', '/api/chat', json={'message': scenario['message']})
+        self.request(session, stats, 'GET', '/api/history')
+        self.request(session, stats, 'GET', '/community')
+        self.request(session, stats, 'GET', '/progress')
+        session.close()
+    
+    def run_stage(self, users, arrival_rate, duration):
+        """Start simulated users at `arrival_rate`/sec for `duration` seconds, at most `users` concurrently"""
+        stats = {path: EndpointStats() for path in self.ENDPOINTS}
+        print(f"\n🚦 Stage: {users} concurrent users, {arrival_rate} arrivals/s for {duration}s")
+        
+        started = 0
+        stage_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            while time.perf_counter() - stage_start < duration:
+                pool.submit(self.simulate_user, stats)
+                started += 1
+                # Poisson arrivals around the configured rate
+                time.sleep(random.expovariate(arrival_rate))
+        elapsed = time.perf_counter() - stage_start
+        
+        endpoints = {path: endpoint_stats.summary() for path, endpoint_stats in stats.items()}
+        total = sum(e['requests'] for e in endpoints.values())
+        errors = sum(e['errors'] for e in endpoints.values())
+        for path, summary in endpoints.items():
+            print(f"   {path:<14} {summary['requests']:>6} req  errors {summary['error_rate']:>6}  "
+                  f"p50 {summary['latency_ms']['p50']}ms  p95 {summary['latency_ms']['p95']}ms  p99 {summary['latency_ms']['p99']}ms")
+        
+        return {
+            'users': users,
+            'arrival_rate': arrival_rate,
+            'duration': duration,
+            'elapsed': round(elapsed, 1),
+            'simulated_users': started,
+            'requests': total,
+            'errors': errors,
+            'throughput_rps': round(total / elapsed, 1) if elapsed else 0,
+            'endpoints': endpoints
+        }
+    
+    def run(self, user_levels, arrival_rate, duration, max_error_rate=0.01):
+        """Run one stage per concurrency level and write a test_report_*.json"""
+        print("\n" + "="*70)
+        print("🤖 HEALING GURU TEST BOT - Load Mode")
+        print("="*70)
+        
+        stages = [self.run_stage(users, arrival_rate, duration) for users in user_levels]
+        
+        # One result per stage/endpoint so the report keeps the correctness-run shape
+        results = []
+        errors = []
+        for stage in stages:
+            for path, summary in stage['endpoints'].items():
+                failed = summary['requests'] and summary['errors'] / summary['requests'] > max_error_rate
+                results.append({
+                    'category': f"load {stage['users']} users {path}",
+                    'message': path,
+                    'status': 'FAIL' if failed else 'PASS',
+                    'users': stage['users'],
+                    'latency_ms': summary['latency_ms'],
+                    'error_rate': summary['error_rate']
+                })
+                if failed:
+                    errors.append(f"❌ FAIL: {path} at {stage['users']} users - error rate {summary['error_rate']}: "
+                                  f"{summary['error_samples'][:3]}")
+        
+        first_failing = next((s['users'] for s in stages
+                              if s['requests'] and s['errors'] / s['requests'] > max_error_rate), None)
+        
+        total_tests = len(results)
+        passed = len([r for r in results if r['status'] == 'PASS'])
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        report_file = f"test_report_{timestamp}.json"
+        
+        with open(report_file, 'w') as f:
+            json.dump({
+                'timestamp': timestamp,
+                'mode': 'load',
+                'total_tests': total_tests,
+                'passed': passed,
+                'failed': total_tests - passed,
+                'success_rate': f"{(passed/total_tests)*100:.1f}%" if total_tests else "0.0%",
+                'results': results,
+                'errors': errors,
+                'load': {
+                    'base_url': self.base_url,
+                    'arrival_rate': arrival_rate,
+                    'duration': duration,
+                    'max_error_rate': max_error_rate,
+                    'first_failing_users': first_failing,
+                    'stages': stages
+                }
+            }, f, indent=2)
+        
+        print("\n" + "="*70)
+        if first_failing:
+            print(f"❌ Error rate exceeded {max_error_rate*100:.1f}% at {first_failing} concurrent users")
+        else:
+            print("✅ All stages within error budget")
+        print(f"📄 Detailed report saved to: {report_file}")
+        print("="*70)
+
+
+def run_shard(target, shard):
+    """
+    Process-pool worker: run (index, scenario) pairs in-process against a private
+    scratch database. Every scenario starts from a fresh session with no history.
+    """
+    # Must be set before app_chat is imported - it initialises the database on import
+    os.environ['HEALING_GURU_DB'] = os.path.join(tempfile.mkdtemp(prefix='healing_guru_test_'), 'healing_guru_chat.db')
+    import app_chat
+    
+    results = []
+    for index, scenario in shard:
+        try:
+            if target == 'engine':
+                analysis = app_chat.ai.analyze_message(scenario['message'], [])
+                result = {
+                    'success': True,
+                    'response': analysis['response'],
+                    'pattern': analysis.get('pattern'),
+                    'emotion': analysis.get('emotion')
+                }
+            else:
+                client = app_chat.app.test_client()
+                client.get('/chat')
+                response = client.post('/api/chat', json={'message': scenario['message']})
+                result = chat_result(response.status_code, response.get_json, response.get_data(as_text=True))
+        except Exception as e:
+            result = {'success': False, 'error': f"{type(e).__name__}: {e}"}
+        results.append((index, result))
+    return results
+
+
+class InProcessRunner:
+    """
+    Runs the scenario table without a server or network: against Flask's test client
+    ('client') or straight into HealingGuruAI.analyze_message ('engine'), sharded
+    across a process pool, with results merged into one standard report
+    """
+    def __init__(self, target='client', workers=None):
+        self.target = target
+        self.workers = workers or os.cpu_count() or 1
+    
+    def run(self, scenarios=None):
+        scenarios = scenarios or load_scenarios()
+        indexed = list(enumerate(scenarios))
+        shards = [indexed[i::self.workers] for i in range(self.workers) if indexed[i::self.workers]]
+        
+        print("\n" + "="*70)
+        print(f"🤖 HEALING GURU TEST BOT - In-process ({self.target}, {len(shards)} workers)")
+        print("="*70)
+        
+        start = time.perf_counter()
+        results = {}
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            for shard_results in pool.map(run_shard, [self.target] * len(shards), shards):
+                results.update(shard_results)
+        elapsed = time.perf_counter() - start
+        
+        # Replay in table order so the output and report read like a normal run
+        bot = TestBot(None)
+        section = None
+        for index, scenario in indexed:
+            if scenario['section'] != section:
+                section = scenario['section']
+                print(f"\n📋 CATEGORY: {section}")
+            print(f"\n🧪 Testing: {scenario['category']}")
+            print(f"   Message: '{scenario['message']}'")
+            bot.record_result(scenario['category'], scenario['message'], results[index],
+                              expected_patterns=scenario.get('expected_patterns'),
+                              should_not_contain=scenario.get('should_not_contain'))
+        
+        print(f"\n⏱️  {len(indexed)} scenarios in {elapsed:.2f}s")
+        bot.generate_report()
+        return bot
+
+
 if __name__ == "__main__":
-    print("\n🤖 Healing Guru Test Bot")
-    print("Testing app at:", APP_URL)
-    print("\nStarting in 3 seconds...")
-    time.sleep(3)
+    parser = argparse.ArgumentParser(description='Healing Guru Test Bot')
+    parser.add_argument('--url', default=APP_URL, help='app base URL')
+    parser.add_argument('--load', action='store_true', help='run concurrent load mode instead of the correctness suite')
+    parser.add_argument('--in-process', choices=['client', 'engine'],
+                        help='run the suite without a server: Flask test client or HealingGuruAI directly')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size for --in-process')
+    parser.add_argument('--scenarios', default=SCENARIOS_FILE, help='scenario table (JSON)')
+    parser.add_argument('--users', default='5,10,20,40',
+                        help='comma-separated concurrency levels, one load stage each')
+    parser.add_argument('--rate', type=float, default=5.0, help='simulated user arrivals per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per load stage')
+    parser.add_argument('--messages-per-user', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='error rate that fails a stage')
+    args = parser.parse_args()
+    
+    scenarios = load_scenarios(args.scenarios)
     
-    bot = TestBot(APP_URL)
-    bot.run_all_tests()
+    if args.in_process:
+        InProcessRunner(args.in_process, args.workers).run(scenarios)
+    elif args.load:
+        print("\n🤖 Healing Guru Test Bot")
+        print("Testing app at:", args.url)
+        tester = LoadTester(args.url, scenarios, timeout=args.timeout,
+                            messages_per_user=args.messages_per_user)
+        tester.run([int(u) for u in args.users.split(',')], args.rate, args.duration, args.max_error_rate)
+    else:
+        print("\n🤖 Healing Guru Test Bot")
+        print("Testing app at:", args.url)
+        print("\nStarting in 3 seconds...")
+        time.sleep(3)
+        
+        bot = TestBot(args.url)
+        bot.run_all_tests(scenarios)
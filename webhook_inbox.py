@@ -0,0 +1,119 @@
+"""
+Inbox for Gumroad webhook deliveries.
+
+/webhook/gumroad only records the raw delivery here (one insert into the
+queue database) and acknowledges it; the gumroad_inbox background job then
+applies pending deliveries to subscriptions one at a time. A sale campaign
+therefore becomes a queue the processor works through, not a burst of
+request threads writing subscriptions.
+
+- Deliveries are deduplicated on (sale id, resulting status): a resent
+  delivery is dropped, but a later refund or cancellation of the same sale
+  is kept.
+- Deliveries for one license key are applied in the order they arrived. A
+  delivery is not claimed while an earlier one for the same key is still
+  pending, so a retried 'active' can never land after the 'refunded' that
+  followed it.
+- A delivery that fails is retried with the job queue's backoff. After
+  JOBS_MAX_ATTEMPTS tries it is marked 'failed' and stops blocking its key.
+"""
+
+import json
+import time
+
+import jobs
+from db import get_queue_db
+
+# How long a processor holds a delivery before another may take it over
+LEASE_SECONDS = 60
+
+_logger = None
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        import app_logging
+        _logger = app_logging.get_logger('healing_guru.webhooks')
+    return _logger
+
+
+def record(data, dedupe_key=None):
+    """Store a delivery; returns its inbox id, or None if it duplicates one already received"""
+    conn = get_queue_db()
+    c = conn.cursor()
+    c.execute('''INSERT INTO gumroad_inbox (sale_id, license_key, dedupe_key, payload)
+                 VALUES (?, ?, ?, ?)
+                 ON CONFLICT(dedupe_key) DO NOTHING''',
+              (data.get('sale_id'), data.get('license_key'), dedupe_key, json.dumps(data)))
+    inbox_id = c.lastrowid if c.rowcount else None
+    conn.commit()
+    conn.close()
+    return inbox_id
+
+
+def claim_next():
+    """Lease the oldest pending delivery with nothing earlier pending for its license key"""
+    now = time.time()
+    conn = get_queue_db()
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    c.execute('''SELECT id, payload, attempts FROM gumroad_inbox i
+                 WHERE status = 'pending' AND (claimed_until IS NULL OR claimed_until <= ?)
+                   AND NOT EXISTS (SELECT 1 FROM gumroad_inbox earlier
+                                   WHERE earlier.license_key = i.license_key
+                                     AND earlier.status = 'pending' AND earlier.id < i.id)
+                 ORDER BY id LIMIT 1''', (now,))
+    row = c.fetchone()
+    if row:
+        c.execute('UPDATE gumroad_inbox SET claimed_until = ?, attempts = attempts + 1 WHERE id = ?',
+                  (now + LEASE_SECONDS, row[0]))
+    conn.commit()
+    conn.close()
+    if not row:
+        return None
+    return {'id': row[0], 'payload': json.loads(row[1]), 'attempt': row[2] + 1}
+
+
+def mark_processed(delivery):
+    conn = get_queue_db()
+    conn.cursor().execute('''UPDATE gumroad_inbox SET status = 'processed', claimed_until = NULL,
+                                    last_error = NULL, processed_at = CURRENT_TIMESTAMP
+                             WHERE id = ?''', (delivery['id'],))
+    conn.commit()
+    conn.close()
+
+
+def mark_failed(delivery, error):
+    conn = get_queue_db()
+    c = conn.cursor()
+    if delivery['attempt'] >= jobs.MAX_ATTEMPTS:
+        c.execute('''UPDATE gumroad_inbox SET status = 'failed', claimed_until = NULL, last_error = ?,
+                            processed_at = CURRENT_TIMESTAMP
+                     WHERE id = ?''', (error, delivery['id']))
+    else:
+        # Stays pending (and keeps later deliveries for its key waiting) until the backoff passes
+        c.execute('UPDATE gumroad_inbox SET claimed_until = ?, last_error = ? WHERE id = ?',
+                  (time.time() + jobs.backoff(delivery['attempt']), error, delivery['id']))
+    conn.commit()
+    conn.close()
+
+
+def drain(apply, limit=None):
+    """Apply claimable deliveries with apply(payload) until none are left; returns (applied, failed)"""
+    applied = failed = 0
+    while limit is None or applied + failed < limit:
+        delivery = claim_next()
+        if delivery is None:
+            break
+        try:
+            apply(delivery['payload'])
+        except Exception as e:
+            _get_logger().exception("webhook delivery failed",
+                                    extra={'inbox_id': delivery['id'], 'attempt': delivery['attempt']})
+            mark_failed(delivery, f'{type(e).__name__}: {e}')
+            failed += 1
+            continue
+        mark_processed(delivery)
+        applied += 1
+    return applied, failed